@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 from datetime import timedelta
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -50,11 +51,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, to time the whole stack
+    'app_api.middleware.RequestInstrumentationMiddleware',
+    # before the authentication and any other database work
+    'app_api.shedding.LoadSheddingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # needs the session for the admin users
+    'app_api.routing.ReplicaRoutingMiddleware',
+    # needs the session user of the admin
+    'app_api.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,15 +94,73 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
+        # opens a connection per request, 'app_api.backends.postgresql_pool' is the same backend
+        # with the connections pooled by every worker process (POOL below)
         'ENGINE': 'django.db.backends.postgresql_psycopg2',
         'NAME': 'postgres',
         'PORT': 5432,
         'HOST': 'postgres',
         'PASSWORD': 'postgres',
-        'USER': 'postgres'
+        'USER': 'postgres',
+        # closed, or given back to the pool, at the end of every request
+        'CONN_MAX_AGE': 0,
+        # used by the pooled backend, per worker process: MAX_SIZE at least the threads of a worker,
+        # (MAX_SIZE + MAX_OVERFLOW) * processes below the max_connections of the server
+        'POOL': {
+            'MIN_SIZE': 2,
+            'MAX_SIZE': 10,
+            'MAX_OVERFLOW': 10,
+            # seconds a request waits for a connection before failing
+            'TIMEOUT': 5,
+            # seconds before a connection is replaced
+            'MAX_LIFETIME': 1800,
+            # connections idle for longer are checked with a query on checkout
+            'CHECK_IDLE_SECONDS': 10,
+        },
     }
 }
 
+# read replicas are added to DATABASES and listed in READ_REPLICAS['ALIASES'], e.g.
+# 'replica': {..., 'HOST': 'postgres-replica', 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['app_api.routing.ReplicaRouter']
+
+READ_REPLICAS = {
+    'ALIASES': [],
+    # safe-method requests under these paths read from a replica
+    'PATH_PREFIXES': ['/api/feed/', '/api/users/', '/api/posts/'],
+    # seconds a user reads from the primary after writing something, above the usual replication lag
+    'STICKY_SECONDS': 10,
+    # cache of the sticky users, shared by the workers in production
+    'CACHE': 'default',
+    'HEALTH_CHECK_SECONDS': 5,
+    # replicas further behind (PostgreSQL only) are not read from
+    'MAX_LAG_SECONDS': 5,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# both caches are per-process LRU caches, point them to memcached/redis to share them between workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'graph': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'social-graph',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+}
+
+# cache alias holding the follower/followee/friend id sets, None disables the cache
+SOCIAL_GRAPH_CACHE = 'graph'
+# bigger id sets are not cached and queried every time they are needed in Python
+SOCIAL_GRAPH_CACHE_MAX_IDS = 5000
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -143,8 +210,24 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.CachedJWTAuthentication',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'app_api.pagination.IdKeysetPagination',
+    'PAGE_SIZE': 20,
+}
+
+# upper bound for the ?page_size= query parameter of the list endpoints
+PAGINATION_MAX_PAGE_SIZE = 100
+# upper bound for the number of user ids of one bulk follow / unfollow / friend request call
+BULK_MAX_USER_IDS = 1000
+# rows fetched from the server-side cursor and serialized at once by the ?stream=true lists
+STREAMING_CHUNK_SIZE = 500
+
+# cache of the users authenticated by CachedJWTAuthentication, shared by the workers in production
+AUTH_USER_CACHE = {
+    'CACHE': 'default',
+    # seconds, also the longest a change made without signals (queryset update) stays unseen
+    'TIMEOUT': 60,
 }
 
 # Configuration for using simplejwt library
@@ -153,7 +236,141 @@ SIMPLE_JWT = {
    "REFRESH_TOKEN_LIFETIME": timedelta(days=5),
 }
 
+# Feed settings
+# maximum number of posts kept in a user's materialized home timeline
+TIMELINE_MAX_LENGTH = 500
+# 'push': fan out every post, 'pull': build the feed at read time,
+# 'hybrid': push for regular authors, pull for authors above FEED_PUSH_MAX_FOLLOWERS
+FEED_DELIVERY_MODE = 'hybrid'
+FEED_PUSH_MAX_FOLLOWERS = 10000
+# ?order=ranked feeds: the most recent CANDIDATES posts are scored by recency
+# (halved every HALF_LIFE_HOURS), likes and the viewer's relation to the author
+FEED_RANKING = {
+    'CANDIDATES': 1000,
+    'HALF_LIFE_HOURS': 12,
+    'LIKE_WEIGHT': 1.0,
+    'AFFINITY': {
+        'friend': 3.0,
+        'followee': 2.0,
+        'follower': 1.2,
+        'other': 1.0,
+    },
+}
+
+# Image renditions (app_api.images), rendered in a process pool after the upload
+IMAGE_PROCESSING = {
+    # worker processes, 0 renders in the request (tests, development)
+    'WORKERS': 2,
+    # name: (max width, max height, crop to exactly this size)
+    'RENDITIONS': {
+        'thumbnail': (160, 160, True),
+        'feed': (720, 720, False),
+        'full': (1600, 1600, False),
+    },
+    'QUALITY': 80,
+}
+
+# Request instrumentation (app_api.middleware)
+REQUEST_INSTRUMENTATION = {
+    # share of the requests that are timed and logged, 0 turns the middleware off
+    'SAMPLE_RATE': 0.01,
+    # sampled requests slower than this are logged as warnings with their full query list
+    'SLOW_REQUEST_MS': 500,
+    # send the timings of the sampled requests of staff users in a Server-Timing header
+    'SERVER_TIMING': True,
+}
+
+# On-demand profiles of single requests (app_api.profiling), asked for by staff users
+# with the X-Profile header or ?profile=cprofile|sampling
+PROFILING = {
+    # outside of the source tree, the profiles must not end up in the repository or the image
+    'DIRECTORY': os.path.join(tempfile.gettempdir(), 'app-profiles'),
+    # oldest profiles are deleted beyond this count
+    'MAX_PROFILES': 200,
+    # seconds between two stack samples
+    'SAMPLING_INTERVAL': 0.001,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'app_api.requests': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # Email settings
+# emails are queued in the OutboundEmail table and sent by the send_queued_email worker
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 50,
+    # attempts before an email is marked as Failed
+    'MAX_ATTEMPTS': 8,
+    # retry delays double from RETRY_BASE_SECONDS up to RETRY_MAX_SECONDS
+    'RETRY_BASE_SECONDS': 30,
+    'RETRY_MAX_SECONDS': 3600,
+    # seconds the worker waits when nothing is due
+    'POLL_INTERVAL': 5,
+}
+
+AUTOCOMPLETE = {
+    # prefix index kept in the memory of every worker, the database is queried otherwise
+    'IN_MEMORY': True,
+    # seconds between two refreshes of the index with the users changed by the other workers
+    'REFRESH_SECONDS': 5,
+    'MAX_RESULTS': 20,
+}
+
+# token buckets of the views with a throttle_scope, see app_api.throttling
+RATE_LIMITING = {
+    # shared by the workers in production (memcached, redis), the buckets are per process otherwise
+    'CACHE': 'default',
+    # (capacity, tokens refilled per second) of the bucket of each user and of each IP
+    'BUDGETS': {
+        'like': {'user': (30, 1.0), 'ip': (120, 4.0)},
+        'follow': {'user': (20, 0.5), 'ip': (60, 2.0)},
+        'friend_request': {'user': (10, 0.2), 'ip': (30, 1.0)},
+        'feed': {'user': (20, 2.0), 'ip': (100, 10.0)},
+    },
+}
+
+LOAD_SHEDDING = {
+    'ENABLED': True,
+    # average query duration (ms) above which the requests of a priority are shed, never for the others
+    'LATENCY_MS': {
+        'low': 100,
+        'normal': 300,
+    },
+    # priority of the url names, 'normal' for the others
+    'PRIORITIES': {
+        'feed-view': 'low',
+        'followers-posts-view': 'low',
+        'followees-posts-view': 'low',
+        'friends-posts-view': 'low',
+        'user-posts-view': 'low',
+        'post-search': 'low',
+        'user-autocomplete': 'low',
+        'friend-suggestions': 'low',
+        'token_obtain_pair': 'high',
+        'token_refresh': 'high',
+        'metrics': 'high',
+    },
+    # weight of the last query in the moving average of the durations
+    'SMOOTHING': 0.05,
+    # seconds without a query after which the average is no longer trusted
+    'STALE_SECONDS': 5,
+    # Retry-After header of the shed requests, in seconds
+    'RETRY_AFTER': 5,
+}
+
 BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
@@ -0,0 +1,22 @@
+"""
+Settings of the test suite without the PostgreSQL server of docker-compose:
+    python manage.py test --settings=app.test_settings
+"""
+import os
+import tempfile
+
+from app.settings import *  # noqa
+
+# the test databases are in memory, these files are only opened by commands (migrate, makemigrations --check)
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(tempfile.gettempdir(), 'app-test.sqlite3'),
+    },
+    # a database of its own standing in for a read replica, for the routing tests
+    # (not in READ_REPLICAS['ALIASES'], the other tests read from 'default')
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(tempfile.gettempdir(), 'app-test-replica.sqlite3'),
+    },
+}
@@ -20,8 +20,13 @@ from django.conf.urls.static import static
 from django.conf import settings
 from rest_framework.documentation import include_docs_urls
 
+from app_api.views import MetricsView, profiles_view, profile_file_view
+
 
 urlpatterns = [
+    # admin pages of the request profiler
+    path('admin/profiles/', admin.site.admin_view(profiles_view), name='profiles'),
+    path('admin/profiles/<profile_id>.<extension>', admin.site.admin_view(profile_file_view), name='profile-file'),
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
 
@@ -31,6 +36,7 @@ urlpatterns = [
     path('api/users/', include('users.urls')),
     path('api/me/', include('me.urls')),
     path('api/register/', include('registration.urls')),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
 
     # API's URL generator
     path('api/docs/', include_docs_urls(title='Motion API', permission_classes=[])),  # publicly visible
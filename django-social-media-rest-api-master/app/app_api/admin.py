@@ -4,10 +4,16 @@ from .models import (UserProfile,
                      Post,
                      Reaction,
                      Friendship,
-                     Follow)
+                     Follow,
+                     TimelineEntry,
+                     OutboundEmail,
+                     FriendSuggestion)
 
 admin.site.register(UserProfile)
 admin.site.register(Post)
 admin.site.register(Reaction)
 admin.site.register(Friendship)
 admin.site.register(Follow)
+admin.site.register(TimelineEntry)
+admin.site.register(OutboundEmail)
+admin.site.register(FriendSuggestion)
@@ -6,4 +6,11 @@ class AppApiConfig(AppConfig):
 
     def ready(self):
         import app_api.signals
+        from app_api import metrics
+        from app_api.outbox import queue_depth
+        from app_api.routing import replica_health
+        from app_api.shedding import database_latency
+        metrics.register_gauge('email.queue_depth', queue_depth)
+        metrics.register_gauge('db.latency_ms', database_latency.current_ms)
+        metrics.register_gauge('replica.healthy', replica_health.healthy_count)
 
@@ -0,0 +1,186 @@
+"""
+Prefix autocomplete of the users by username, first name and last name.
+
+Every worker keeps an in-memory index: the lowercased name tokens in a sorted list,
+searched with bisect, next to the user ids in an array. It is loaded on first use,
+updated by the User signals of its own process and refreshed from the profiles
+touched since the last refresh (UserProfile.updated_at, bumped on every User save)
+to pick up the changes made by the other workers. Without the in-memory index
+(AUTOCOMPLETE['IN_MEMORY'] off) the lookup is an istartswith query, served on
+PostgreSQL by the UPPER(...) text_pattern_ops indexes of migration 0014.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
+
+from app_api import metrics
+from app_api.graph import SocialGraph
+from app_api.models import UserProfile
+
+User = get_user_model()
+
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def tokens(*names):
+    """
+    Lowercased words of the names, each of them can be completed
+    """
+    return sorted({word for name in names if name for word in name.lower().split()})
+
+
+class PrefixIndex:
+    """
+    Sorted name tokens and the ids of their users, with the tokens of every user
+    to update or remove them
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = []
+        self.ids = array('q')
+        self.user_tokens = {}
+        self.loaded = False
+        self.synced_at = None
+        self.checked_at = 0.0
+
+    def load(self):
+        synced_at = timezone.now()
+        entries = []
+        user_tokens = {}
+        rows = User.objects.values_list('id', *NAME_FIELDS).order_by().iterator(chunk_size=10000)
+        for user_id, *names in rows:
+            user_tokens[user_id] = tokens(*names)
+            entries.extend((token, user_id) for token in user_tokens[user_id])
+        entries.sort()
+        with self.lock:
+            self.keys = [token for token, _ in entries]
+            self.ids = array('q', (user_id for _, user_id in entries))
+            self.user_tokens = user_tokens
+            self.synced_at = synced_at
+            self.loaded = True
+        metrics.incr('autocomplete.loads')
+
+    def index_user(self, user_id, *names):
+        with self.lock:
+            self._remove(user_id)
+            self.user_tokens[user_id] = tokens(*names)
+            for token in self.user_tokens[user_id]:
+                position = bisect_right(self.keys, token)
+                self.keys.insert(position, token)
+                self.ids.insert(position, user_id)
+
+    def remove_user(self, user_id):
+        with self.lock:
+            self._remove(user_id)
+
+    def _remove(self, user_id):
+        for token in self.user_tokens.pop(user_id, ()):
+            position = bisect_left(self.keys, token)
+            while self.ids[position] != user_id:
+                position += 1
+            del self.keys[position]
+            del self.ids[position]
+
+    def refresh(self):
+        """
+        Index the users whose profile changed since the last refresh, at most every REFRESH_SECONDS
+        """
+        if not self.loaded:
+            self.load()
+            return
+        if time.monotonic() - self.checked_at < settings.AUTOCOMPLETE['REFRESH_SECONDS']:
+            return
+        self.checked_at = time.monotonic()
+        synced_at = timezone.now()
+        # overlap the previous refresh, the clocks of the workers and the database differ a little
+        since = self.synced_at - timedelta(seconds=settings.AUTOCOMPLETE['REFRESH_SECONDS'])
+        changed = (UserProfile.objects.filter(updated_at__gte=since)
+                   .values_list('user_id', *(f'user__{field}' for field in NAME_FIELDS)))
+        for user_id, *names in changed:
+            self.index_user(user_id, *names)
+        self.synced_at = synced_at
+
+    def user_matches(self, user_id, prefixes):
+        """
+        Whether every prefix starts one of the tokens of the user
+        """
+        user_tokens = self.user_tokens.get(user_id, ())
+        return all(any(token.startswith(prefix) for token in user_tokens) for prefix in prefixes)
+
+    def search(self, prefixes, limit, preferred_ids=()):
+        """
+        Ids of the users matching every prefix: the matching preferred ids first, in their order,
+        then the others in the order of their token
+        """
+        with self.lock:
+            results = [user_id for user_id in preferred_ids if self.user_matches(user_id, prefixes)][:limit]
+            seen = set(results)
+            first = prefixes[0]
+            position = bisect_left(self.keys, first)
+            while len(results) < limit and position < len(self.keys) and self.keys[position].startswith(first):
+                user_id = self.ids[position]
+                if user_id not in seen and self.user_matches(user_id, prefixes[1:]):
+                    seen.add(user_id)
+                    results.append(user_id)
+                position += 1
+        return results
+
+
+_index = PrefixIndex()
+
+
+def get_index():
+    _index.refresh()
+    return _index
+
+
+def database_search(prefixes, limit, preferred_ids=()):
+    """
+    PrefixIndex.search with istartswith queries, the other users in username order
+    """
+    condition = Q()
+    for prefix in prefixes:
+        condition &= (Q(username__istartswith=prefix) | Q(first_name__istartswith=prefix)
+                      | Q(last_name__istartswith=prefix))
+    order = {user_id: position for position, user_id in enumerate(preferred_ids)}
+    preferred = sorted(User.objects.filter(condition & Q(id__in=list(order))).values_list('id', flat=True),
+                       key=order.get)[:limit]
+    others = (User.objects.filter(condition).exclude(id__in=preferred).order_by('username')
+              .values_list('id', flat=True)[:limit - len(preferred)])
+    return preferred + list(others)
+
+
+def index_user(user):
+    # before the first lookup there is nothing to update, the index is loaded from the database
+    if _index.loaded:
+        _index.index_user(user.pk, *(getattr(user, field) for field in NAME_FIELDS))
+
+
+def remove_user(user):
+    if _index.loaded:
+        _index.remove_user(user.pk)
+
+
+def autocomplete(user, query, limit):
+    """
+    Ids of the users completing the query, the friends and followees of the user first
+    """
+    prefixes = tokens(query)
+    if not prefixes:
+        return []
+    # the longest prefix is the most selective range of the index
+    prefixes.sort(key=len, reverse=True)
+    graph = SocialGraph(user)
+    preferred_ids = [user_id for user_id in dict.fromkeys(graph.friend_ids() + graph.followee_ids())
+                     if user_id != user.pk]
+    if settings.AUTOCOMPLETE['IN_MEMORY']:
+        return get_index().search(prefixes, limit, preferred_ids)
+    return database_search(prefixes, limit, preferred_ids)
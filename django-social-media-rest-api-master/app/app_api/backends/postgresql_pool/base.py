@@ -0,0 +1,76 @@
+"""
+PostgreSQL backend checking its connections out of a process-wide pool
+(pool.ConnectionPool, configured by the POOL entry of the database settings)
+instead of opening one per request. Keep CONN_MAX_AGE at 0: closing the
+connection at the end of the request gives it back to the pool.
+"""
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as BaseDatabaseCreation
+from psycopg2 import extensions
+
+from app_api.backends.postgresql_pool.pool import PoolTimeout, close_pools, get_pool
+
+Database = base.Database
+
+
+def connect(conn_params):
+    connection = Database.connect(**conn_params)
+    # idle in the pool outside of any transaction, the health check query must not open one:
+    # Django can't set the autocommit of the connection inside a transaction on checkout
+    connection.autocommit = True
+    return connection
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # a database with open connections can't be dropped
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pooled = None
+
+    def get_new_connection(self, conn_params):
+        # the connection used to create and drop the test databases is not pooled
+        if self.alias == NO_DB_ALIAS:
+            return super().get_new_connection(conn_params)
+
+        pool = get_pool(self.alias, tuple(sorted(conn_params.items())),
+                        lambda: connect(conn_params), self.settings_dict.get('POOL'))
+        try:
+            self.pooled = pool.checkout()
+        except PoolTimeout as error:
+            raise Database.OperationalError(str(error))
+        connection = self.pooled.connection
+        if self.pooled.isolation_level is None:
+            self.pooled.isolation_level = connection.isolation_level
+
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', self.pooled.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        self.named_cursors_at_checkout = self._named_cursor_idx
+        return connection
+
+    def _close(self):
+        pooled, self.pooled = self.pooled, None
+        if pooled is None:
+            return super()._close()
+        # closed inside an atomic block, the wrapper keeps using the connection until the block exits
+        discard = self.in_atomic_block
+        connection = pooled.connection
+        if not discard and not connection.closed:
+            try:
+                if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+                # server-side cursors (QuerySet.iterator) left open WITH HOLD by an interrupted stream
+                if self._named_cursor_idx != self.named_cursors_at_checkout:
+                    with connection.cursor() as cursor:
+                        cursor.execute('CLOSE ALL')
+            except Database.Error:
+                discard = True
+        pooled.pool.release(pooled, discard=discard or bool(connection.closed))
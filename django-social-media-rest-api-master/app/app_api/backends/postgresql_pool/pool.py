@@ -0,0 +1,242 @@
+"""
+Process-wide pool of database connections, shared by the threads of a worker.
+Django opens and closes the connection of every request (CONN_MAX_AGE = 0),
+the pooled backend turns that into a checkout and a release.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from app_api import metrics
+
+DEFAULTS = {
+    # connections opened with the pool, then kept open
+    'MIN_SIZE': 2,
+    # connections kept open
+    'MAX_SIZE': 10,
+    # temporary connections beyond MAX_SIZE when they are all in use, closed on release
+    'MAX_OVERFLOW': 10,
+    # seconds a checkout waits for a connection once MAX_SIZE + MAX_OVERFLOW are in use
+    'TIMEOUT': 5,
+    # seconds after which a connection is closed and replaced
+    'MAX_LIFETIME': 1800,
+    # connections idle for longer are checked with a query on checkout
+    'CHECK_IDLE_SECONDS': 10,
+}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """
+    A connection of the pool and its bookkeeping
+    """
+
+    def __init__(self, pool, connection):
+        self.pool = pool
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+        # isolation level of the connection as opened, for the database wrapper
+        self.isolation_level = None
+
+    def expired(self):
+        return time.monotonic() - self.created_at > self.pool.config['MAX_LIFETIME']
+
+
+class ConnectionPool:
+    """
+    Class to hand out the connections of a database, opened by `connect`, to the threads of the process.
+    Idle connections are reused last in first out, so that the extra ones age out with MAX_LIFETIME.
+    """
+
+    def __init__(self, name, connect, config=None):
+        self.name = name
+        self.connect = connect
+        self.config = dict(DEFAULTS, **(config or {}))
+        self.condition = threading.Condition()
+        self.idle = deque()
+        # open connections, idle or in use
+        self.size = 0
+        self.in_use = 0
+        # threads waiting for a connection
+        self.waiting = 0
+        self.pid = os.getpid()
+
+    def fill(self):
+        """
+        Open the MIN_SIZE connections, a failure is left for the first checkout to report
+        """
+        while True:
+            with self.condition:
+                if self.size >= self.config['MIN_SIZE']:
+                    return
+                self.size += 1
+            try:
+                pooled = PooledConnection(self, self.connect())
+            except Exception:
+                with self.condition:
+                    self.size -= 1
+                return
+            metrics.incr(f'db_pool.{self.name}.opened')
+            with self.condition:
+                self.idle.append(pooled)
+                self.condition.notify()
+
+    def checkout(self):
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.config['TIMEOUT']
+        while True:
+            pooled = None
+            with self.condition:
+                if self.idle:
+                    pooled = self.idle.pop()
+                elif self.size < self.config['MAX_SIZE'] + self.config['MAX_OVERFLOW']:
+                    self.size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        metrics.incr(f'db_pool.{self.name}.timeouts')
+                        raise PoolTimeout(f'No connection of the {self.name} pool available after '
+                                          f'{self.config["TIMEOUT"]}s ({self.size} in use)')
+                    self.waiting += 1
+                    try:
+                        self.condition.wait(remaining)
+                    finally:
+                        self.waiting -= 1
+                    continue
+                self.in_use += 1
+                overflow = self.size > self.config['MAX_SIZE']
+
+            if pooled is not None and not self.healthy(pooled):
+                self.discard(pooled)
+                continue
+            if pooled is None:
+                try:
+                    pooled = PooledConnection(self, self.connect())
+                except Exception:
+                    with self.condition:
+                        self.size -= 1
+                        self.in_use -= 1
+                        self.condition.notify()
+                    raise
+                metrics.incr(f'db_pool.{self.name}.opened')
+                if overflow:
+                    metrics.incr(f'db_pool.{self.name}.overflow_checkouts')
+
+            metrics.incr(f'db_pool.{self.name}.checkouts')
+            metrics.incr(f'db_pool.{self.name}.wait_ms', (time.perf_counter() - start) * 1000)
+            return pooled
+
+    def healthy(self, pooled):
+        """
+        Whether an idle connection can be handed out: open, young enough, and answering
+        if it has been idle for a while
+        """
+        if pooled.expired():
+            metrics.incr(f'db_pool.{self.name}.recycled')
+            return False
+        if getattr(pooled.connection, 'closed', False):
+            return False
+        if time.monotonic() - pooled.returned_at <= self.config['CHECK_IDLE_SECONDS']:
+            return True
+        try:
+            cursor = pooled.connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+            # returned outside of autocommit (AUTOCOMMIT = False), don't leave the check's transaction open
+            if not getattr(pooled.connection, 'autocommit', True):
+                pooled.connection.rollback()
+            return True
+        except Exception:
+            metrics.incr(f'db_pool.{self.name}.health_check_failures')
+            return False
+
+    def release(self, pooled, discard=False):
+        """
+        Give a checked out connection back, its transaction must be over. Discarded
+        (broken, or in an unknown state) and expired connections are closed, overflow
+        connections too unless a thread is waiting for one.
+        """
+        expired = pooled.expired()
+        with self.condition:
+            needed = self.size <= self.config['MAX_SIZE'] or self.waiting
+            if not discard and not expired and needed and self.pid == os.getpid():
+                self.in_use -= 1
+                pooled.returned_at = time.monotonic()
+                self.idle.append(pooled)
+                self.condition.notify()
+                return
+        if expired:
+            metrics.incr(f'db_pool.{self.name}.recycled')
+        self.discard(pooled)
+
+    def discard(self, pooled):
+        """
+        Close a checked out connection and free its place
+        """
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.size -= 1
+            self.in_use -= 1
+            self.condition.notify()
+
+    def close_idle(self):
+        with self.condition:
+            idle, self.idle = list(self.idle), deque()
+            self.size -= len(idle)
+        for pooled in idle:
+            try:
+                pooled.connection.close()
+            except Exception:
+                pass
+
+    def idle_count(self):
+        return len(self.idle)
+
+    def in_use_count(self):
+        return self.in_use
+
+    def overflow_count(self):
+        return max(self.size - self.config['MAX_SIZE'], 0)
+
+
+_lock = threading.Lock()
+_pools = {}
+
+
+def get_pool(alias, key, connect, config):
+    """
+    The pool of an alias and its connection parameters (key), created on first use and again
+    in a forked child: the connections of the parent must not be used by two processes
+    """
+    with _lock:
+        pool = _pools.get((alias, key))
+        if pool is not None and pool.pid == os.getpid():
+            return pool
+        pool = _pools[(alias, key)] = ConnectionPool(alias, connect, config)
+    # gauges of the latest pool of the alias
+    metrics.register_gauge(f'db_pool.{alias}.in_use', pool.in_use_count)
+    metrics.register_gauge(f'db_pool.{alias}.idle', pool.idle_count)
+    metrics.register_gauge(f'db_pool.{alias}.overflow', pool.overflow_count)
+    pool.fill()
+    return pool
+
+
+def close_pools():
+    """
+    Close the idle connections of every pool, before dropping a database for instance
+    """
+    with _lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        if pool.pid == os.getpid():
+            pool.close_idle()
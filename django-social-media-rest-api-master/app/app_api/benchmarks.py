@@ -0,0 +1,60 @@
+"""
+Helpers shared by the commands measuring the API on a seeded database
+(seed_social_graph, run_benchmarks, bench_search, explain_views) and maintaining it (reconcile_like_counts)
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from app_api.models import Reaction
+
+User = get_user_model()
+
+# words of the seeded posts, drawn with Zipf weights so that search terms range from common to rare
+VOCABULARY = (
+    'time people year day way thing world life hand part child eye woman place work week case point '
+    'number group problem fact music coffee travel garden photo city river mountain beach sunset book '
+    'movie game team match goal recipe dinner bread cheese market street train bike road weekend '
+    'holiday birthday party friend family dog cat bird tree flower rain snow summer winter spring autumn '
+    'morning evening night light window kitchen office school class lesson project idea design code '
+    'bug release feature server database query index cache network phone camera concert festival '
+    'museum painting poem story novel chapter island harbor forest desert valley lake bridge castle'
+).split()
+VOCABULARY_WEIGHTS = [1 / rank for rank in range(1, len(VOCABULARY) + 1)]
+
+
+def list_urls(patterns=None, prefix=''):
+    """
+    (route, view class, url kwarg names) of every class based view of the url configuration
+    """
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        # regex patterns (e.g. the docs urls) are anchored, path patterns are not
+        route = prefix + str(pattern.pattern).lstrip('^').rstrip('$')
+        if isinstance(pattern, URLResolver):
+            yield from list_urls(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            view_class = getattr(pattern.callback, 'cls', None) or getattr(pattern.callback, 'view_class', None)
+            if view_class is not None:
+                yield route, view_class, list(pattern.pattern.regex.groupindex)
+
+
+def most_followed_user():
+    """
+    Default viewing user of the benchmarks, the one with the heaviest feeds
+    """
+    return User.objects.annotate(followers=Count('followed')).order_by('-followers', 'id').first()
+
+
+def like_count_subquery():
+    """
+    Number of 'Like' Reactions of the outer Post, computed by the database
+    """
+    likes = (Reaction.objects.filter(posts=OuterRef('pk'), status=1)
+             .order_by()
+             .values('posts')
+             .annotate(count=Count('id'))
+             .values('count'))
+    return Coalesce(Subquery(likes, output_field=IntegerField()), 0)
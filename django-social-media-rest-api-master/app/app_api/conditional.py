@@ -0,0 +1,67 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """
+    Strong ETag out of the values identifying a version of a representation
+    """
+    return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    304 (or 412) response if the client already holds this version, None otherwise.
+    If-None-Match takes precedence over If-Modified-Since.
+    """
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # representations depend on the authenticated user
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def post_versions(posts):
+    """
+    Everything a serialized Post of for_viewer() depends on, for the ETag of a list or of a Post
+    """
+    return [(post.id, post.updated_at, post.like_count, post.viewer_has_liked, post.image_status,
+             post.author_id, post.author.username, post.author.first_name, post.author.last_name)
+            for post in posts]
+
+
+class ConditionalListMixin:
+    """
+    Answer If-None-Match on a paginated Post list with a 304 before anything is
+    serialized. The ETag comes from the page actually served: its Posts (edits,
+    likes, the viewer's likes, authors) and whether there is a next page.
+    No Last-Modified, likes and deletions don't show in any date of the page.
+    Ranked (?order=ranked) and streamed (?stream=true) lists are not conditional.
+    """
+
+    def list(self, request, *args, **kwargs):
+        stream = request.query_params.get(getattr(self, 'stream_query_param', None) or 'stream')
+        if request.query_params.get('order') == 'ranked' or stream in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        etag = make_etag(request.get_full_path(), request.user.pk, post_versions(page), self.paginator.has_next)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        serializer = self.get_serializer(page, many=True)
+        return set_validators(self.get_paginated_response(serializer.data), etag)
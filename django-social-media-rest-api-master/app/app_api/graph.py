@@ -0,0 +1,147 @@
+from array import array
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+
+from app_api import metrics
+from app_api.models import Follow, Friendship
+
+# cached in place of the id set when it is bigger than SOCIAL_GRAPH_CACHE_MAX_IDS
+TOO_LARGE = 'too-large'
+
+
+def graph_cache():
+    if not settings.SOCIAL_GRAPH_CACHE:
+        return None
+    return caches[settings.SOCIAL_GRAPH_CACHE]
+
+
+def cache_key(relation, user_id):
+    return f'graph:{relation}:{user_id}'
+
+
+def encode_ids(ids):
+    """
+    Sorted ids packed as an array of 64 bit integers
+    """
+    return array('q', sorted(ids)).tobytes()
+
+
+def decode_ids(data):
+    ids = array('q')
+    ids.frombytes(data)
+    return ids.tolist()
+
+
+class SocialGraph:
+    """
+    Social graph of one user. Every relation is meant to be used with __in:
+
+        Post.objects.filter(author__in=SocialGraph(request.user).friends())
+
+    Followers, followees and friends are unevaluated querysets that the database
+    resolves as a subquery of the same statement. The *_ids() methods return them
+    as sorted id lists, for the code that needs them in Python (ranking, mutual
+    friends, autocomplete), served from the graph cache unless the set is too large.
+    """
+
+    def __init__(self, user):
+        # accepts a User instance or a user id
+        self.user_id = getattr(user, 'pk', user)
+
+    def followers(self):
+        """
+        Users following this user
+        """
+        return self._followers_query()
+
+    def followees(self):
+        """
+        Users this user follows
+        """
+        return self._followees_query()
+
+    def friends(self):
+        """
+        Users with an accepted friendship, whichever side sent the request
+        """
+        return self._friends_query()
+
+    def requesters(self):
+        """
+        Users who sent this user a friend request, whatever its status
+        """
+        return Friendship.objects.filter(receiver_id=self.user_id).values_list('sender_id', flat=True)
+
+    def pending_requesters(self):
+        """
+        Users whose friend request to this user is still pending
+        """
+        return (Friendship.objects.filter(Q(receiver_id=self.user_id) & Q(status='Pending'))
+                .values_list('sender_id', flat=True))
+
+    def follower_ids(self):
+        return self._ids('followers', self._followers_query())
+
+    def followee_ids(self):
+        return self._ids('followees', self._followees_query())
+
+    def friend_ids(self):
+        return self._ids('friends', self._friends_query())
+
+    @staticmethod
+    def invalidate(user_id, *relations):
+        """
+        Drop cached relations of a user, called from the Follow and Friendship signals
+        """
+        cache = graph_cache()
+        if cache is not None:
+            cache.delete_many([cache_key(relation, user_id) for relation in relations])
+
+    @staticmethod
+    def invalidate_many(relation, user_ids):
+        """
+        Drop one cached relation of many users, for the bulk writes that skip the signals
+        """
+        cache = graph_cache()
+        if cache is not None:
+            cache.delete_many([cache_key(relation, user_id) for user_id in user_ids])
+
+    def _followers_query(self):
+        return (Follow.objects.filter(Q(receiver_id=self.user_id) & Q(status='Follow'))
+                .values_list('sender_id', flat=True))
+
+    def _followees_query(self):
+        return (Follow.objects.filter(Q(sender_id=self.user_id) & Q(status='Follow'))
+                .values_list('receiver_id', flat=True))
+
+    def _friends_query(self):
+        # the user is either side of the pair
+        higher = (Friendship.objects.filter(Q(user_low_id=self.user_id) & Q(status='Accept'))
+                  .order_by().values_list('user_high_id', flat=True))
+        lower = (Friendship.objects.filter(Q(user_high_id=self.user_id) & Q(status='Accept'))
+                 .order_by().values_list('user_low_id', flat=True))
+        return higher.union(lower)
+
+    def _ids(self, relation, query):
+        """
+        Sorted id list of a relation through the cache, queried every time when the
+        cache is disabled or the set is too large to be cached
+        """
+        cache = graph_cache()
+        if cache is None:
+            return sorted(query)
+
+        key = cache_key(relation, self.user_id)
+        data = cache.get(key)
+        if data is not None:
+            metrics.incr('graph_cache.hits')
+            if data == TOO_LARGE:
+                return sorted(query)
+            return decode_ids(data)
+
+        metrics.incr('graph_cache.misses')
+        ids = sorted(query)
+        cache.set(key, TOO_LARGE if len(ids) > settings.SOCIAL_GRAPH_CACHE_MAX_IDS else encode_ids(ids))
+        return ids
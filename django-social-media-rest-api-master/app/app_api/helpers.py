@@ -1,6 +1,32 @@
+import math
 import random
 
 
 def code_generator(length=5):
     numbers = '0123456789'
     return ''.join(random.choice(numbers) for i in range(length))
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers, used by the benchmark commands
+    """
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class QueryCounter:
+    """
+    Execute wrapper counting the SQL queries run on a connection:
+        with connection.execute_wrapper(counter): ...
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
@@ -0,0 +1,157 @@
+"""
+Resized and recompressed renditions of the uploaded images (Post.image, UserProfile.avatar),
+rendered in a process pool once the upload is committed
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESSING['WORKERS'])
+    return _executor
+
+
+def rendition_name(name, rendition):
+    """
+    Storage name of a rendition, derived from the original so that it never has to be stored:
+    'cat.png' -> 'renditions/cat.png.feed.jpg'
+    """
+    return f'renditions/{name}.{rendition}.jpg'
+
+
+def rendition_urls(field_file, status, request=None):
+    """
+    {rendition: url} of an image field once its renditions are ready, None otherwise
+    """
+    if not field_file or status != 'Ready':
+        return None
+    urls = {}
+    for rendition in settings.IMAGE_PROCESSING['RENDITIONS']:
+        url = field_file.storage.url(rendition_name(field_file.name, rendition))
+        urls[rendition] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def render_renditions(source_path, targets, quality):
+    """
+    Write the renditions of one image, runs in a worker process: no Django in here.
+    targets are (path, width, height, crop) tuples.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as original:
+        # apply the camera orientation before the EXIF data is dropped
+        image = ImageOps.exif_transpose(original)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        for path, width, height, crop in targets:
+            if crop:
+                rendition = ImageOps.fit(image, (width, height), Image.LANCZOS)
+            else:
+                rendition = image.copy()
+                rendition.thumbnail((width, height), Image.LANCZOS)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # readers never see a half written file
+            temporary_path = f'{path}.tmp'
+            rendition.save(temporary_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+            os.replace(temporary_path, path)
+    return [path for path, *_ in targets]
+
+
+def process_image_later(instance, field_name):
+    """
+    Mark the renditions of an image field as pending and render them once the
+    transaction is committed, off the request thread. The status is stored
+    in the <field_name>_status field of the model.
+    """
+    model = type(instance)
+    status_field = f'{field_name}_status'
+    field_file = getattr(instance, field_name)
+    # update() skips auto_now, updated_at versions the representation (ETags)
+    updated_at = timezone.now()
+    if not field_file:
+        model.objects.filter(pk=instance.pk).update(**{status_field: None, 'updated_at': updated_at})
+        setattr(instance, status_field, None)
+        instance.updated_at = updated_at
+        return
+
+    model.objects.filter(pk=instance.pk).update(**{status_field: 'Pending', 'updated_at': updated_at})
+    setattr(instance, status_field, 'Pending')
+    instance.updated_at = updated_at
+    job = rendition_job(instance, field_name)
+    transaction.on_commit(lambda: submit(*job))
+
+
+def rendition_job(instance, field_name):
+    """
+    Arguments of submit() for the image of an instance
+    """
+    field_file = getattr(instance, field_name)
+    targets = [
+        (field_file.storage.path(rendition_name(field_file.name, rendition)), width, height, crop)
+        for rendition, (width, height, crop) in settings.IMAGE_PROCESSING['RENDITIONS'].items()
+    ]
+    return type(instance), instance.pk, field_name, field_file.name, field_file.path, targets
+
+
+def submit(model, pk, field_name, name, source_path, targets):
+    """
+    Render the renditions of an image in the pool, the status is set when the job is done
+    """
+    config = settings.IMAGE_PROCESSING
+    arguments = (source_path, targets, config['QUALITY'])
+    if not config['WORKERS']:
+        # no pool (tests, development): render in the request
+        try:
+            render_renditions(*arguments)
+            status = 'Ready'
+        except Exception:
+            logger.exception('Rendering %s failed', name)
+            status = 'Failed'
+        set_status(model, pk, field_name, name, status)
+        return
+
+    future = get_executor().submit(render_renditions, *arguments)
+    request_thread = threading.current_thread()
+    future.add_done_callback(lambda future: finish(future, model, pk, field_name, name, request_thread))
+
+
+def finish(future, model, pk, field_name, name, request_thread):
+    """
+    Done callback of a rendering job, runs in a thread of the pool
+    (or in the request thread if the job is already done when the callback is added)
+    """
+    try:
+        future.result()
+        status = 'Ready'
+    except Exception:
+        logger.exception('Rendering %s failed', name)
+        status = 'Failed'
+    try:
+        set_status(model, pk, field_name, name, status)
+    finally:
+        # nothing else closes the database connections of the pool threads
+        if threading.current_thread() is not request_thread:
+            connections.close_all()
+
+
+def set_status(model, pk, field_name, name, status):
+    # a newer upload replaced the image meanwhile, its own job sets the status
+    updated = (model.objects.filter(**{'pk': pk, field_name: name})
+               .update(**{f'{field_name}_status': status, 'updated_at': timezone.now()}))
+    if updated and model._meta.label == 'app_api.UserProfile':
+        # the update sends no signal, drop the profile cached with request.user
+        from authentication.authentication import invalidate_user
+        invalidate_user(model.objects.filter(pk=pk).values_list('user_id', flat=True).first())
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.postgresql.base import DatabaseWrapper as DirectDatabaseWrapper
+from rest_framework.test import APIClient
+
+from app_api import metrics
+from app_api.backends.postgresql_pool.base import DatabaseWrapper as PooledDatabaseWrapper
+from app_api.benchmarks import most_followed_user
+from app_api.helpers import percentile
+
+BACKENDS = (
+    ('direct', DirectDatabaseWrapper),
+    ('pooled', PooledDatabaseWrapper),
+)
+
+
+class Command(BaseCommand):
+    help = ('Measure the connection overhead of a request on PostgreSQL: connect, the query of UserProfileView '
+            'and close, with a connection per request (direct) and with the pooled backend, from one or more '
+            'threads. --endpoint also times GET /api/users/<id>/ with the configured backend.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='timed requests per thread')
+        parser.add_argument('--threads', type=int, default=1, help='threads running requests at once')
+        parser.add_argument('--endpoint', action='store_true',
+                            help='time UserProfileView through the test client as well')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The connection overhead is measured on PostgreSQL')
+        user = most_followed_user()
+        if user is None:
+            raise CommandError('No users, seed the database first')
+
+        self.stdout.write(f'{options["threads"]} threads, {options["iterations"]} requests per thread')
+        self.stdout.write(f'{"backend":<10}{"connect p50":>13}{"connect p95":>13}{"request p50":>13}'
+                          f'{"request p95":>13}{"requests/s":>12}')
+        for name, wrapper_class in BACKENDS:
+            connect_ms, request_ms, duration = self.run_threads(wrapper_class, user.id, options)
+            self.stdout.write(
+                f'{name:<10}{percentile(connect_ms, 50):>11.2f}ms{percentile(connect_ms, 95):>11.2f}ms'
+                f'{percentile(request_ms, 50):>11.2f}ms{percentile(request_ms, 95):>11.2f}ms'
+                f'{len(request_ms) / duration:>12.0f}'
+            )
+
+        counters = metrics.snapshot()['counters']
+        checkouts = counters.get('db_pool.bench.checkouts', 0)
+        self.stdout.write(
+            f'pool: {counters.get("db_pool.bench.opened", 0)} connections opened for {checkouts} checkouts, '
+            f'{counters.get("db_pool.bench.overflow_checkouts", 0)} overflow, '
+            f'{counters.get("db_pool.bench.timeouts", 0)} timeouts, '
+            f'average wait {counters.get("db_pool.bench.wait_ms", 0) / max(checkouts, 1):.3f}ms'
+        )
+
+        if options['endpoint']:
+            self.time_endpoint(user, options['iterations'])
+
+    def run_threads(self, wrapper_class, user_id, options):
+        connect_ms, request_ms = [], []
+        threads = [threading.Thread(target=self.run_requests,
+                                    args=(wrapper_class, user_id, options['iterations'], connect_ms, request_ms))
+                   for _ in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return connect_ms, request_ms, time.perf_counter() - start
+
+    def run_requests(self, wrapper_class, user_id, iterations, connect_ms, request_ms):
+        # a wrapper per thread, like the connections of Django
+        database = wrapper_class(dict(connection.settings_dict), alias='bench')
+        for iteration in range(iterations + 1):
+            start = time.perf_counter()
+            database.ensure_connection()
+            connected = time.perf_counter()
+            with database.cursor() as cursor:
+                cursor.execute('SELECT * FROM app_api_userprofile WHERE user_id = %s', [user_id])
+                cursor.fetchall()
+            # the end of a request with CONN_MAX_AGE = 0
+            database.close()
+            end = time.perf_counter()
+            # the first one opens the pool
+            if iteration:
+                connect_ms.append((connected - start) * 1000)
+                request_ms.append((end - start) * 1000)
+
+    def time_endpoint(self, user, iterations):
+        client = APIClient()
+        client.force_authenticate(user)
+        path = f'/api/users/{user.id}/'
+        latencies = []
+        for iteration in range(iterations + 1):
+            start = time.perf_counter()
+            client.get(path)
+            # the test client leaves the connection open, a WSGI server closes it after the response
+            connection.close()
+            if iteration:
+                latencies.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(f'GET {path} with {connection.settings_dict["ENGINE"]}: '
+                          f'p50 {percentile(latencies, 50):.2f}ms, p95 {percentile(latencies, 95):.2f}ms')
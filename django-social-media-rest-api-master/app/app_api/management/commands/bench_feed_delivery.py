@@ -0,0 +1,114 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from app_api.helpers import percentile, QueryCounter
+from app_api.models import Post, Follow, TimelineEntry, UserProfile
+from app_api.timeline import fan_out_post, home_timeline, reclassify_authors
+
+User = get_user_model()
+
+MODES = ('push', 'pull', 'hybrid')
+
+
+class Command(BaseCommand):
+    help = ('Compare write amplification and read latency of push, pull and hybrid feed delivery '
+            'on a synthetic graph. Everything runs in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--celebrities', type=int, default=5)
+        parser.add_argument('--celebrity-reach', type=float, default=0.8,
+                            help='fraction of the users following every celebrity')
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=300)
+        parser.add_argument('--celebrity-post-share', type=float, default=0.2)
+        parser.add_argument('--reads', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--threshold', type=int,
+                            help='follower threshold of the hybrid mode (defaults to --users / 10)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        threshold = options['threshold'] or max(options['users'] // 10, 1)
+
+        results = {}
+        with transaction.atomic():
+            user_ids, celebrity_ids = self.create_graph(options)
+            for mode in MODES:
+                with override_settings(FEED_DELIVERY_MODE=mode, FEED_PUSH_MAX_FOLLOWERS=threshold):
+                    results[mode] = self.run_mode(mode, user_ids, celebrity_ids, options)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{options["users"]} users, {options["celebrities"]} celebrities, '
+                          f'{options["posts"]} posts, {options["reads"]} reads, hybrid threshold {threshold}')
+        self.stdout.write(f'{"mode":<8}{"rows/post":>11}{"queries/post":>14}'
+                          f'{"write p50":>11}{"write p95":>11}{"read p50":>10}{"read p95":>10}')
+        for mode, result in results.items():
+            self.stdout.write(
+                f'{mode:<8}{result["rows_per_post"]:>11.1f}{result["queries_per_post"]:>14.1f}'
+                f'{percentile(result["write_ms"], 50):>9.2f}ms{percentile(result["write_ms"], 95):>9.2f}ms'
+                f'{percentile(result["read_ms"], 50):>8.2f}ms{percentile(result["read_ms"], 95):>8.2f}ms'
+            )
+
+    def create_graph(self, options):
+        prefix = f'bench-feed-{random.getrandbits(32):08x}-'
+        User.objects.bulk_create([User(username=f'{prefix}{i}') for i in range(options['users'])])
+        user_ids = list(User.objects.filter(username__startswith=prefix).values_list('id', flat=True))
+        UserProfile.objects.bulk_create([UserProfile(user_id=user_id) for user_id in user_ids])
+
+        celebrity_ids = user_ids[:options['celebrities']]
+        regular_ids = user_ids[options['celebrities']:]
+        edges = set()
+        for sender_id in regular_ids:
+            for receiver_id in random.sample(regular_ids, min(options['follows_per_user'], len(regular_ids))):
+                edges.add((sender_id, receiver_id))
+            for receiver_id in celebrity_ids:
+                if random.random() < options['celebrity_reach']:
+                    edges.add((sender_id, receiver_id))
+        Follow.objects.bulk_create(
+            [Follow(sender_id=sender_id, receiver_id=receiver_id) for sender_id, receiver_id in edges
+             if sender_id != receiver_id]
+        )
+        return user_ids, celebrity_ids
+
+    def run_mode(self, mode, user_ids, celebrity_ids, options):
+        Post.objects.filter(author_id__in=user_ids).delete()
+        TimelineEntry.objects.filter(owner_id__in=user_ids).delete()
+        UserProfile.objects.filter(user_id__in=user_ids).update(feed_delivery='Push')
+        if mode == 'hybrid':
+            reclassify_authors()
+
+        regular_ids = user_ids[len(celebrity_ids):]
+        write_ms = []
+        counter = QueryCounter()
+        for i in range(options['posts']):
+            if celebrity_ids and random.random() < options['celebrity_post_share']:
+                author_id = random.choice(celebrity_ids)
+            else:
+                author_id = random.choice(regular_ids)
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                post = Post.objects.create(author_id=author_id, title=f'post {i}', body='benchmark')
+                fan_out_post(post)
+                write_ms.append((time.perf_counter() - start) * 1000)
+        rows = TimelineEntry.objects.filter(owner_id__in=user_ids).count()
+
+        read_ms = []
+        for reader_id in random.choices(regular_ids, k=options['reads']):
+            reader = User(id=reader_id)
+            start = time.perf_counter()
+            list(home_timeline(reader, options['page_size']).order_by('-created_at', '-id')[:options['page_size']])
+            read_ms.append((time.perf_counter() - start) * 1000)
+
+        return {
+            'rows_per_post': rows / options['posts'],
+            'queries_per_post': counter.count / options['posts'],
+            'write_ms': write_ms,
+            'read_ms': read_ms,
+        }
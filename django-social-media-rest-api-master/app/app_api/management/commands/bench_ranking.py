@@ -0,0 +1,74 @@
+import math
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app_api.helpers import percentile
+from app_api.ranking import score_posts
+
+
+def score_posts_loop(ages, likes, author_ids, friend_ids, followee_ids, follower_ids):
+    """
+    Per-object reference implementation of score_posts, for comparison only
+    """
+    config = settings.FEED_RANKING
+    friends, followees, followers = set(friend_ids), set(followee_ids), set(follower_ids)
+    scores = []
+    for age, like_count, author_id in zip(ages, likes, author_ids):
+        if author_id in friends:
+            affinity = config['AFFINITY']['friend']
+        elif author_id in followees:
+            affinity = config['AFFINITY']['followee']
+        elif author_id in followers:
+            affinity = config['AFFINITY']['follower']
+        else:
+            affinity = config['AFFINITY']['other']
+        decay = 0.5 ** (max(age, 0) / (config['HALF_LIFE_HOURS'] * 3600))
+        scores.append((1 + config['LIKE_WEIGHT'] * math.log1p(like_count)) * affinity * decay)
+    return scores
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the vectorized feed scoring against a per-object loop on synthetic candidate sets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 10000, 50000])
+        parser.add_argument('--authors', type=int, default=5000)
+        parser.add_argument('--graph-size', type=int, default=300,
+                            help='number of friends, followees and followers of the viewer')
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        friend_ids, followee_ids, follower_ids = (
+            rng.choice(options['authors'], options['graph_size'], replace=False) for _ in range(3)
+        )
+
+        self.stdout.write(f'{"candidates":>10}{"numpy p50":>12}{"numpy p95":>12}{"loop p50":>12}{"speedup":>9}')
+        for size in options['sizes']:
+            ages = rng.uniform(0, 7 * 24 * 3600, size)
+            likes = rng.zipf(2.0, size) - 1
+            author_ids = rng.integers(0, options['authors'], size)
+
+            vectorized = self.time(options['repeat'], score_posts,
+                                   ages, likes, author_ids, friend_ids, followee_ids, follower_ids)
+            # the loop is slow, a few runs are enough
+            loop = self.time(max(options['repeat'] // 10, 1), score_posts_loop,
+                             ages.tolist(), likes.tolist(), author_ids.tolist(),
+                             friend_ids.tolist(), followee_ids.tolist(), follower_ids.tolist())
+            self.stdout.write(
+                f'{size:>10}{percentile(vectorized, 50):>10.3f}ms{percentile(vectorized, 95):>10.3f}ms'
+                f'{percentile(loop, 50):>10.3f}ms{percentile(loop, 50) / percentile(vectorized, 50):>8.1f}x'
+            )
+
+    @staticmethod
+    def time(repeat, func, *args):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
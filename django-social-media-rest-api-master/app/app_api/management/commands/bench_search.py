@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from app_api.benchmarks import VOCABULARY, most_followed_user
+from app_api.helpers import percentile
+from app_api.models import Post
+from app_api.search import search_posts
+
+
+class Command(BaseCommand):
+    help = ('Measure the latency of the Post search query on a seeded database (seed_social_graph) '
+            'for common, rare and multi-word queries, next to the icontains scan it replaces')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='timed queries per query string')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--query', action='append', help='query to measure, repeatable (default: a range '
+                                                             'of seeded words from common to rare)')
+
+    def handle(self, *args, **options):
+        user = most_followed_user()
+        if user is None or not Post.objects.exists():
+            raise CommandError('No Posts to search, seed the database first')
+
+        queries = options['query'] or [
+            VOCABULARY[0], VOCABULARY[10], VOCABULARY[len(VOCABULARY) // 2], VOCABULARY[-1],
+            f'{VOCABULARY[3]} {VOCABULARY[40]}', 'nonexistentword',
+        ]
+        self.stdout.write(f'{Post.objects.count()} posts on {connection.vendor}, {options["iterations"]} '
+                          f'runs per query, page size {options["page_size"]}')
+        self.stdout.write(f'{"query":<24}{"results":>9}{"search p50":>12}{"search p95":>12}'
+                          f'{"scan p50":>10}{"scan p95":>10}')
+        for query in queries:
+            # both timed as ORM querysets, the serialization of the endpoint is the same for either
+            search = self.search_query(user, query, options['page_size'])
+            search_ms = self.measure(lambda: list(search.all()), options['iterations'])
+            scan = self.icontains_query(user, query, options['page_size'])
+            scan_ms = self.measure(lambda: list(scan.all()), options['iterations'])
+            matches = list(search.all())
+            self.stdout.write(
+                f'{query:<24}{len(matches):>9}'
+                f'{percentile(search_ms, 50):>10.2f}ms{percentile(search_ms, 95):>10.2f}ms'
+                f'{percentile(scan_ms, 50):>8.2f}ms{percentile(scan_ms, 95):>8.2f}ms'
+            )
+
+    def search_query(self, user, query, page_size):
+        # the ordering of PostSearchKeysetPagination
+        return search_posts(Post.objects.for_viewer(user), query).order_by('-rank', '-id')[:page_size]
+
+    def icontains_query(self, user, query, page_size):
+        condition = Q()
+        for term in query.split():
+            condition &= Q(title__icontains=term) | Q(body__icontains=term)
+        return Post.objects.for_viewer(user).filter(condition).order_by('-id')[:page_size]
+
+    def measure(self, function, iterations):
+        # warm up the caches
+        function()
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            function()
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_api.suggestions import connector_matrix, load_graph, store_suggestions, top_suggestions
+
+
+class Command(BaseCommand):
+    help = ('Compute the friend suggestions of every user from the mutual connections of the social graph. '
+            'Run one process per shard (--shards N --shard 0..N-1) to split the work.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=20, help='suggestions kept per user')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='users multiplied and stored at once')
+        parser.add_argument('--max-degree', type=int, default=5000,
+                            help='users with more connections are not counted as mutual connections')
+        parser.add_argument('--shards', type=int, default=1, help='number of processes sharing the work')
+        parser.add_argument('--shard', type=int, default=0, help='shard of this process, from 0 to --shards - 1')
+
+    def handle(self, *args, **options):
+        shards, shard = options['shards'], options['shard']
+        if not 0 <= shard < shards:
+            raise CommandError('--shard must be between 0 and --shards - 1')
+
+        started = time.perf_counter()
+        # every process loads the whole graph, the rows it multiplies are its shard of the user ids
+        adjacency, excluded = load_graph()
+        connectors = connector_matrix(adjacency, options['max_degree'])
+        size = adjacency.shape[0]
+        self.stdout.write(f'Loaded {adjacency.nnz // 2} connections of {size - 1} user ids '
+                          f'in {time.perf_counter() - started:.1f}s')
+
+        first, last = size * shard // shards, size * (shard + 1) // shards
+        users = suggestions = 0
+        for start in range(first, last, options['chunk_size']):
+            stop = min(start + options['chunk_size'], last)
+            chunk = list(top_suggestions(adjacency, excluded, connectors, start, stop, options['top_k']))
+            store_suggestions(start, stop, chunk)
+            users += len({user_id for user_id, _, _ in chunk})
+            suggestions += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {suggestions} suggestions for {users} users (ids {first} to {last - 1}) '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,95 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.generics import GenericAPIView
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app_api.benchmarks import list_urls, most_followed_user
+
+User = get_user_model()
+
+# plan lines reading a whole table: PostgreSQL, SQLite ("SCAN TABLE t" before 3.36, "SCAN t" after)
+SEQUENTIAL_SCANS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)$'),
+}
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN the first page of every list view as seen by one user of a seeded database '
+            'and flag the sequential scans')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='viewing user id, defaults to the most followed user')
+        parser.add_argument('--analyze', action='store_true', help='run the queries (PostgreSQL EXPLAIN ANALYZE)')
+        parser.add_argument('--verbose-plans', action='store_true', help='print every plan, not only the flagged ones')
+        parser.add_argument('--fail', action='store_true', help='exit with an error when a scan is flagged')
+        parser.add_argument('--search', default='coffee', help='?q= of the search views')
+
+    def handle(self, *args, **options):
+        pattern = SEQUENTIAL_SCANS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Sequential scan detection is not supported on {connection.vendor}')
+        user = self.get_user(options['user'])
+        explain_options = {'analyze': True} if options['analyze'] else {}
+
+        flagged = 0
+        for route, view_class, kwarg_names in list_urls():
+            if not issubclass(view_class, GenericAPIView):
+                continue
+            # url parameters (author_id, pk...) all point to the viewing user
+            queryset = self.get_queryset(view_class, user, {name: str(user.pk) for name in kwarg_names},
+                                         {'q': options['search']})
+            if queryset is None:
+                continue
+            plan = queryset.explain(**explain_options)
+            scans = [match.group(1) for match in map(pattern.search, plan.splitlines()) if match]
+
+            if scans:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f'{route} ({view_class.__name__}): sequential scan of '
+                                                     f'{", ".join(scans)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{route} ({view_class.__name__}): ok'))
+            if scans or options['verbose_plans']:
+                self.stdout.write(f'    {str(queryset.query)}')
+                self.stdout.write('\n'.join(f'    {line}' for line in plan.splitlines()))
+
+        if flagged and options['fail']:
+            raise CommandError(f'{flagged} views scan a whole table')
+
+    def get_user(self, user_id):
+        if user_id is not None:
+            try:
+                return User.objects.get(pk=user_id)
+            except User.DoesNotExist:
+                raise CommandError(f'User {user_id} does not exist')
+        user = most_followed_user()
+        if user is None:
+            raise CommandError('The database is empty, seed it first')
+        return user
+
+    def get_queryset(self, view_class, user, kwargs, query_params):
+        """
+        Queryset of the first page of a view, built the way the view builds it for a GET
+        """
+        request = APIRequestFactory().get('/', query_params)
+        force_authenticate(request, user)
+        view = view_class()
+        view.args, view.kwargs, view.format_kwarg = (), kwargs, None
+        view.request = view.initialize_request(request)
+        try:
+            queryset = view.filter_queryset(view.get_queryset())
+        except AssertionError:
+            # no queryset, e.g. a create only view
+            return None
+
+        paginator = view.paginator
+        ordering = getattr(paginator, 'ordering', None)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        if paginator is not None:
+            queryset = queryset[:paginator.get_page_size(view.request)]
+        return queryset
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from app_api.timeline import rebuild_timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized home timelines from the Follow and Post tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, dest='user_id', help='only rebuild the timeline of this user id')
+
+    def handle(self, *args, **options):
+        if options['user_id']:
+            user_ids = [options['user_id']]
+        else:
+            user_ids = User.objects.order_by('id').values_list('id', flat=True).iterator()
+
+        rebuilt = 0
+        for user_id in user_ids:
+            rebuild_timeline(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timelines'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_api.timeline import reclassify_authors
+
+
+class Command(BaseCommand):
+    help = 'Switch authors between push and pull feed delivery based on their Follow counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=int, help='follower count above which an author is pulled '
+                                                          '(defaults to FEED_PUSH_MAX_FOLLOWERS)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            to_pull, to_push = reclassify_authors(options['threshold'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(to_pull)} authors switched to pull, {len(to_push)} authors switched to push'
+        ))
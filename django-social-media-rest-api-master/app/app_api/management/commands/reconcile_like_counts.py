@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+
+from app_api.benchmarks import like_count_subquery
+from app_api.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recompute the Post.like_count counters that drifted from the Reaction table, in chunks of posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='only report the drifted counters')
+
+    def handle(self, *args, **options):
+        checked = drifted = 0
+        last_id = 0
+        while True:
+            chunk = list(
+                Post.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .annotate(actual=Count('post_reactions', filter=Q(post_reactions__status=1)))
+                .values_list('id', 'like_count', 'actual')[:options['chunk_size']]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            checked += len(chunk)
+
+            drifted_ids = [post_id for post_id, like_count, actual in chunk if like_count != actual]
+            drifted += len(drifted_ids)
+            if drifted_ids and not options['dry_run']:
+                # recount inside the UPDATE so that likes added meanwhile are not lost
+                Post.objects.filter(id__in=drifted_ids).update(like_count=like_count_subquery())
+
+        action = 'found' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} posts, {action} {drifted} drifted like counters'))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from app_api.images import get_executor, rendition_job, submit
+from app_api.models import Post, UserProfile
+
+# (model, image field) pairs having renditions
+IMAGE_FIELDS = ((Post, 'image'), (UserProfile, 'avatar'))
+
+
+class Command(BaseCommand):
+    help = 'Render the missing renditions of the post images and avatars (uploaded before the pipeline or failed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='render the ready renditions again as well')
+
+    def handle(self, *args, **options):
+        submitted = 0
+        for model, field_name in IMAGE_FIELDS:
+            status_field = f'{field_name}_status'
+            queryset = model.objects.exclude(Q(**{f'{field_name}__isnull': True}) | Q(**{field_name: ''}))
+            if not options['all']:
+                queryset = queryset.filter(Q(**{f'{status_field}__isnull': True}) | Q(**{status_field: 'Failed'}))
+
+            for instance in queryset.only('pk', field_name).iterator():
+                model.objects.filter(pk=instance.pk).update(**{status_field: 'Pending'})
+                submit(*rendition_job(instance, field_name))
+                submitted += 1
+
+        if settings.IMAGE_PROCESSING['WORKERS']:
+            # the statuses are set by the pool threads, wait for them
+            get_executor().shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS(f'Rendered {submitted} images'))
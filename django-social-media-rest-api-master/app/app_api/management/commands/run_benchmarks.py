@@ -0,0 +1,184 @@
+import json
+import re
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from app_api.benchmarks import list_urls, most_followed_user
+from app_api.helpers import percentile, QueryCounter
+from app_api.models import Post, UserProfile
+
+User = get_user_model()
+
+# routes that are not part of the API (the docs render the schema of every view)
+EXCLUDED_PREFIXES = ('admin/', 'api-auth/', 'api/docs/')
+
+
+class Command(BaseCommand):
+    help = ('GET every url of the API with the DRF test client as one user of a seeded database and report '
+            'the p50/p95/p99 latency, SQL queries and peak memory of each endpoint as JSON. Rate limiting and '
+            'load shedding are turned off during the run, an endpoint failing or answering other than 2xx '
+            'is reported as failed, one the user is not allowed to GET as skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='viewing user id, defaults to the most followed user')
+        parser.add_argument('--iterations', type=int, default=50, help='timed requests per endpoint')
+        parser.add_argument('--filter', default='', help='only benchmark the routes containing this string')
+        parser.add_argument('--search', default='coffee', help='?q= of the search views')
+        parser.add_argument('--output', help='write the report to this file instead of stdout')
+        parser.add_argument('--baseline', help='report of a previous run to compare with')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='relative p95 slowdown tolerated before flagging a regression')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+
+        values = self.url_values(user)
+        endpoints = {}
+        # the benchmark would measure 429 and 503 answers otherwise
+        with override_settings(RATE_LIMITING=dict(settings.RATE_LIMITING, BUDGETS={}),
+                               LOAD_SHEDDING=dict(settings.LOAD_SHEDDING, ENABLED=False)):
+            for route, view_class, _ in list_urls():
+                if route.startswith(EXCLUDED_PREFIXES) or options['filter'] not in route:
+                    continue
+                if not hasattr(view_class, 'get'):
+                    continue
+                path = '/' + self.fill_route(route, values)
+                if not self.allowed(view_class, path, user):
+                    endpoints[route] = {'path': path, 'skipped': f'not allowed for user {user.pk}'}
+                    continue
+                try:
+                    endpoints[route] = self.benchmark(client, path, {'q': options['search']}, options['iterations'])
+                except Exception as error:
+                    endpoints[route] = {'path': path, 'error': repr(error)}
+        failures = {route: result for route, result in endpoints.items() if 'error' in result}
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'vendor': connection.vendor,
+            'debug': settings.DEBUG,
+            'user': user.pk,
+            'iterations': options['iterations'],
+            'endpoints': endpoints,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+        for route, result in endpoints.items():
+            if 'skipped' in result:
+                self.stderr.write(self.style.WARNING(f'{route}: skipped, {result["skipped"]}'))
+        for route, result in failures.items():
+            self.stderr.write(self.style.ERROR(f'{route}: {result["error"]}'))
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['tolerance'])
+        if failures:
+            raise CommandError(f'{len(failures)} endpoints failed')
+
+    def get_user(self, user_id):
+        user = User.objects.filter(pk=user_id).first() if user_id is not None else most_followed_user()
+        if user is None:
+            raise CommandError('No user to benchmark with, seed the database first')
+        return user
+
+    def url_values(self, user):
+        """
+        Url parameters pointing to the user or to one of the user's Posts
+        """
+        post = Post.objects.filter(author=user).order_by('-id').first() or Post.objects.order_by('-id').first()
+        profile = UserProfile.objects.filter(user=user).first()
+        return {
+            'author_id': user.pk,
+            'user_id': user.pk,
+            'post_id': post.pk if post else 0,
+            'post_pk': post.pk if post else 0,
+            'profile_pk': profile.pk if profile else 0,
+        }
+
+    def fill_route(self, route, values):
+        # posts/<pk>/ is a Post, users/<int:pk>/ a UserProfile
+        pk = values['post_pk'] if route.startswith('api/posts/') else values['profile_pk']
+        return re.sub(r'\(\?P<(\w+)>[^)]*\)|<(?:\w+:)?(\w+)>',
+                      lambda match: str(values.get(match.group(1) or match.group(2), pk)), route)
+
+    def allowed(self, view_class, path, user):
+        """
+        Whether the user passes the permission checks of the view (e.g. IsAdminUser), object permissions aside
+        """
+        if not issubclass(view_class, APIView):
+            return True
+        view = view_class()
+        request = view.initialize_request(APIRequestFactory().get(path))
+        request.user = user
+        return all(permission.has_permission(request, view) for permission in view.get_permissions())
+
+    def benchmark(self, client, path, data, iterations):
+        # warm up the caches (graph ids, url resolver, serializer fields)
+        response = client.get(path, data)
+        if not 200 <= response.status_code < 300:
+            return {'path': path, 'status': response.status_code, 'error': f'status {response.status_code}'}
+
+        latencies = []
+        queries = []
+        for _ in range(iterations):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                response = client.get(path, data)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(counter.count)
+            if not 200 <= response.status_code < 300:
+                return {'path': path, 'status': response.status_code, 'error': f'status {response.status_code}'}
+
+        # tracemalloc slows the interpreter down, memory is measured on a separate request
+        tracemalloc.start()
+        try:
+            client.get(path, data)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'path': path,
+            'status': response.status_code,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'queries': percentile(queries, 50),
+            'max_queries': max(queries, default=0),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def compare(self, report, baseline_path, tolerance):
+        with open(baseline_path) as file:
+            baseline = json.load(file)['endpoints']
+
+        regressions = []
+        for route, result in report['endpoints'].items():
+            previous = baseline.get(route)
+            # failed or skipped endpoints have no timings
+            if previous is None or 'p95_ms' not in result or 'p95_ms' not in previous:
+                continue
+            if result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                regressions.append(f'{route}: p95 {previous["p95_ms"]}ms -> {result["p95_ms"]}ms')
+            if result['queries'] > previous['queries']:
+                regressions.append(f'{route}: queries {previous["queries"]} -> {result["queries"]}')
+
+        for regression in regressions:
+            self.stderr.write(self.style.WARNING(regression))
+        if regressions:
+            raise CommandError(f'{len(regressions)} regressions against {baseline_path}')
+        self.stderr.write(self.style.SUCCESS(f'No regression against {baseline_path}'))
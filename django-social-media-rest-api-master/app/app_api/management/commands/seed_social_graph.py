@@ -0,0 +1,127 @@
+import itertools
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app_api.benchmarks import VOCABULARY, VOCABULARY_WEIGHTS, like_count_subquery
+from app_api.models import Post, Reaction, Follow, Friendship, UserProfile, FRIEND_REQUEST_CHOICES
+from app_api.timeline import rebuild_timeline, reclassify_authors
+
+User = get_user_model()
+
+# share of each status among the seeded friend requests
+FRIENDSHIP_STATUS_WEIGHTS = {'Accept': 0.6, 'Pending': 0.25, 'Reject': 0.15}
+
+
+def bulk_insert(model, objects, chunk_size=5000):
+    """
+    bulk_create a generator of instances without materializing it
+    """
+    objects = iter(objects)
+    created = 0
+    while True:
+        chunk = list(itertools.islice(objects, chunk_size))
+        if not chunk:
+            return created
+        model.objects.bulk_create(chunk)
+        created += len(chunk)
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic social graph with bulk inserts: users with profiles, a power-law follow '
+            'distribution, friendships in every status, posts and reactions')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--follows-per-user', type=int, default=20, help='average number of followees')
+        parser.add_argument('--exponent', type=float, default=1.1,
+                            help='exponent of the Zipf distribution of the followers among users')
+        parser.add_argument('--friendships-per-user', type=int, default=5, help='average number of friend requests')
+        parser.add_argument('--posts-per-user', type=int, default=10, help='average number of posts')
+        parser.add_argument('--reactions-per-post', type=int, default=5, help='average number of likes')
+        parser.add_argument('--prefix', default='seed-', help='username prefix of the seeded users')
+        parser.add_argument('--password', default='seed-password', help='password of every seeded user')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Users named {prefix}* already exist, choose another --prefix')
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            user_ids = self.create_users(options)
+            follows = bulk_insert(Follow, self.generate_follows(user_ids, options))
+            friendships = bulk_insert(Friendship, self.generate_friendships(user_ids, options))
+            posts = bulk_insert(Post, self.generate_posts(user_ids, options))
+            post_ids = list(Post.objects.filter(author__username__startswith=prefix).values_list('id', flat=True))
+            reactions = bulk_insert(Reaction, self.generate_reactions(user_ids, post_ids, options))
+            Post.objects.filter(author__username__startswith=prefix).update(like_count=like_count_subquery())
+
+        # timelines last, with the hybrid delivery classification of the new graph
+        reclassify_authors()
+        for user_id in user_ids:
+            rebuild_timeline(user_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(user_ids)} users, {follows} follows, {friendships} friendships, {posts} posts '
+            f'and {reactions} reactions in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def create_users(self, options):
+        prefix = options['prefix']
+        # hashing is slow on purpose, every seeded user shares the same hash
+        password = make_password(options['password'])
+        bulk_insert(User, (User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password=password)
+                           for i in range(options['users'])))
+        user_ids = list(User.objects.filter(username__startswith=prefix).order_by('id').values_list('id', flat=True))
+        # bulk_create skips the post_save signal creating the profiles
+        bulk_insert(UserProfile, (UserProfile(user_id=user_id, age=random.randint(16, 80),
+                                              sex=random.choice(['Male', 'Female'])) for user_id in user_ids))
+        return user_ids
+
+    def generate_follows(self, user_ids, options):
+        # rank r gets a share of the followers proportional to 1 / r ** exponent
+        ranked = random.sample(user_ids, len(user_ids))
+        cum_weights = list(itertools.accumulate(1 / rank ** options['exponent'] for rank in range(1, len(ranked) + 1)))
+        for sender_id in user_ids:
+            count = random.randint(0, 2 * options['follows_per_user'])
+            receiver_ids = set(random.choices(ranked, cum_weights=cum_weights, k=count))
+            receiver_ids.discard(sender_id)
+            for receiver_id in receiver_ids:
+                yield Follow(sender_id=sender_id, receiver_id=receiver_id)
+
+    def generate_friendships(self, user_ids, options):
+        statuses = [status for status, _ in FRIEND_REQUEST_CHOICES]
+        weights = [FRIENDSHIP_STATUS_WEIGHTS[status] for status in statuses]
+        # one request per pair of users, whichever side sent it
+        pairs = set()
+        for sender_id in user_ids:
+            for receiver_id in random.sample(user_ids, min(random.randint(0, 2 * options['friendships_per_user']),
+                                                           len(user_ids))):
+                pair = frozenset((sender_id, receiver_id))
+                if sender_id == receiver_id or pair in pairs:
+                    continue
+                pairs.add(pair)
+                # bulk_create skips Friendship.save, which orders the pair
+                yield Friendship(sender_id=sender_id, receiver_id=receiver_id,
+                                 user_low_id=min(pair), user_high_id=max(pair),
+                                 status=random.choices(statuses, weights)[0])
+
+    def generate_posts(self, user_ids, options):
+        for author_id in user_ids:
+            for i in range(random.randint(0, 2 * options['posts_per_user'])):
+                title = ' '.join(random.choices(VOCABULARY, VOCABULARY_WEIGHTS, k=random.randint(2, 6)))
+                body = ' '.join(random.choices(VOCABULARY, VOCABULARY_WEIGHTS, k=random.randint(5, 80)))
+                yield Post(author_id=author_id, title=f'{title} {i}', body=body)
+
+    def generate_reactions(self, user_ids, post_ids, options):
+        for post_id in post_ids:
+            count = min(random.randint(0, 2 * options['reactions_per_post']), len(user_ids))
+            for user_id in random.sample(user_ids, count):
+                yield Reaction(user_reacted_id=user_id, posts_id=post_id)
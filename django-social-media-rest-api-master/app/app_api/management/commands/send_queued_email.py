@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app_api.outbox import queue_depth, send_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Send the queued outbound emails in batches, retrying the failed ones with exponential backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='emails sent over one connection')
+        parser.add_argument('--once', action='store_true', help='send the due emails and exit instead of polling')
+        parser.add_argument('--interval', type=float, help='seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.EMAIL_OUTBOX['POLL_INTERVAL']
+        while True:
+            sent, failed = send_queued_emails(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}, {queue_depth()} still queued')
+            elif options['once']:
+                self.stdout.write(self.style.SUCCESS(f'No email due, {queue_depth()} queued for a later retry'))
+                return
+            else:
+                time.sleep(interval)
+            # a long running worker must not keep a stale connection
+            close_old_connections()
@@ -0,0 +1,30 @@
+"""
+Process-local counters and gauges, exposed to staff users on /api/metrics/
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def register_gauge(name, func):
+    """
+    Register a callable evaluated every time the metrics are read
+    """
+    _gauges[name] = func
+
+
+def snapshot():
+    with _lock:
+        counters = dict(_counters)
+    return {
+        'counters': counters,
+        'gauges': {name: func() for name, func in _gauges.items()},
+    }
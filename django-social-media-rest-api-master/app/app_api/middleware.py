@@ -0,0 +1,120 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from app_api import metrics
+
+logger = logging.getLogger('app_api.requests')
+
+
+class QueryRecorder:
+    """
+    Execute wrapper timing every SQL query of a request. Only references to the SQL
+    strings are kept, they are formatted when the request turns out to be slow.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = (0.0, None)
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            self.queries.append((duration, sql))
+            if duration > self.slowest[0]:
+                self.slowest = (duration, sql)
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Record the SQL queries and the time spent in the database, in the view (serialization
+    and other Python code, outside SQL) and in the renderer for a sample of the requests.
+    Sampled requests get a JSON log line on the 'app_api.requests' logger, with the full query
+    list when the request is slower than SLOW_REQUEST_MS, and a Server-Timing header for staff users.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = settings.REQUEST_INSTRUMENTATION
+
+    def __call__(self, request):
+        if random.random() >= self.config['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._instrumentation = timings = {'recorder': recorder}
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        end = time.perf_counter()
+
+        self.report(request, response, recorder, timings, start, end)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = getattr(request, '_instrumentation', None)
+        if timings is not None:
+            timings['view_start'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF Responses are rendered by the handler right after this hook
+        timings = getattr(request, '_instrumentation', None)
+        if timings is not None:
+            timings['render_start'] = time.perf_counter()
+            timings['render_queries'] = timings['recorder'].duration
+            response.add_post_render_callback(lambda response: timings.update(render_end=time.perf_counter()))
+        return response
+
+    def report(self, request, response, recorder, timings, start, end):
+        view_start = timings.get('view_start', start)
+        view_end = timings.get('render_start', end)
+        # database time of the view, queries run while rendering (lazy querysets) are left out
+        view_db = timings.get('render_queries', recorder.duration)
+        phases = [
+            ('db', recorder.duration, f'{recorder.count} queries'),
+            ('view', max(view_end - view_start - view_db, 0), 'view code outside SQL, mostly serialization'),
+            ('render', timings.get('render_end', view_end) - view_end, 'response rendering'),
+            ('total', end - start, None),
+        ]
+
+        # the API views authenticate the user of the JWT onto the request
+        user = getattr(request, 'user', None)
+        if self.config['SERVER_TIMING'] and getattr(user, 'is_staff', False):
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={duration * 1000:.2f}' + (f';desc="{description}"' if description else '')
+                for name, duration, description in phases
+            )
+
+        total_ms = (end - start) * 1000
+        slow = total_ms >= self.config['SLOW_REQUEST_MS']
+        entry = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'user': getattr(user, 'pk', None),
+            'queries': recorder.count,
+            'slowest_query_ms': round(recorder.slowest[0] * 1000, 2),
+            'slowest_query': recorder.slowest[1],
+        }
+        entry.update({f'{name}_ms': round(duration * 1000, 2) for name, duration, _ in phases})
+        metrics.incr('requests.sampled')
+        if slow:
+            metrics.incr('requests.slow')
+            entry['sql'] = [{'ms': round(duration * 1000, 2), 'sql': sql} for duration, sql in recorder.queries]
+            logger.warning(json.dumps(entry))
+        else:
+            logger.info(json.dumps(entry))
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.3 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0002_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='feed_delivery',
+            field=models.CharField(choices=[('Push', 'Push'), ('Pull', 'Pull')], default='Push', help_text='Push: posts are fanned out to the followers timelines, Pull: posts are merged in at read time', max_length=4, verbose_name='feed delivery'),
+        ),
+    ]
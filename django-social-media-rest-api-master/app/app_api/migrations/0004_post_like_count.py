@@ -0,0 +1,32 @@
+# Generated by Django 2.2.3 on 2026-10-18 19:58
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_likes(apps, schema_editor):
+    Post = apps.get_model('app_api', 'Post')
+    Reaction = apps.get_model('app_api', 'Reaction')
+    likes = (Reaction.objects.filter(posts=OuterRef('pk'), status=1)
+             .order_by()
+             .values('posts')
+             .annotate(count=Count('id'))
+             .values('count'))
+    Post.objects.update(like_count=Coalesce(Subquery(likes, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0003_userprofile_feed_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_likes, migrations.RunPython.noop),
+    ]
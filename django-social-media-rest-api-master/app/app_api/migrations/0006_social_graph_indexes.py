@@ -0,0 +1,49 @@
+# Generated by Django 2.2.3 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0005_userprofile_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(condition=models.Q(status='Follow'), fields=['receiver', 'sender'], name='follow_receiver_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(condition=models.Q(status='Follow'), fields=['sender', 'receiver'], name='follow_sender_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['receiver', 'status'], name='friendship_receiver_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(condition=models.Q(status='Accept'), fields=['sender', 'receiver'], name='friendship_sender_accept_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(condition=models.Q(status='Accept'), fields=['receiver', 'sender'], name='friendship_receiver_accept_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reaction',
+            index=models.Index(fields=['user_reacted', '-id'], name='reaction_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reaction',
+            index=models.Index(fields=['posts', 'status'], name='reaction_posts_status_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.3 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0006_social_graph_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Ready', 'Ready'), ('Failed', 'Failed')], max_length=7, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Ready', 'Ready'), ('Failed', 'Failed')], max_length=7, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.3 on 2026-10-18 20:31
+
+from django.db import migrations
+from django.db.models import F
+
+# the status a pair ends up with, requests used to be answered with a new row
+STATUS_PRIORITY = {'Accept': 2, 'Reject': 1, 'Pending': 0}
+
+
+def collapse_friendships(apps, schema_editor):
+    Friendship = apps.get_model('app_api', 'Friendship')
+    kept = {}
+    duplicates = []
+    rows = Friendship.objects.order_by('id').values_list('id', 'sender_id', 'receiver_id', 'status').iterator()
+    for friendship_id, sender_id, receiver_id, status in rows:
+        pair = (min(sender_id, receiver_id), max(sender_id, receiver_id))
+        priority = STATUS_PRIORITY.get(status, -1)
+        if pair not in kept:
+            kept[pair] = (priority, friendship_id)
+        elif priority >= kept[pair][0]:
+            # the latest row of the highest status wins
+            duplicates.append(kept[pair][1])
+            kept[pair] = (priority, friendship_id)
+        else:
+            duplicates.append(friendship_id)
+
+    for start in range(0, len(duplicates), 1000):
+        Friendship.objects.filter(id__in=duplicates[start:start + 1000]).delete()
+
+    Friendship.objects.filter(sender_id__lt=F('receiver_id')).update(user_low=F('sender'), user_high=F('receiver'))
+    Friendship.objects.filter(sender_id__gt=F('receiver_id')).update(user_low=F('receiver'), user_high=F('sender'))
+    # requests sent to oneself were never valid
+    Friendship.objects.filter(sender_id=F('receiver_id')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0009_friendship_pair'),
+    ]
+
+    operations = [
+        migrations.RunPython(collapse_friendships, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 2.2.3 on 2026-10-18 20:42
+
+from django.db import migrations
+
+POSTGRES_INDEX = (
+    "ALTER TABLE app_api_post ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION app_api_post_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A')
+                             || setweight(to_tsvector('english', coalesce(NEW.body, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER app_api_post_search_vector_update BEFORE INSERT OR UPDATE OF title, body
+    ON app_api_post FOR EACH ROW EXECUTE PROCEDURE app_api_post_search_vector()
+    """,
+    """
+    UPDATE app_api_post SET search_vector = setweight(to_tsvector('english', coalesce(title, '')), 'A')
+                                            || setweight(to_tsvector('english', coalesce(body, '')), 'B')
+    """,
+    "CREATE INDEX post_search_idx ON app_api_post USING GIN (search_vector)",
+)
+POSTGRES_DROP_INDEX = (
+    "DROP TRIGGER app_api_post_search_vector_update ON app_api_post",
+    "DROP FUNCTION app_api_post_search_vector()",
+    "ALTER TABLE app_api_post DROP COLUMN search_vector",
+)
+
+SQLITE_INDEX = (
+    """
+    CREATE VIRTUAL TABLE app_api_post_fts USING fts5(
+        title, body, content='app_api_post', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_api_post_fts_insert AFTER INSERT ON app_api_post BEGIN
+        INSERT INTO app_api_post_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_api_post_fts_delete AFTER DELETE ON app_api_post BEGIN
+        INSERT INTO app_api_post_fts (app_api_post_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_api_post_fts_update AFTER UPDATE OF title, body ON app_api_post BEGIN
+        INSERT INTO app_api_post_fts (app_api_post_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO app_api_post_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    "INSERT INTO app_api_post_fts (app_api_post_fts) VALUES ('rebuild')",
+)
+SQLITE_DROP_INDEX = (
+    "DROP TRIGGER app_api_post_fts_insert",
+    "DROP TRIGGER app_api_post_fts_delete",
+    "DROP TRIGGER app_api_post_fts_update",
+    "DROP TABLE app_api_post_fts",
+)
+
+# SQL creating and dropping the index of each database vendor, others search with icontains
+SEARCH_INDEX_SQL = {
+    'postgresql': (POSTGRES_INDEX, POSTGRES_DROP_INDEX),
+    'sqlite': (SQLITE_INDEX, SQLITE_DROP_INDEX),
+}
+
+
+def create_search_index(apps, schema_editor):
+    statements, _ = SEARCH_INDEX_SQL.get(schema_editor.connection.vendor, ((), ()))
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    _, statements = SEARCH_INDEX_SQL.get(schema_editor.connection.vendor, ((), ()))
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0012_friendsuggestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.3 on 2026-10-18 20:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+# istartswith compiles to UPPER(column::text) LIKE UPPER(%s), these are the matching indexes
+POSTGRES_INDEX = (
+    'CREATE INDEX user_username_prefix_idx ON auth_user (UPPER(username::text) text_pattern_ops)',
+    'CREATE INDEX user_first_name_prefix_idx ON auth_user (UPPER(first_name::text) text_pattern_ops)',
+    'CREATE INDEX user_last_name_prefix_idx ON auth_user (UPPER(last_name::text) text_pattern_ops)',
+)
+POSTGRES_DROP_INDEX = (
+    'DROP INDEX user_username_prefix_idx',
+    'DROP INDEX user_first_name_prefix_idx',
+    'DROP INDEX user_last_name_prefix_idx',
+)
+
+
+def create_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_INDEX:
+            schema_editor.execute(statement)
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_DROP_INDEX:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app_api', '0013_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['updated_at'], name='profile_updated_idx'),
+        ),
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
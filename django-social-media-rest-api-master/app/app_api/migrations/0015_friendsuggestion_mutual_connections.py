@@ -0,0 +1,26 @@
+# Generated by Django 2.2.3 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0014_user_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='friendsuggestion',
+            name='suggestion_user_rank_idx',
+        ),
+        migrations.RenameField(
+            model_name='friendsuggestion',
+            old_name='mutual_friends',
+            new_name='mutual_connections',
+        ),
+        migrations.AddIndex(
+            model_name='friendsuggestion',
+            index=models.Index(fields=['user', '-mutual_connections', 'id'], name='suggestion_user_rank_idx'),
+        ),
+    ]
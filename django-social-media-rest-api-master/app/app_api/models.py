@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Exists, OuterRef, Q, Value
+from django.utils import timezone
 from app_api.helpers import code_generator
 
 User = get_user_model()
@@ -8,9 +10,18 @@ SEX_CHOICES = (('Male', 'Male'), ('Female', 'Female'))
 FRIEND_REQUEST_CHOICES = (('Accept', 'Accept'), ('Reject', 'Reject'), ('Pending', 'Pending'))
 LIKE_CHOICES = ((1, 'Like'), (0, 'None'))
 FOLLOW_CHOICES = (('Follow', 'Follow'), ('Unfollow', 'Unfollow'))
+FEED_DELIVERY_CHOICES = (('Push', 'Push'), ('Pull', 'Pull'))
+IMAGE_STATUS_CHOICES = (('Pending', 'Pending'), ('Ready', 'Ready'), ('Failed', 'Failed'))
+EMAIL_STATUS_CHOICES = (('Queued', 'Queued'), ('Sent', 'Sent'), ('Failed', 'Failed'))
 
 
 class UserProfile(models.Model):
+    class Meta:
+        indexes = [
+            # users changed since a point in time, see app_api.autocomplete
+            models.Index(fields=['updated_at'], name='profile_updated_idx'),
+        ]
+
     user = models.OneToOneField(
         verbose_name='user',
         to=User,
@@ -22,6 +33,8 @@ class UserProfile(models.Model):
     bio = models.CharField(max_length=240, blank=True)
     city = models.CharField(max_length=30, blank=True)
     avatar = models.ImageField(null=True, blank=True)
+    # renditions of the avatar (app_api.images), null without avatar
+    avatar_status = models.CharField(max_length=7, choices=IMAGE_STATUS_CHOICES, null=True, blank=True)
     code = models.CharField(
         verbose_name='code',
         help_text='random code used for registration and for password reset',
@@ -30,12 +43,44 @@ class UserProfile(models.Model):
         null=True,
         blank=True
     )
+    feed_delivery = models.CharField(
+        verbose_name='feed delivery',
+        help_text='Push: posts are fanned out to the followers timelines, Pull: posts are merged in at read time',
+        max_length=4,
+        choices=FEED_DELIVERY_CHOICES,
+        default='Push'
+    )
+    # version of the profile, also touched when its User changes (see signals)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.user.username
 
 
+class PostQuerySet(models.QuerySet):
+
+    def for_viewer(self, user):
+        """
+        Join the author in and annotate whether the viewing user liked each Post,
+        so that a page of Posts is serialized with a single query
+        """
+        queryset = self.select_related('author')
+        if user is None or not user.is_authenticated:
+            return queryset.annotate(viewer_has_liked=Value(False, output_field=models.BooleanField()))
+        likes = Reaction.objects.filter(posts=OuterRef('pk'), user_reacted=user, status=1)
+        return queryset.annotate(viewer_has_liked=Exists(likes))
+
+
 class Post(models.Model):
+    class Meta:
+        indexes = [
+            # global feed and Posts of one author, newest first
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+        ]
+
+    objects = PostQuerySet.as_manager()
+
     author = models.ForeignKey(
         to=User,
         verbose_name='user',
@@ -45,8 +90,12 @@ class Post(models.Model):
     title = models.CharField(max_length=200)
     body = models.TextField()
     image = models.ImageField(null=True, blank=True)
+    # renditions of the image (app_api.images), null without image
+    image_status = models.CharField(max_length=7, choices=IMAGE_STATUS_CHOICES, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # denormalized count of the 'Like' Reactions, kept up to date with F() updates
+    like_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.title
@@ -55,6 +104,11 @@ class Post(models.Model):
 class Reaction(models.Model):
     class Meta:
         unique_together = (('user_reacted', 'posts', 'status'),)
+        indexes = [
+            # Posts liked by a user, latest first
+            models.Index(fields=['user_reacted', '-id'], name='reaction_user_idx'),
+            models.Index(fields=['posts', 'status'], name='reaction_posts_status_idx'),
+        ]
 
     user_reacted = models.ForeignKey(
         to=User,
@@ -74,10 +128,30 @@ class Reaction(models.Model):
             return f"{str(self.user_reacted).upper()} Unliked: {self.posts}"
 
 
+class FriendshipQuerySet(models.QuerySet):
+
+    def between(self, user_a_id, user_b_id):
+        """
+        The Friendship of two users, a single lookup on the unique (user_low, user_high) index
+        """
+        user_low_id, user_high_id = Friendship.pair(user_a_id, user_b_id)
+        return self.filter(Q(user_low_id=user_low_id) & Q(user_high_id=user_high_id))
+
+
 class Friendship(models.Model):
+    """
+    One row per unordered pair of users, the status moves Pending -> Accept / Reject in place.
+    sender and receiver are the sides of the latest request.
+    """
     class Meta:
-        unique_together = (('receiver', 'sender', 'status'),)
-        unique_together = (('sender', 'receiver', 'status'),)
+        unique_together = (('user_low', 'user_high'),)
+        indexes = [
+            # friend requests received
+            models.Index(fields=['receiver', 'status'], name='friendship_receiver_idx'),
+            # friends seen from the high side, the unique index covers the low side
+            models.Index(fields=['user_high', 'user_low'], name='friendship_high_accept_idx',
+                         condition=Q(status='Accept')),
+        ]
 
     status = models.CharField(max_length=8, choices=FRIEND_REQUEST_CHOICES, null=True, blank=True, default='Pending')
     from_date = models.DateTimeField(auto_now_add=True)
@@ -88,6 +162,19 @@ class Friendship(models.Model):
     sender = models.ForeignKey(to=User,
                                on_delete=models.CASCADE,
                                related_name='user2')
+    # the pair ordered by id, set from sender and receiver on save
+    user_low = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name='+')
+    user_high = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name='+')
+
+    objects = FriendshipQuerySet.as_manager()
+
+    @staticmethod
+    def pair(user_a_id, user_b_id):
+        return min(user_a_id, user_b_id), max(user_a_id, user_b_id)
+
+    def save(self, *args, **kwargs):
+        self.user_low_id, self.user_high_id = self.pair(self.sender_id, self.receiver_id)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         if self.status == 'Accept':
@@ -101,6 +188,13 @@ class Friendship(models.Model):
 class Follow(models.Model):
     class Meta:
         unique_together = (('receiver', 'sender', 'status'),)
+        indexes = [
+            # followers and followees, only the active follows are ever read
+            models.Index(fields=['receiver', 'sender'], name='follow_receiver_active_idx',
+                         condition=Q(status='Follow')),
+            models.Index(fields=['sender', 'receiver'], name='follow_sender_active_idx',
+                         condition=Q(status='Follow')),
+        ]
 
     status = models.CharField(max_length=8, choices=FOLLOW_CHOICES, default='Follow')
     from_date = models.DateTimeField(auto_now_add=True)
@@ -117,3 +211,75 @@ class Follow(models.Model):
             return f"{str(self.sender).upper()} Follows {str(self.receiver).upper()}"
         if self.status == 'Unfollow':
             return f"{str(self.sender).upper()} Unfollowed {str(self.receiver).upper()}"
+
+
+class TimelineEntry(models.Model):
+    class Meta:
+        unique_together = (('owner', 'post'),)
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_created_idx'),
+        ]
+
+    owner = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries')
+    post = models.ForeignKey(
+        to=Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries')
+    # copy of post.created_at so the timeline can be read with one index range scan
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{str(self.owner).upper()} Timeline: {self.post}"
+
+
+class OutboundEmail(models.Model):
+    class Meta:
+        indexes = [
+            # the worker reads the due emails in order
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    # comma separated addresses
+    to = models.TextField()
+    status = models.CharField(max_length=6, choices=EMAIL_STATUS_CHOICES, default='Queued')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.status.upper()}: {self.subject} to {self.to}"
+
+
+class FriendSuggestion(models.Model):
+    """
+    "People you may know", computed in batch by the compute_friend_suggestions command
+    """
+    class Meta:
+        unique_together = (('user', 'suggested'),)
+        indexes = [
+            models.Index(fields=['user', '-mutual_connections', 'id'], name='suggestion_user_rank_idx'),
+        ]
+
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name='friend_suggestions')
+    suggested = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name='+')
+    # users connected to both, by a friendship or a follow in either direction
+    # (not only friends, unlike the mutual friends of MutualFriendsView)
+    mutual_connections = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{str(self.user).upper()} may know {str(self.suggested).upper()} ({self.mutual_connections} mutual connections)"
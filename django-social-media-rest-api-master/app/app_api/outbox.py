@@ -0,0 +1,98 @@
+"""
+Outbound emails are stored in the OutboundEmail table by the request and sent
+later by the send_queued_email worker, over one SMTP connection per batch
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from app_api import metrics
+from app_api.models import OutboundEmail
+
+
+def enqueue_email(subject, body, to, from_email=''):
+    """
+    Queue an email, part of the caller's transaction: it is only sent if the transaction commits
+    """
+    metrics.incr('email.enqueued')
+    return OutboundEmail.objects.create(subject=subject, body=body, to=','.join(to), from_email=from_email)
+
+
+def queue_depth():
+    return OutboundEmail.objects.filter(status='Queued').count()
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff with jitter: RETRY_BASE_SECONDS * 2 ** (attempts - 1), capped at RETRY_MAX_SECONDS
+    """
+    config = settings.EMAIL_OUTBOX
+    delay = min(config['RETRY_BASE_SECONDS'] * 2 ** (attempts - 1), config['RETRY_MAX_SECONDS'])
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def send_queued_emails(batch_size=None):
+    """
+    Send one batch of due emails over a single connection of the EMAIL_BACKEND.
+    Returns the number of emails sent and failed.
+    """
+    config = settings.EMAIL_OUTBOX
+    batch_size = batch_size or config['BATCH_SIZE']
+    sent = failed = 0
+    with transaction.atomic():
+        # skip_locked lets several workers share the queue (ignored by SQLite)
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='Queued') & Q(next_attempt_at__lte=timezone.now()))
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not emails:
+            return sent, failed
+
+        connection = get_connection()
+        try:
+            # opened once for the whole batch instead of once per message
+            connection.open()
+            for email in emails:
+                message = EmailMessage(subject=email.subject, body=email.body, to=email.to.split(','),
+                                       from_email=email.from_email or None, connection=connection)
+                try:
+                    message.send()
+                except Exception as error:
+                    failed += 1
+                    record_failure(email, error)
+                    # the connection may be broken, start a new one for the next message
+                    connection.close()
+                    connection.open()
+                else:
+                    sent += 1
+                    email.status = 'Sent'
+                    email.sent_at = timezone.now()
+                    email.attempts += 1
+                    email.save(update_fields=['status', 'sent_at', 'attempts'])
+        except Exception as error:
+            # the server is unreachable, the rest of the batch is retried later
+            for email in emails[sent + failed:]:
+                failed += 1
+                record_failure(email, error)
+        finally:
+            connection.close()
+
+    metrics.incr('email.sent', sent)
+    metrics.incr('email.failed', failed)
+    return sent, failed
+
+
+def record_failure(email, error):
+    email.attempts += 1
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= settings.EMAIL_OUTBOX['MAX_ATTEMPTS']:
+        email.status = 'Failed'
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
@@ -0,0 +1,163 @@
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+import coreapi
+import coreschema
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a unique ordering. The cursor holds the ordering values
+    of the last row of the page and is turned into a WHERE clause, so page N costs
+    the same index range scan as page 1 (unlike OFFSET pagination).
+    """
+    # must end with a unique field so that the ordering is total
+    ordering = ('id',)
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.cursor_filter(cursor))
+
+        # fetch one extra row to know if there is a next page
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def page_bounds(self, request, model):
+        """
+        Cursor and page size of a request, for the views that narrow down the rows of the page themselves
+        """
+        self.model = model
+        return self.decode_cursor(request), self.get_page_size(request)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE
+        if self.page_size_query_param in request.query_params:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+            except ValueError:
+                pass
+        return max(min(page_size, settings.PAGINATION_MAX_PAGE_SIZE), 1)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def cursor_filter(self, cursor):
+        """
+        Lexicographic "comes after" condition for the ordering, e.g. for ('-created_at', '-id'):
+        created_at < c OR (created_at = c AND id < i)
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, cursor):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, instance):
+        values = [getattr(instance, field.lstrip('-')) for field in self.ordering]
+        # full microsecond precision, the cursor is compared for equality
+        values = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [self.to_python(field.lstrip('-'), value) for field, value in zip(self.ordering, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, name, value):
+        try:
+            return self.model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            # annotations (e.g. a search rank) are kept as decoded from JSON
+            return value
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(title='Cursor', description='The pagination cursor value.')
+            ),
+            coreapi.Field(
+                name=self.page_size_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Integer(title='Page size', description='Number of results to return per page.')
+            ),
+        ]
+
+
+class PostKeysetPagination(KeysetPagination):
+    """
+    Newest Posts first
+    """
+    ordering = ('-created_at', '-id')
+
+
+class PostSearchKeysetPagination(KeysetPagination):
+    """
+    Best search matches first
+    """
+    ordering = ('-rank', '-id')
+
+
+class ReactionKeysetPagination(KeysetPagination):
+    """
+    Latest Reactions first
+    """
+    ordering = ('-id',)
+
+
+class IdKeysetPagination(KeysetPagination):
+    """
+    Users and profiles in id order
+    """
+    ordering = ('id',)
+
+
+class FriendSuggestionKeysetPagination(KeysetPagination):
+    """
+    Most mutual connections first
+    """
+    ordering = ('-mutual_connections', 'id')
@@ -0,0 +1,188 @@
+"""
+On-demand profiling of single requests, triggered by staff users with the
+X-Profile header or the ?profile= query parameter (value 'cprofile' or 'sampling').
+Profiles are kept in a bounded ring of files in PROFILING['DIRECTORY'].
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+from app_api import metrics
+from authentication.authentication import CachedJWTAuthentication
+
+MODES = ('cprofile', 'sampling')
+
+
+class StackSampler(threading.Thread):
+    """
+    Sample the stack of another thread every `interval` seconds and count the
+    collapsed stacks ("outer;inner;innermost"), the input format of flame graph tools
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def profiles_directory():
+    return settings.PROFILING['DIRECTORY']
+
+
+def list_profiles(url_name=None):
+    """
+    Metadata of the stored profiles, newest first
+    """
+    directory = profiles_directory()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as file:
+                profile = json.load(file)
+        except (OSError, ValueError):
+            # removed by another worker trimming the ring
+            continue
+        if url_name is None or profile['url_name'] == url_name:
+            profiles.append(profile)
+    return profiles
+
+
+def profile_path(profile_id, extension):
+    # ids are generated by save_profile, never trust them to build paths blindly
+    if not all(char.isalnum() or char == '-' for char in profile_id):
+        raise ValueError(f'Invalid profile id {profile_id}')
+    return os.path.join(profiles_directory(), f'{profile_id}.{extension}')
+
+
+def save_profile(metadata, profiler=None, sampler=None):
+    directory = profiles_directory()
+    os.makedirs(directory, exist_ok=True)
+    # ids sort chronologically
+    profile_id = f'{int(time.time() * 1000):015d}-{uuid.uuid4().hex[:8]}'
+    metadata = dict(metadata, id=profile_id, files=[])
+
+    if profiler is not None:
+        profiler.dump_stats(profile_path(profile_id, 'prof'))
+        metadata['files'].append('prof')
+    if sampler is not None:
+        with open(profile_path(profile_id, 'folded'), 'w') as file:
+            file.write(sampler.collapsed())
+        metadata['files'].append('folded')
+    # metadata last, a profile is listed once its files are complete
+    with open(profile_path(profile_id, 'json'), 'w') as file:
+        json.dump(metadata, file)
+
+    trim_profiles()
+    return profile_id
+
+
+def trim_profiles():
+    """
+    Keep the PROFILING['MAX_PROFILES'] most recent profiles
+    """
+    directory = profiles_directory()
+    profile_ids = sorted({name.rsplit('.', 1)[0] for name in os.listdir(directory)})
+    for profile_id in profile_ids[:-settings.PROFILING['MAX_PROFILES']]:
+        for extension in ('json', 'prof', 'folded'):
+            try:
+                os.remove(profile_path(profile_id, extension))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """
+    Run the requests of staff users asking for it under cProfile (pstats and collapsed
+    stacks) or under the stack sampler only (collapsed stacks), and store the result.
+    The profile id is returned in the X-Profile-Id header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = self.requested_mode(request)
+        if mode is None or not self.is_staff(request):
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), settings.PROFILING['SAMPLING_INTERVAL'])
+        profiler = cProfile.Profile() if mode == 'cprofile' else None
+        start = time.perf_counter()
+        sampler.start()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            sampler.stop()
+        duration = time.perf_counter() - start
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        profile_id = save_profile({
+            'url_name': resolver_match.url_name if resolver_match else None,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'mode': mode,
+            'duration_ms': round(duration * 1000, 2),
+            'samples': sum(sampler.stacks.values()),
+            'created_at': timezone.now().isoformat(),
+        }, profiler, sampler)
+        metrics.incr('profiles.saved')
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def requested_mode(self, request):
+        mode = request.META.get('HTTP_X_PROFILE') or request.GET.get('profile')
+        if not mode:
+            return None
+        # any other value (1, true...) is a deterministic profile
+        return mode if mode in MODES else 'cprofile'
+
+    def is_staff(self, request):
+        """
+        Session users (admin) or JWT users, the API authentication normally happens in the view
+        """
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            try:
+                authenticated = CachedJWTAuthentication().authenticate(request)
+            except (InvalidToken, AuthenticationFailed):
+                return False
+            user = authenticated[0] if authenticated else None
+        return user is not None and user.is_staff
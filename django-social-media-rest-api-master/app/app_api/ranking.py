@@ -0,0 +1,55 @@
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from app_api.graph import SocialGraph
+
+
+def score_posts(ages, likes, author_ids, friend_ids=(), followee_ids=(), follower_ids=()):
+    """
+    Score candidate posts in one vectorized pass:
+        (1 + LIKE_WEIGHT * log(1 + likes)) * affinity(author) * 0.5 ** (age / HALF_LIFE)
+    ages are in seconds, all arguments are arrays (or lists) of the same length
+    except the id sets of the viewer's graph.
+    """
+    config = settings.FEED_RANKING
+    ages = np.asarray(ages, dtype=np.float64)
+    likes = np.asarray(likes, dtype=np.float64)
+    author_ids = np.asarray(author_ids, dtype=np.int64)
+
+    affinity = np.full(author_ids.shape, config['AFFINITY']['other'], dtype=np.float64)
+    # strongest relation last so that it wins for authors in several sets
+    for relation, ids in (('follower', follower_ids), ('followee', followee_ids), ('friend', friend_ids)):
+        if len(ids):
+            affinity[np.isin(author_ids, np.asarray(ids, dtype=np.int64))] = config['AFFINITY'][relation]
+
+    decay = np.exp2(-np.maximum(ages, 0) / (config['HALF_LIFE_HOURS'] * 3600))
+    return (1 + config['LIKE_WEIGHT'] * np.log1p(likes)) * affinity * decay
+
+
+def rank_posts(queryset, user, limit):
+    """
+    Best scored Posts among the FEED_RANKING['CANDIDATES'] most recent ones of a queryset
+    """
+    candidates = list(
+        queryset.order_by('-created_at', '-id')
+        .values_list('id', 'author_id', 'created_at', 'like_count')[:settings.FEED_RANKING['CANDIDATES']]
+    )
+    if not candidates:
+        return []
+
+    ids, author_ids, created_at, likes = zip(*candidates)
+    now = timezone.now().timestamp()
+    ages = [now - created.timestamp() for created in created_at]
+    if user.is_authenticated:
+        graph = SocialGraph(user)
+        scores = score_posts(ages, likes, author_ids,
+                             graph.friend_ids(), graph.followee_ids(), graph.follower_ids())
+    else:
+        scores = score_posts(ages, likes, author_ids)
+
+    # stable sort keeps the chronological order between equal scores
+    top_ids = np.asarray(ids)[np.argsort(-scores, kind='stable')[:limit]].tolist()
+    # in_bulk on the queryset keeps its select_related and viewer annotations
+    posts = queryset.in_bulk(top_ids)
+    return [posts[post_id] for post_id in top_ids]
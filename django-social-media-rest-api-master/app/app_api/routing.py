@@ -0,0 +1,186 @@
+"""
+Read replicas: the GET / HEAD / OPTIONS requests of READ_REPLICAS['PATH_PREFIXES'] read from
+a healthy replica of READ_REPLICAS['ALIASES'], everything else uses the primary ('default').
+
+A user who wrote something reads from the primary for READ_REPLICAS['STICKY_SECONDS'] after
+that (a mark in the shared cache), so that the replication lag never hides their own writes.
+A replica failing its health check, or lagging behind by more than MAX_LAG_SECONDS on
+PostgreSQL, is left out until the next check.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from app_api import metrics
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# routing state of the request served by the thread
+_state = threading.local()
+
+
+def sticky_key(user_id):
+    return f'replica:sticky:{user_id}'
+
+
+class ReplicaHealth:
+    """
+    Last health check result of every replica, checked again every HEALTH_CHECK_SECONDS
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checks = {}
+
+    def healthy(self, alias):
+        with self.lock:
+            healthy, checked_at = self.checks.get(alias, (False, None))
+            interval = settings.READ_REPLICAS['HEALTH_CHECK_SECONDS']
+            if checked_at is not None and time.monotonic() - checked_at < interval:
+                return healthy
+            # the other threads keep the previous result meanwhile
+            self.checks[alias] = (healthy, time.monotonic())
+        healthy = self.check(alias)
+        with self.lock:
+            self.checks[alias] = (healthy, time.monotonic())
+        return healthy
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    # no lag once everything received is replayed, however old the last transaction
+                    # (idle primary); NULL on a primary, or on a replica that has not replayed anything yet
+                    cursor.execute('SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                                   'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END')
+                    lag = cursor.fetchone()[0]
+                    if lag is not None and lag > settings.READ_REPLICAS['MAX_LAG_SECONDS']:
+                        metrics.incr(f'replica.lagging.{alias}')
+                        return False
+                else:
+                    cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            metrics.incr(f'replica.unavailable.{alias}')
+            connection.close()
+            return False
+
+    def healthy_count(self):
+        with self.lock:
+            return sum(healthy for healthy, _ in self.checks.values())
+
+
+replica_health = ReplicaHealth()
+
+
+def request_user_id(request):
+    """
+    Id of the user of the JWT (validated, the user is not loaded) or of the session, if any
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header is not None else None
+    if raw_token is not None:
+        try:
+            return authentication.get_validated_token(raw_token)[api_settings.USER_ID_CLAIM]
+        except (InvalidToken, KeyError):
+            return None
+    session = getattr(request, 'session', None)
+    return session.get(SESSION_KEY) if session is not None else None
+
+
+def choose_replica(request):
+    """
+    Alias of the replica to read from during the request, None for the primary
+    """
+    config = settings.READ_REPLICAS
+    if not config['ALIASES'] or request.method not in SAFE_METHODS:
+        return None
+    if not request.path.startswith(tuple(config['PATH_PREFIXES'])):
+        return None
+
+    user_id = request_user_id(request)
+    if user_id is not None and caches[config['CACHE']].get(sticky_key(user_id)):
+        metrics.incr('replica.sticky_reads')
+        return None
+    healthy = [alias for alias in config['ALIASES'] if replica_health.healthy(alias)]
+    if not healthy:
+        metrics.incr('replica.fallback_reads')
+        return None
+    metrics.incr('replica.reads')
+    return random.choice(healthy)
+
+
+class ReplicaRouter:
+    """
+    Class to send the reads of the request to the replica chosen by ReplicaRoutingMiddleware,
+    until the request writes something (the unsafe methods always read from the primary)
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = getattr(_state, 'alias', None)
+        if alias is None or _state.wrote:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        if hasattr(_state, 'wrote'):
+            _state.wrote = True
+        # explicitly for the instances read from a replica, Django would write them back to it
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in settings.READ_REPLICAS['ALIASES']:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.READ_REPLICAS['ALIASES']}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Choose the database of the reads of every request, and keep the users who wrote
+    something on the primary for STICKY_SECONDS
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        alias = _state.alias = choose_replica(request)
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            del _state.alias, _state.wrote
+
+        if response.streaming:
+            # the queries of a streamed response run while the server iterates it, after this
+            response.streaming_content = self.routed(alias, response.streaming_content)
+        if wrote:
+            # the API views set the user of the JWT on the request during their authentication
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                caches[settings.READ_REPLICAS['CACHE']].set(
+                    sticky_key(user.pk), True, settings.READ_REPLICAS['STICKY_SECONDS'])
+        return response
+
+    def routed(self, alias, content):
+        _state.alias = alias
+        _state.wrote = False
+        try:
+            yield from content
+        finally:
+            del _state.alias, _state.wrote
@@ -0,0 +1,88 @@
+"""
+Full-text search over the title and body of the Posts.
+PostgreSQL: a weighted tsvector column (title A, body B) with a GIN index.
+SQLite (tests, development): an external content FTS5 table.
+Both are kept up to date by triggers, so every write path is indexed
+(save, update, bulk_create). They are created by migration 0013.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# words of the query, every one of them must match
+WORD = re.compile(r'\w+')
+MAX_TERMS = 8
+
+# SQLite schema changes of app_api_post drop these, they are the ones of migration 0013
+SQLITE_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS app_api_post_fts_insert AFTER INSERT ON app_api_post BEGIN
+        INSERT INTO app_api_post_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_api_post_fts_delete AFTER DELETE ON app_api_post BEGIN
+        INSERT INTO app_api_post_fts (app_api_post_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS app_api_post_fts_update AFTER UPDATE OF title, body ON app_api_post BEGIN
+        INSERT INTO app_api_post_fts (app_api_post_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO app_api_post_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+)
+
+
+def search_terms(query):
+    return WORD.findall(query.lower())[:MAX_TERMS]
+
+
+def restore_sqlite_triggers(connection):
+    """
+    SQLite schema changes of app_api_post rebuild the table and drop its triggers, put them back
+    """
+    with connection.cursor() as cursor:
+        if 'app_api_post_fts' not in connection.introspection.table_names(cursor):
+            return
+        for statement in SQLITE_TRIGGERS:
+            cursor.execute(statement)
+
+
+def search_posts(queryset, query):
+    """
+    Posts of the queryset matching every word of the query, annotated with their rank (higher is better)
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        text = ' '.join(terms)
+        # double precision: ts_rank is a real, the rank has to survive a round trip through the cursor
+        rank = RawSQL("ts_rank(app_api_post.search_vector, plainto_tsquery('english', %s))::double precision",
+                      (text,), output_field=FloatField())
+        return (queryset.annotate(rank=rank)
+                .extra(where=["app_api_post.search_vector @@ plainto_tsquery('english', %s)"], params=[text]))
+
+    if vendor == 'sqlite':
+        # quoted terms are matched as plain words, not as FTS5 query syntax
+        match = ' '.join(f'"{term}"' for term in terms)
+        # joined in so that the matches and their bm25 come from a single FTS5 query.
+        # bm25 is lower for better matches, a title match weighs twice a body match
+        rank = RawSQL('-bm25(app_api_post_fts, 2.0, 1.0)', (), output_field=FloatField())
+        return queryset.annotate(rank=rank).extra(
+            tables=['app_api_post_fts'],
+            where=['app_api_post_fts.rowid = app_api_post.id', 'app_api_post_fts MATCH %s'],
+            params=[match],
+        )
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(body__icontains=term)
+    return queryset.filter(condition).annotate(rank=Value(0.0, output_field=FloatField()))
@@ -0,0 +1,91 @@
+"""
+Load shedding: when the database gets slow, the requests of the lower priorities
+are answered with a 503 before any work is done, to keep the database for the others.
+
+The latency is a moving average of the duration of the SQL queries of this worker.
+It is only trusted while queries keep coming: once everything is shed, it gets stale
+after LOAD_SHEDDING['STALE_SECONDS'] and requests go through again to measure it.
+"""
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+from app_api import metrics
+
+
+class DatabaseLatency:
+    """
+    Exponential moving average of the query durations, in milliseconds
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.average_ms = 0.0
+        self.updated_at = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record((time.perf_counter() - start) * 1000)
+
+    def record(self, duration_ms):
+        with self.lock:
+            if self.stale():
+                self.average_ms = duration_ms
+            else:
+                alpha = settings.LOAD_SHEDDING['SMOOTHING']
+                self.average_ms += alpha * (duration_ms - self.average_ms)
+            self.updated_at = time.monotonic()
+
+    def stale(self):
+        return time.monotonic() - self.updated_at > settings.LOAD_SHEDDING['STALE_SECONDS']
+
+    def current_ms(self):
+        return 0.0 if self.stale() else self.average_ms
+
+
+database_latency = DatabaseLatency()
+
+
+def request_priority(request):
+    resolver_match = getattr(request, 'resolver_match', None)
+    url_name = resolver_match.url_name if resolver_match else None
+    return settings.LOAD_SHEDDING['PRIORITIES'].get(url_name, 'normal')
+
+
+class LoadSheddingMiddleware:
+    """
+    Time the queries of every request and shed the requests whose priority has a
+    latency threshold (LOAD_SHEDDING['LATENCY_MS']) below the current database latency
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.LOAD_SHEDDING['ENABLED']:
+            return self.get_response(request)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(database_latency))
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.LOAD_SHEDDING['ENABLED']:
+            return None
+        priority = request_priority(request)
+        threshold = settings.LOAD_SHEDDING['LATENCY_MS'].get(priority)
+        latency = database_latency.current_ms()
+        if threshold is None or latency <= threshold:
+            return None
+
+        metrics.incr(f'shedding.shed.{priority}')
+        response = JsonResponse({'detail': 'The service is overloaded, try again later.'}, status=503)
+        response['Retry-After'] = str(settings.LOAD_SHEDDING['RETRY_AFTER'])
+        return response
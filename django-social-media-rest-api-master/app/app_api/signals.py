@@ -1,7 +1,12 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db import connections, transaction
+from django.db.models.signals import post_save, post_delete, post_migrate
 from django.dispatch import receiver
-from app_api.models import UserProfile
+from django.utils import timezone
+from app_api import autocomplete
+from app_api.graph import SocialGraph
+from app_api.models import UserProfile, Follow, Friendship
+from app_api.search import restore_sqlite_triggers
 
 
 @receiver(post_save, sender=User)
@@ -9,3 +14,31 @@ def create_profile(sender, instance, created, **kwargs):
 
     if created:
         UserProfile.objects.create(user=instance)
+    else:
+        # the username is part of the profile representation
+        UserProfile.objects.filter(user=instance).update(updated_at=timezone.now())
+    autocomplete.index_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    autocomplete.remove_user(instance)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def invalidate_follow_graph(sender, instance, **kwargs):
+    # invalidate once the change is visible to the other workers
+    transaction.on_commit(lambda: (SocialGraph.invalidate(instance.sender_id, 'followees'),
+                                   SocialGraph.invalidate(instance.receiver_id, 'followers')))
+
+
+@receiver([post_save, post_delete], sender=Friendship)
+def invalidate_friendship_graph(sender, instance, **kwargs):
+    transaction.on_commit(lambda: (SocialGraph.invalidate(instance.sender_id, 'friends'),
+                                   SocialGraph.invalidate(instance.receiver_id, 'friends')))
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == 'app_api' and connections[using].vendor == 'sqlite':
+        restore_sqlite_triggers(connections[using])
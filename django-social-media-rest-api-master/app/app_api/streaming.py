@@ -0,0 +1,46 @@
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class StreamingListMixin:
+    """
+    With ?stream=true, walk the whole queryset with a server-side cursor and
+    stream it as one JSON array, STREAMING_CHUNK_SIZE rows at a time, so that
+    the memory of the worker stays flat whatever the number of rows
+    """
+    stream_query_param = 'stream'
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get(self.stream_query_param) not in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # same order as the paginated list
+        ordering = getattr(self.paginator, 'ordering', None)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return StreamingHttpResponse(self.stream_json(queryset), content_type='application/json')
+
+    def stream_json(self, queryset):
+        chunk_size = settings.STREAMING_CHUNK_SIZE
+        yield b'['
+        chunk = []
+        first = True
+        for instance in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(instance)
+            if len(chunk) == chunk_size:
+                yield self.render_chunk(chunk, first)
+                chunk = []
+                first = False
+        if chunk:
+            yield self.render_chunk(chunk, first)
+        yield b']'
+
+    def render_chunk(self, chunk, first):
+        data = self.get_serializer(chunk, many=True).data
+        # strip the brackets of the chunk's array, the items are part of the streamed one
+        rendered = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))[1:-1]
+        return (rendered if first else ',' + rendered).encode('utf-8')
@@ -0,0 +1,96 @@
+"""
+Friend suggestions ("people you may know") from the sparse adjacency matrix A of the
+social graph, indexed by user id: the number of connections two users have in common
+is an entry of A·A. Computed in batch by the compute_friend_suggestions command, by
+ranges of user ids so that the work can be split across processes.
+"""
+import itertools
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Max, Q
+from scipy import sparse
+
+from app_api.models import Follow, Friendship, FriendSuggestion
+
+User = get_user_model()
+
+
+def load_pairs(queryset, chunk_size=20000):
+    """
+    (n, 2) array of a values_list queryset of two ids, streamed from the database
+    """
+    values = itertools.chain.from_iterable(queryset.order_by().iterator(chunk_size=chunk_size))
+    return np.fromiter(values, dtype=np.int64).reshape(-1, 2)
+
+
+def symmetric_matrix(pairs, size):
+    """
+    Binary CSR matrix with an entry in both directions for every pair
+    """
+    rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+    columns = np.concatenate([pairs[:, 1], pairs[:, 0]])
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)), shape=(size, size))
+    # friends following each other are counted once
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+def load_graph():
+    """
+    The adjacency matrix of the connections (accepted friendships and follows, in either
+    direction) and the matrix of the other pairs not to suggest (pending or rejected requests)
+    """
+    size = (User.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+    connections = np.concatenate([
+        load_pairs(Friendship.objects.filter(status='Accept').values_list('user_low_id', 'user_high_id')),
+        load_pairs(Follow.objects.filter(status='Follow').values_list('sender_id', 'receiver_id')),
+    ])
+    requests = load_pairs(Friendship.objects.exclude(status='Accept').values_list('user_low_id', 'user_high_id'))
+    return symmetric_matrix(connections, size), symmetric_matrix(requests, size)
+
+
+def connector_matrix(adjacency, max_degree):
+    """
+    The adjacency matrix without the rows of the users with more than max_degree connections:
+    everybody following the same celebrity is not a signal, and it would make A·A dense
+    """
+    degrees = np.diff(adjacency.indptr)
+    return sparse.diags((degrees <= max_degree).astype(np.int32), dtype=np.int32) @ adjacency
+
+
+def top_suggestions(adjacency, excluded, connectors, start, stop, top_k):
+    """
+    Yield (user_id, suggested_id, mutual_connections) for the users start <= id < stop: their
+    top_k users by connections in common, among the users they are not connected to yet
+    """
+    rows = adjacency[start:stop]
+    mutual = (rows @ connectors).tocsr()
+    # existing connections, requests and the users themselves
+    blocked = rows + excluded[start:stop] + sparse.eye(stop - start, adjacency.shape[1], k=start, format='csr')
+    mutual = (mutual - mutual.multiply(blocked > 0)).tocsr()
+    mutual.eliminate_zeros()
+
+    for offset in range(stop - start):
+        begin, end = mutual.indptr[offset], mutual.indptr[offset + 1]
+        counts, columns = mutual.data[begin:end], mutual.indices[begin:end]
+        if len(counts) > top_k:
+            best = np.argpartition(-counts, top_k - 1)[:top_k]
+            counts, columns = counts[best], columns[best]
+        for count, column in zip(counts.tolist(), columns.tolist()):
+            yield start + offset, column, count
+
+
+def store_suggestions(start, stop, suggestions):
+    """
+    Replace the suggestions of the users start <= id < stop
+    """
+    with transaction.atomic():
+        FriendSuggestion.objects.filter(Q(user_id__gte=start) & Q(user_id__lt=stop)).delete()
+        FriendSuggestion.objects.bulk_create(
+            [FriendSuggestion(user_id=user_id, suggested_id=suggested_id, mutual_connections=count)
+             for user_id, suggested_id, count in suggestions],
+            batch_size=500,
+        )
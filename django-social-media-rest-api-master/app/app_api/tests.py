@@ -1,3 +1,1114 @@
-from django.test import TestCase
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app_api.autocomplete import get_index
+from app_api.backends.postgresql_pool.pool import ConnectionPool, PoolTimeout
+from app_api.graph import SocialGraph
+from app_api.images import rendition_job, rendition_name, submit
+from app_api.models import (Post, Reaction, OutboundEmail, Friendship, Follow, TimelineEntry, FriendSuggestion,
+                            UserProfile)
+from app_api.outbox import send_queued_emails
+from app_api.ranking import rank_posts, score_posts
+from app_api.routing import replica_health
+from app_api.shedding import database_latency
+from app_api.suggestions import connector_matrix, load_graph, top_suggestions
+from app_api.throttling import throttle_cache
+from app_api.timeline import fan_out_post, home_timeline, reclassify_authors
+from authentication.authentication import CachedJWTAuthentication, user_cache
+from authentication.views import PasswordResetView
+from posts.serializers import PostSerializer
+
+User = get_user_model()
+
+
+class PostSerializationQueryCountTest(TestCase):
+    """
+    Serializing Posts with their author and viewer_has_liked must not cost a query per Post
+    """
+
+    def setUp(self):
+        self.viewer = User.objects.create_user('viewer')
+        self.author = User.objects.create_user('author', first_name='Ada')
+
+    def create_posts(self, count):
+        Post.objects.bulk_create([Post(author=self.author, title=f'post {i}', body='body') for i in range(count)])
+        # the viewer likes every other post
+        liked = Post.objects.order_by('id').values_list('id', flat=True)[::2]
+        Reaction.objects.bulk_create([Reaction(user_reacted=self.viewer, posts_id=post_id) for post_id in liked],
+                                     ignore_conflicts=True)
+
+    def serialize_posts(self):
+        with CaptureQueriesContext(connection) as context:
+            data = PostSerializer(Post.objects.for_viewer(self.viewer).order_by('id'), many=True).data
+        return data, len(context)
+
+    def get_feed(self, client):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get('/api/feed/', {'page_size': 100})
+        return response, len(context)
+
+    def test_serializer_query_count_does_not_grow_with_posts(self):
+        self.create_posts(10)
+        data, queries_10 = self.serialize_posts()
+        self.assertEqual(len(data), 10)
+
+        self.create_posts(9990)
+        data, queries_10000 = self.serialize_posts()
+        self.assertEqual(len(data), 10000)
+
+        self.assertEqual(queries_10, 1)
+        self.assertEqual(queries_10, queries_10000)
+        self.assertEqual(data[0]['author_details']['first_name'], 'Ada')
+        self.assertEqual([post['viewer_has_liked'] for post in data[:4]], [True, False, True, False])
+
+    def test_feed_query_count_does_not_grow_with_posts(self):
+        client = APIClient()
+        client.force_authenticate(self.viewer)
+
+        self.create_posts(10)
+        response, queries_10 = self.get_feed(client)
+        self.assertEqual(len(response.data['results']), 10)
+
+        self.create_posts(9990)
+        response, queries_10000 = self.get_feed(client)
+        self.assertEqual(len(response.data['results']), 100)
+
+        self.assertEqual(queries_10, queries_10000)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP server unavailable')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboundEmailTest(TestCase):
+    """
+    Registration and password reset only queue their email, the worker sends it
+    """
+
+    def register(self):
+        client = APIClient()
+        # the API default permissions apply to the registration views
+        client.force_authenticate(User.objects.create_user('admin'))
+        response = client.post('/api/register/', {'email': 'new@example.com'})
+        self.assertEqual(response.status_code, 200)
+        return OutboundEmail.objects.get()
+
+    def test_registration_queues_the_email(self):
+        email = self.register()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(email.status, 'Queued')
+
+        self.assertEqual(send_queued_emails(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['new@example.com'])
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'Sent')
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+    def test_password_reset_queues_the_email(self):
+        user = User.objects.create_user('forgetful', email='forgetful@example.com')
+        request = APIRequestFactory().post('/api/auth/password-reset/', {'email': 'forgetful@example.com'})
+        self.assertEqual(PasswordResetView.as_view()(request).status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(send_queued_emails(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['forgetful@example.com'])
+        user.user_profile.refresh_from_db()
+        self.assertIn(user.user_profile.code, mail.outbox[0].body)
+
+    @override_settings(EMAIL_BACKEND='app_api.tests.FailingEmailBackend')
+    def test_failed_email_is_retried_later(self):
+        email = self.register()
+        self.assertEqual(send_queued_emails(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('Queued', 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertIn('SMTP server unavailable', email.last_error)
+        # not due yet
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1), attempts=7)
+        self.assertEqual(send_queued_emails(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('Failed', 8))
+
+
+class FriendshipTest(TestCase):
+    """
+    A pair of users has a single Friendship row, whatever the requests and answers
+    """
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_request_answers_update_the_same_row(self):
+        alice, bob = self.client_for(self.alice), self.client_for(self.bob)
+        alice.post(f'/api/users/friendrequest/{self.bob.id}/')
+        bob.post(f'/api/users/friendrequest/reject/{self.alice.id}/')
+        # a rejected request can be sent again, by either user
+        bob.post('/api/users/friendrequest/bulk/', {'user_ids': [self.alice.id]}, format='json')
+        response = alice.post(f'/api/users/friendrequest/accept/{self.bob.id}/')
+        self.assertEqual(response.status_code, 201)
+
+        friendship = Friendship.objects.get()
+        self.assertEqual((friendship.sender, friendship.receiver, friendship.status), (self.bob, self.alice, 'Accept'))
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(Friendship.objects.between(self.bob.id, self.alice.id).filter(status='Accept').exists())
+        self.assertEqual(len(context), 1)
+
+        self.assertEqual(bob.delete(f'/api/users/friends/unfriend/{self.alice.id}/').status_code, 204)
+        self.assertFalse(Friendship.objects.exists())
+
+
+class PostSearchTest(TestCase):
+    """
+    The search index follows the Posts through the database triggers
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def search(self, query, **params):
+        return self.client.get('/api/posts/search/', dict(params, q=query)).data
+
+    def test_ranked_and_paginated_matches(self):
+        Post.objects.bulk_create([Post(author=self.author, title=f'post {i}', body='a walk by the river')
+                                  for i in range(5)])
+        best = Post.objects.create(author=self.author, title='Rivers', body='river river')
+        Post.objects.create(author=self.author, title='mountains', body='no water here')
+
+        first_page = self.search('river', page_size=4)
+        self.assertEqual(first_page['results'][0]['id'], best.id)
+        second_page = self.client.get(first_page['next']).data
+        self.assertIsNone(second_page['next'])
+        self.assertEqual(len(first_page['results']) + len(second_page['results']), 6)
+
+        best.title = 'Lakes'
+        best.body = 'lake'
+        best.save()
+        self.assertEqual(len(self.search('lakes')['results']), 1)
+        best.delete()
+        self.assertEqual(self.search('lakes')['results'], [])
+
+
+class UserAutocompleteTest(TestCase):
+    """
+    Prefix completion of the names, followees first
+    """
+
+    def setUp(self):
+        # the ids are reused once a test is rolled back, and the Follow signals invalidate on commit
+        caches['graph'].clear()
+        self.viewer = User.objects.create_user('viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        for username, first_name, last_name in [('jdoe', 'John', 'Doe'), ('joanna', 'Joanna', 'Smith'),
+                                                ('msmith', 'Mary', 'Smith'), ('zed', 'Zed', 'Johnson')]:
+            User.objects.create_user(username, first_name=first_name, last_name=last_name)
+        # the index is shared by the tests, load it from this test's users
+        get_index().load()
+
+    def complete(self, query):
+        response = self.client.get('/api/users/autocomplete/', {'q': query})
+        return [profile['user'] for profile in response.data['results']]
+
+    def test_prefixes_of_every_name(self):
+        Follow.objects.create(sender=self.viewer, receiver=User.objects.get(username='zed'))
+        self.assertEqual(self.complete('jo'), ['zed', 'joanna', 'jdoe'])
+        self.assertEqual(self.complete('SMI jo'), ['joanna'])
+
+        mary = User.objects.get(username='msmith')
+        mary.first_name = 'Josephine'
+        mary.save()
+        self.assertEqual(self.complete('jos'), ['msmith'])
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    """
+    The user of a token is read from the cache until the user changes
+    """
+
+    def setUp(self):
+        # the ids are reused once a test is rolled back
+        user_cache().clear()
+        self.user = User.objects.create_user('reader', password='secret')
+        self.authentication = CachedJWTAuthentication()
+        self.token = self.authentication.get_validated_token(str(AccessToken.for_user(self.user)))
+
+    def test_cached_until_changed(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authentication.get_user(self.token).user_profile.user_id, self.user.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authentication.get_user(self.token).username, 'reader')
+
+        self.user.user_profile.bio = 'changed'
+        self.user.user_profile.save()
+        self.assertEqual(self.authentication.get_user(self.token).user_profile.bio, 'changed')
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.get_user(self.token)
+
+    def test_updates_do_not_write_back_the_cached_user(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        client.get('/api/me/')
+        # changed without signals (reclassify_authors, bulk updates), the cached copy is stale
+        UserProfile.objects.filter(user=self.user).update(feed_delivery='Pull')
+        User.objects.filter(pk=self.user.pk).update(email='reader@example.com')
+
+        client.post('/api/me/', {'last_name': 'Reader'})
+        content = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(content, 'PNG')
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            client.post('/api/me/avatar/', {'avatar': SimpleUploadedFile('avatar.png', content.getvalue())},
+                        format='multipart')
+        self.user.refresh_from_db()
+        self.user.user_profile.refresh_from_db()
+        self.assertEqual((self.user.last_name, self.user.email), ('Reader', 'reader@example.com'))
+        self.assertEqual(self.user.user_profile.feed_delivery, 'Pull')
+        self.assertTrue(self.user.user_profile.avatar)
+
+
+class RateLimitingTest(TestCase):
+    """
+    Token buckets of the throttled endpoints and load shedding of the low priorities
+    """
+
+    def setUp(self):
+        throttle_cache().clear()
+        self.user = User.objects.create_user('hammer')
+        self.post = Post.objects.create(author=self.user, title='title', body='body')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(RATE_LIMITING={'CACHE': 'default', 'BUDGETS': {'like': {'user': (2, 0.01), 'ip': (10, 1)}}})
+    def test_bucket_of_the_user(self):
+        statuses = [self.client.post(f'/api/posts/like/{self.post.id}').status_code for _ in range(3)]
+        self.assertEqual(statuses[2], 429)
+        self.assertNotEqual(statuses[1], 429)
+        # a bucket per scope
+        self.assertEqual(self.client.get('/api/feed/').status_code, 200)
+
+    @override_settings(RATE_LIMITING={'CACHE': 'default', 'BUDGETS': {'like': {'user': (2, 0.01), 'ip': (1, 0.01)}}})
+    def test_rejected_request_keeps_the_user_token(self):
+        statuses = [self.client.post(f'/api/posts/like/{self.post.id}').status_code for _ in range(2)]
+        self.assertNotEqual(statuses[0], 429)
+        self.assertEqual(statuses[1], 429)
+        # the IP bucket refills, the user bucket still has the token of the rejected request
+        throttle_cache().delete('throttle:like:ip:127.0.0.1')
+        self.assertNotEqual(self.client.post(f'/api/posts/like/{self.post.id}').status_code, 429)
+        self.assertEqual(self.client.post(f'/api/posts/like/{self.post.id}').status_code, 429)
+
+    def test_shed_by_priority(self):
+        database_latency.record(10000)
+        response = self.client.get('/api/feed/')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        database_latency.updated_at = 0.0
+        self.assertEqual(self.client.get('/api/feed/').status_code, 200)
+
+
+@skipUnless('replica' in settings.DATABASES and 'MIRROR' not in settings.DATABASES['replica'].get('TEST', {}),
+            'needs a "replica" database of its own, e.g. with --settings=app.test_settings')
+@override_settings(READ_REPLICAS=dict(settings.READ_REPLICAS, ALIASES=['replica']))
+class ReplicaRoutingTest(TestCase):
+    """
+    Reads from the replica, from the primary after a write of the user or when the replica is down
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        caches['default'].clear()
+        replica_health.checks.clear()
+        self.user = User.objects.create_user('writer')
+        # replicated users, not their Posts
+        User.objects.using('replica').bulk_create([self.user])
+        self.post = Post.objects.create(author=self.user, title='title', body='body')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_read_your_writes(self):
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.id}/').status_code, 404)
+        self.client.post(f'/api/posts/like/{self.post.id}')
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.id}/').status_code, 200)
+
+    def test_unhealthy_replica(self):
+        replica_health.checks['replica'] = (False, time.monotonic())
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.id}/').status_code, 200)
+
+    def test_streamed_list_reads_from_the_replica(self):
+        response = self.client.get('/api/feed/?stream=true')
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+        self.assertEqual(len(self.client.get('/api/feed/').data['results']), 0)
+
+    def test_users_are_authenticated_from_the_primary(self):
+        User.objects.using('replica').filter(pk=self.user.pk).update(first_name='stale')
+        self.client.get(f'/api/posts/{self.post.id}/')
+        user = CachedJWTAuthentication().get_user(AccessToken.for_user(self.user))
+        self.assertEqual(user.first_name, '')
+
+
+class ManualCommitConnection:
+    """
+    DB-API connection stand-in outside of autocommit, counting its rollbacks
+    """
+    autocommit = False
+    closed = False
+
+    def __init__(self):
+        self.rollbacks = 0
+        self.sqlite = sqlite3.connect(':memory:', check_same_thread=False)
+
+    def cursor(self):
+        return self.sqlite.cursor()
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(TestCase):
+    """
+    Checkout and release of the pooled connections (SQLite connections standing in for PostgreSQL)
+    """
+
+    def setUp(self):
+        self.pool = ConnectionPool('test', lambda: sqlite3.connect(':memory:', check_same_thread=False),
+                                   {'MIN_SIZE': 1, 'MAX_SIZE': 1, 'MAX_OVERFLOW': 1, 'TIMEOUT': 0.05})
+        self.pool.fill()
+
+    def test_reuse_overflow_and_timeout(self):
+        first = self.pool.checkout()
+        overflow = self.pool.checkout()
+        self.assertEqual(self.pool.overflow_count(), 1)
+        with self.assertRaises(PoolTimeout):
+            self.pool.checkout()
+
+        self.pool.release(overflow)
+        self.pool.release(first)
+        self.assertEqual((self.pool.size, self.pool.in_use, self.pool.idle_count()), (1, 0, 1))
+        self.assertIs(self.pool.checkout(), first)
+
+    def test_health_check_leaves_no_transaction(self):
+        # outside of autocommit, like a connection returned with AUTOCOMMIT = False
+        self.pool = ConnectionPool('test', ManualCommitConnection, {'MIN_SIZE': 1, 'CHECK_IDLE_SECONDS': 0})
+        self.pool.fill()
+        pooled = self.pool.checkout()
+        self.assertEqual(pooled.connection.rollbacks, 1)
+
+    def test_expired_connections_replaced(self):
+        self.pool.config['MAX_LIFETIME'] = 0
+        first = self.pool.checkout()
+        self.pool.release(first)
+        self.assertIsNot(self.pool.checkout(), first)
+        self.assertEqual(self.pool.size, 1)
+
+
+class ConditionalGetTest(TestCase):
+    """
+    The ETags change with everything the served representation shows
+    """
+
+    def setUp(self):
+        self.viewer = User.objects.create_user('viewer')
+        self.author = User.objects.create_user('author')
+        self.older = Post.objects.create(author=self.author, title='older', body='body')
+        self.newest = Post.objects.create(author=self.author, title='newest', body='body')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def assertChanged(self, path, etag):
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_list_page(self):
+        path = f'/api/feed/{self.author.id}/'
+        etag = self.client.get(path)['ETag']
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # neither of them is the newest Post
+        self.older.title = 'edited'
+        self.older.save()
+        etag = self.assertChanged(path, etag)
+        self.client.post(f'/api/posts/like/{self.older.id}')
+        etag = self.assertChanged(path, etag)
+        self.older.delete()
+        self.assertChanged(path, etag)
+
+    def test_ranked_and_streamed_lists_are_not_conditional(self):
+        for query in ('?order=ranked', '?stream=true'):
+            response = self.client.get(f'/api/feed/{query}')
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('ETag'))
+
+    def test_post_detail(self):
+        path = f'/api/posts/{self.newest.id}/'
+        response = self.client.get(path)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.client.post(f'/api/posts/like/{self.newest.id}')
+        self.assertChanged(path, response['ETag'])
+        # If-Modified-Since alone is not answered with a 304
+        self.assertEqual(self.client.get(path, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT').status_code, 200)
+
+
+class ImageRenditionTest(TestCase):
+    """
+    Avatar renditions: pending on upload, ready once the job ran, and a new profile ETag each time
+    """
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name,
+                                              IMAGE_PROCESSING=dict(settings.IMAGE_PROCESSING, WORKERS=0))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('pictured')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self):
+        content = io.BytesIO()
+        Image.new('RGB', (400, 300), 'red').save(content, 'PNG')
+        avatar = SimpleUploadedFile('avatar.png', content.getvalue(), content_type='image/png')
+        return self.client.post('/api/me/avatar/', {'avatar': avatar}, format='multipart')
+
+    def test_status_and_etag(self):
+        profile_path = f'/api/users/{self.user.user_profile.pk}/'
+        before = self.client.get(profile_path)['ETag']
+        self.assertEqual(self.upload().data['avatar_status'], 'Pending')
+        pending = self.client.get(profile_path)
+        self.assertNotEqual(pending['ETag'], before)
+        self.assertIsNone(pending.data['avatar_renditions'])
+
+        # the job submitted once the upload is committed
+        profile = self.user.user_profile
+        profile.refresh_from_db()
+        submit(*rendition_job(profile, 'avatar'))
+        ready = self.client.get(profile_path, HTTP_IF_NONE_MATCH=pending['ETag'])
+        self.assertEqual(ready.status_code, 200)
+        self.assertEqual(ready.data['avatar_status'], 'Ready')
+        self.assertEqual(set(ready.data['avatar_renditions']), set(settings.IMAGE_PROCESSING['RENDITIONS']))
+        thumbnail = profile.avatar.storage.path(rendition_name(profile.avatar.name, 'thumbnail'))
+        self.assertTrue(os.path.exists(thumbnail))
+
+    def test_render_images_command_without_pool(self):
+        self.upload()
+        # uploaded before the pipeline
+        UserProfile.objects.filter(user=self.user).update(avatar_status=None)
+        output = io.StringIO()
+        call_command('render_images', stdout=output)
+        self.assertIn('Rendered 1 images', output.getvalue())
+        self.assertEqual(UserProfile.objects.get(user=self.user).avatar_status, 'Ready')
+
+
+class HomeTimelineTest(TestCase):
+    """
+    Followees' Posts: fan-out with the timelines trimmed, and pages merging the pulled authors in
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['graph'].clear()
+        self.reader = User.objects.create_user('reader')
+        self.pushed = User.objects.create_user('pushed')
+        self.pulled = User.objects.create_user('pulled')
+        self.pulled.user_profile.feed_delivery = 'Pull'
+        self.pulled.user_profile.save()
+        for author in (self.pushed, self.pulled):
+            Follow.objects.create(sender=self.reader, receiver=author, status='Follow')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def post(self, author, minutes_ago):
+        post = Post.objects.create(author=author, title=f'{author} {minutes_ago}', body='body')
+        Post.objects.filter(id=post.id).update(created_at=timezone.now() - timedelta(minutes=minutes_ago))
+        post.refresh_from_db()
+        fan_out_post(post)
+        return post
+
+    def test_fan_out_trims_every_timeline(self):
+        other = User.objects.create_user('other')
+        Follow.objects.create(sender=other, receiver=self.pushed, status='Follow')
+        with override_settings(TIMELINE_MAX_LENGTH=2):
+            posts = [self.post(self.pushed, minutes) for minutes in (3, 2, 1)]
+        for owner in (self.reader, other):
+            self.assertEqual(set(TimelineEntry.objects.filter(owner=owner).values_list('post_id', flat=True)),
+                             {posts[1].id, posts[2].id})
+        # the pulled author's Posts are not fanned out
+        self.post(self.pulled, 0)
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.reader).count(), 2)
+
+    def test_pages_merge_pulled_authors(self):
+        posts = [self.post(author, minutes) for minutes, author
+                 in enumerate([self.pushed, self.pulled, self.pulled, self.pushed, self.pulled])]
+        seen = []
+        url = '/api/feed/followees/?page_size=2'
+        while url:
+            data = self.client.get(url).data
+            seen += [post['id'] for post in data['results']]
+            url = data['next']
+        self.assertEqual(seen, [post.id for post in posts])
+
+
+class PostFanOutTest(TransactionTestCase):
+    """
+    New Posts reach the followers' timelines once they are committed
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['graph'].clear()
+        self.author, self.follower = User.objects.create_user('author'), User.objects.create_user('follower')
+        Follow.objects.create(sender=self.follower, receiver=self.author, status='Follow')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_fan_out_after_commit(self):
+        with transaction.atomic():
+            response = self.client.post('/api/posts/new-post/',
+                                        {'title': 'title', 'body': 'body', 'author': self.author.id})
+            self.assertEqual(response.status_code, 201)
+            self.assertFalse(TimelineEntry.objects.exists())
+        post = Post.objects.get(author=self.author)
+        self.assertEqual(list(TimelineEntry.objects.values_list('owner_id', 'post_id')), [(self.follower.id, post.id)])
+
+
+class FeedRankingTest(TestCase):
+    """
+    Ranked feed: affinity of the author, likes and age, weighted by FEED_RANKING
+    """
+
+    def setUp(self):
+        caches['graph'].clear()
+        self.viewer, self.friend, self.stranger = [User.objects.create_user(name)
+                                                   for name in ('viewer', 'friend', 'stranger')]
+        Friendship.objects.create(sender=self.viewer, receiver=self.friend, status='Accept')
+        self.now = timezone.now()
+
+    def post(self, author, hours_ago=1, likes=0):
+        post = Post.objects.create(author=author, title='title', body='body')
+        Post.objects.filter(id=post.id).update(created_at=self.now - timedelta(hours=hours_ago), like_count=likes)
+        return post
+
+    def ranked(self):
+        return [post.id for post in rank_posts(Post.objects.all(), self.viewer, 10)]
+
+    def test_friend_ranks_above_stranger(self):
+        # the stranger's Post is the more recent id, first by the chronological tie-break
+        friend, stranger = self.post(self.friend), self.post(self.stranger)
+        self.assertEqual(self.ranked(), [friend.id, stranger.id])
+
+    def test_more_likes_rank_higher(self):
+        liked, unliked = self.post(self.stranger, likes=10), self.post(self.stranger, likes=1)
+        self.assertEqual(self.ranked(), [liked.id, unliked.id])
+
+    def test_newer_ranks_higher(self):
+        older, newer = self.post(self.stranger, hours_ago=5), self.post(self.stranger, hours_ago=2)
+        self.assertEqual(self.ranked(), [newer.id, older.id])
+
+    def test_settings_weights(self):
+        friend, liked = self.post(self.friend), self.post(self.stranger, likes=5)
+        # 3 * 1 against 1 + log(6)
+        self.assertEqual(self.ranked(), [friend.id, liked.id])
+        with override_settings(FEED_RANKING=dict(settings.FEED_RANKING, LIKE_WEIGHT=2.0)):
+            self.assertEqual(self.ranked(), [liked.id, friend.id])
+        with override_settings(FEED_RANKING=dict(settings.FEED_RANKING,
+                                                 AFFINITY=dict(settings.FEED_RANKING['AFFINITY'], friend=1.0))):
+            self.assertEqual(self.ranked(), [liked.id, friend.id])
+
+        half_life = settings.FEED_RANKING['HALF_LIFE_HOURS'] * 3600
+        scores = score_posts([0, half_life], [0, 0], [self.friend.id, self.stranger.id],
+                             friend_ids=[self.friend.id])
+        self.assertAlmostEqual(scores[0], settings.FEED_RANKING['AFFINITY']['friend'])
+        self.assertAlmostEqual(scores[1], settings.FEED_RANKING['AFFINITY']['other'] / 2)
+
+
+class SocialGraphTest(TestCase):
+    """
+    Relations as subqueries for __in, and as cached id lists for Python
+    """
+
+    def setUp(self):
+        caches['graph'].clear()
+        self.user, self.low, self.high, self.pending = [User.objects.create_user(name)
+                                                        for name in ('user', 'low', 'high', 'pending')]
+        Friendship.objects.create(sender=self.user, receiver=self.low, status='Accept')
+        Friendship.objects.create(sender=self.high, receiver=self.user, status='Accept')
+        Friendship.objects.create(sender=self.user, receiver=self.pending)
+        for author in (self.low, self.high, self.pending):
+            Post.objects.create(author=author, title='title', body='body')
+
+    def test_friends_subquery(self):
+        graph = SocialGraph(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            authors = set(Post.objects.filter(author__in=graph.friends()).values_list('author_id', flat=True))
+        self.assertEqual(authors, {self.low.id, self.high.id})
+        self.assertEqual(len(queries), 1)
+        self.assertIn('UNION', queries[0]['sql'])
+
+    def test_friend_ids_are_cached(self):
+        expected = sorted([self.low.id, self.high.id])
+        self.assertEqual(SocialGraph(self.user).friend_ids(), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(SocialGraph(self.user).friend_ids(), expected)
+        with override_settings(SOCIAL_GRAPH_CACHE_MAX_IDS=1):
+            caches['graph'].clear()
+            SocialGraph(self.user).friend_ids()
+            with self.assertNumQueries(1):
+                self.assertEqual(SocialGraph(self.user).friend_ids(), expected)
+
+
+class FriendSuggestionTest(TestCase):
+    """
+    Suggestions by mutual connections, computed in batch, and the mutual friends of two users
+    """
+
+    def setUp(self):
+        caches['graph'].clear()
+        self.me, self.a, self.b, self.c, self.d, self.x = [User.objects.create_user(name)
+                                                           for name in ('me', 'a', 'b', 'c', 'd', 'x')]
+        for sender, receiver in ((self.me, self.a), (self.me, self.b), (self.a, self.b),
+                                 (self.a, self.c), (self.a, self.x)):
+            Friendship.objects.create(sender=sender, receiver=receiver, status='Accept')
+        Follow.objects.create(sender=self.b, receiver=self.c, status='Follow')
+        Follow.objects.create(sender=self.a, receiver=self.d, status='Follow')
+        # pending, not suggested
+        Friendship.objects.create(sender=self.me, receiver=self.x)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def suggestions(self, top_k=10, max_degree=100):
+        adjacency, excluded = load_graph()
+        connectors = connector_matrix(adjacency, max_degree)
+        return {suggested_id: count for _, suggested_id, count
+                in top_suggestions(adjacency, excluded, connectors, self.me.id, self.me.id + 1, top_k)}
+
+    def test_top_suggestions(self):
+        self.assertEqual(self.suggestions(), {self.c.id: 2, self.d.id: 1})
+        self.assertEqual(self.suggestions(top_k=1), {self.c.id: 2})
+        # a has 5 connections, it no longer counts as a mutual connection
+        self.assertEqual(self.suggestions(max_degree=4), {self.c.id: 1})
+
+    def test_shards_store_the_same_suggestions(self):
+        def stored():
+            return set(FriendSuggestion.objects.values_list('user_id', 'suggested_id', 'mutual_connections'))
+
+        call_command('compute_friend_suggestions', stdout=io.StringIO())
+        expected = stored()
+        self.assertIn((self.me.id, self.c.id, 2), expected)
+        FriendSuggestion.objects.all().delete()
+        for shard in range(3):
+            call_command('compute_friend_suggestions', shards=3, shard=shard, stdout=io.StringIO())
+        self.assertEqual(stored(), expected)
+
+    def test_endpoints(self):
+        call_command('compute_friend_suggestions', stdout=io.StringIO())
+        data = self.client.get('/api/users/friends/suggestions/').data['results']
+        self.assertEqual([(item['profile']['user'], item['mutual_connections']) for item in data],
+                         [('c', 2), ('d', 1)])
+        # befriended since the batch
+        Friendship.objects.create(sender=self.c, receiver=self.me, status='Accept')
+        data = self.client.get('/api/users/friends/suggestions/').data['results']
+        self.assertEqual([item['profile']['user'] for item in data], ['d'])
+
+        # friends only, unlike the suggestions
+        response = self.client.get(f'/api/users/friends/mutual/{self.a.id}/')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual({profile['user'] for profile in response.data['results']}, {'b', 'c'})
+
+
+class RequestInstrumentationTest(TestCase):
+    """
+    Sampled requests are timed, the timings are only sent to staff users
+    """
+
+    def test_server_timing_for_staff_only(self):
+        user_cache().clear()
+        user = User.objects.create_user('user')
+        staff = User.objects.create_user('staff', is_staff=True)
+        with override_settings(REQUEST_INSTRUMENTATION=dict(settings.REQUEST_INSTRUMENTATION, SAMPLE_RATE=1.0)):
+            for viewer, expected in ((user, False), (staff, True)):
+                client = APIClient()
+                client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(viewer)}')
+                with self.assertLogs('app_api.requests', level='INFO') as logs, \
+                        CaptureQueriesContext(connection) as queries:
+                    response = client.get('/api/me/')
+                self.assertEqual(response.has_header('Server-Timing'), expected)
+
+                self.assertEqual(len(logs.records), 1)
+                entry = json.loads(logs.records[0].getMessage())
+                self.assertEqual((entry['method'], entry['path'], entry['status'], entry['user']),
+                                 ('GET', '/api/me/', 200, viewer.pk))
+                self.assertEqual(entry['queries'], len(queries))
+                self.assertGreater(entry['queries'], 0)
+                self.assertGreater(entry['total_ms'], 0)
+                self.assertLessEqual(entry['db_ms'], entry['total_ms'])
+
+
+class ProfilingTest(TestCase):
+    """
+    Profiles of the requests of staff users asking for them, listed and downloaded in the admin
+    """
+
+    def setUp(self):
+        # the configured directory, before it is replaced by a temporary one
+        self.default_directory = os.path.abspath(settings.PROFILING['DIRECTORY'])
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(PROFILING=dict(settings.PROFILING, DIRECTORY=self.directory.name))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('user')
+        self.staff = User.objects.create_user('staff', is_staff=True)
+
+    def get(self, viewer, **headers):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(viewer)}')
+        return client.get('/api/me/', **headers)
+
+    def test_profile_written_outside_of_the_source_tree(self):
+        self.assertFalse(self.default_directory.startswith(os.path.join(settings.BASE_DIR, '')))
+        for mode, extensions in (('cprofile', {'json', 'prof', 'folded'}), ('sampling', {'json', 'folded'})):
+            profile_id = self.get(self.staff, HTTP_X_PROFILE=mode)['X-Profile-Id']
+            self.assertEqual({name for name in os.listdir(self.directory.name) if name.startswith(profile_id)},
+                             {f'{profile_id}.{extension}' for extension in extensions})
+
+        client = APIClient()
+        client.force_login(self.staff)
+        self.assertContains(client.get('/admin/profiles/'), profile_id)
+        response = client.get(f'/admin/profiles/{profile_id}.folded')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_admin_pages_staff_only(self):
+        profile_id = self.get(self.staff, HTTP_X_PROFILE='cprofile')['X-Profile-Id']
+        client = APIClient()
+        client.force_login(self.user)
+        for path in ('/admin/profiles/', f'/admin/profiles/{profile_id}.prof'):
+            response = client.get(path)
+            self.assertEqual(response.status_code, 302, path)
+            self.assertTrue(response['Location'].startswith('/admin/login/'), path)
+
+    def test_unrequested_or_non_staff_not_profiled(self):
+        for response in (self.get(self.staff), self.get(self.user, HTTP_X_PROFILE='cprofile')):
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+class BulkUsersTest(TransactionTestCase):
+    """
+    Bulk follow, unfollow and friend requests, committed so that the graph cache invalidation runs
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['graph'].clear()
+        self.me, self.b, self.c, self.d = [User.objects.create_user(name) for name in ('me', 'b', 'c', 'd')]
+        self.missing = self.d.id + 100
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def bulk(self, action, user_ids):
+        return self.client.post(f'/api/users/{action}/bulk/', {'user_ids': user_ids}, format='json')
+
+    def results(self, response):
+        return [(result['user_id'], result['status']) for result in response.data['results']]
+
+    def concurrently(self, table, create):
+        """
+        Execute wrapper creating a row, as a concurrent request would, right before the first INSERT into table
+        """
+        pending = [create]
+
+        def wrapper(execute, sql, params, many, context):
+            # INSERT OR IGNORE INTO on SQLite
+            if pending and sql.startswith('INSERT') and f'INTO "{table}"' in sql:
+                pending.pop()()
+            return execute(sql, params, many, context)
+        return connection.execute_wrapper(wrapper)
+
+    def test_follow_and_unfollow(self):
+        Follow.objects.create(sender=self.me, receiver=self.b)
+        post = Post.objects.create(author=self.c, title='title', body='body')
+        self.assertEqual(SocialGraph(self.me).followee_ids(), [self.b.id])
+        self.assertEqual(SocialGraph(self.c).follower_ids(), [])
+
+        # d is followed by a concurrent request between the read and the insert
+        with self.concurrently('app_api_follow', lambda: Follow.objects.create(sender=self.me, receiver=self.d)):
+            response = self.bulk('follow', [self.b.id, self.c.id, self.c.id, self.me.id, self.missing, self.d.id])
+        self.assertEqual(self.results(response), [(self.b.id, 'already_following'), (self.c.id, 'followed'),
+                                                  (self.me.id, 'self'), (self.missing, 'not_found'),
+                                                  (self.d.id, 'followed')])
+        self.assertEqual(Follow.objects.filter(sender=self.me).count(), 3)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.me, post=post).exists())
+        self.assertEqual(SocialGraph(self.me).followee_ids(), sorted([self.b.id, self.c.id, self.d.id]))
+        self.assertEqual(SocialGraph(self.c).follower_ids(), [self.me.id])
+
+        response = self.bulk('unfollow', [self.c.id, self.c.id, self.b.id, self.missing])
+        self.assertEqual(self.results(response), [(self.c.id, 'unfollowed'), (self.b.id, 'unfollowed'),
+                                                  (self.missing, 'not_found')])
+        self.assertEqual(self.results(self.bulk('unfollow', [self.c.id])), [(self.c.id, 'not_following')])
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.me).exists())
+        self.assertEqual(SocialGraph(self.me).followee_ids(), [self.d.id])
+        self.assertEqual(SocialGraph(self.c).follower_ids(), [])
+
+    def test_friend_requests(self):
+        Friendship.objects.create(sender=self.b, receiver=self.me, status='Accept')
+        rejected = Friendship.objects.create(sender=self.me, receiver=self.c, status='Reject')
+
+        def concurrent_request():
+            return Friendship.objects.create(sender=self.d, receiver=self.me)
+        with self.concurrently('app_api_friendship', concurrent_request):
+            response = self.bulk('friendrequest', [self.b.id, self.c.id, self.d.id, self.d.id, self.missing])
+        self.assertEqual(self.results(response), [(self.b.id, 'already_friends'), (self.c.id, 'requested'),
+                                                  (self.d.id, 'requested'), (self.missing, 'not_found')])
+        rejected.refresh_from_db()
+        self.assertEqual((rejected.sender, rejected.status), (self.me, 'Pending'))
+        # the concurrent request is kept
+        self.assertEqual(Friendship.objects.between(self.me.id, self.d.id).get().sender, self.d)
+        self.assertEqual(self.results(self.bulk('friendrequest', [self.c.id])), [(self.c.id, 'pending')])
+
+    def test_user_ids_are_capped(self):
+        with override_settings(BULK_MAX_USER_IDS=2):
+            for action in ('follow', 'unfollow', 'friendrequest'):
+                self.assertEqual(self.bulk(action, [self.b.id, self.c.id, self.d.id]).status_code, 400)
+                self.assertEqual(self.bulk(action, []).status_code, 400)
+
+    @override_settings(RATE_LIMITING={'CACHE': 'default',
+                                      'BUDGETS': {'friend_request': {'user': (1, 0.01), 'ip': (10, 1)}}})
+    def test_friend_requests_are_throttled(self):
+        self.assertEqual(self.bulk('friendrequest', [self.b.id]).status_code, 200)
+        self.assertEqual(self.bulk('friendrequest', [self.c.id]).status_code, 429)
+
+
+class KeysetPaginationTest(TestCase):
+    """
+    Cursor pages of the Posts of an author, newest first
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        Post.objects.bulk_create([Post(author=self.author, title=f'post {i}', body='body') for i in range(5)])
+        # created_at ties are broken by the id
+        Post.objects.update(created_at=timezone.now())
+        self.url = f'/api/feed/{self.author.id}/'
+
+    def test_cursor_round_trip(self):
+        seen = []
+        url = f'{self.url}?page_size=2'
+        while url:
+            data = self.client.get(url).data
+            self.assertLessEqual(len(data['results']), 2)
+            seen += [post['id'] for post in data['results']]
+            url = data['next']
+        self.assertEqual(seen, list(Post.objects.order_by('-id').values_list('id', flat=True)))
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-base64!', 'W10=', 'WyJub3QgYSBkYXRlIiwgMV0='):
+            self.assertEqual(self.client.get(self.url, {'cursor': cursor}).status_code, 404)
+
+    @override_settings(PAGINATION_MAX_PAGE_SIZE=3)
+    def test_page_size_cap(self):
+        for page_size, expected in (('1000', 3), ('0', 1), ('abc', 3)):
+            data = self.client.get(self.url, {'page_size': page_size}).data
+            self.assertEqual(len(data['results']), expected)
+
+
+class PostLikeTest(TestCase):
+    """
+    Post.like_count follows the 'Like' Reactions, and is recounted when it drifted
+    """
+
+    def setUp(self):
+        throttle_cache().clear()
+        self.author = User.objects.create_user('author')
+        self.post = Post.objects.create(author=self.author, title='title', body='body')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.url = f'/api/posts/like/{self.post.id}'
+
+    def like_count(self):
+        return Post.objects.values_list('like_count', flat=True).get(pk=self.post.pk)
+
+    def test_like_and_unlike(self):
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        # liked twice, counted once
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        self.assertEqual(Reaction.objects.filter(posts=self.post, status=1).count(), 1)
+        self.assertEqual(self.like_count(), 1)
+        self.assertTrue(self.client.get(self.url).data['viewer_has_liked'])
+
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.like_count(), 0)
+        # nothing left to unlike, the counter stays at 0
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.like_count(), 0)
+
+    def test_reconcile_drifted_counter(self):
+        other = Post.objects.create(author=self.author, title='other', body='body')
+        self.client.post(self.url)
+        Post.objects.filter(pk=self.post.pk).update(like_count=7)
+
+        output = io.StringIO()
+        call_command('reconcile_like_counts', dry_run=True, stdout=output)
+        self.assertIn('found 1 drifted', output.getvalue())
+        self.assertEqual(self.like_count(), 7)
+
+        output = io.StringIO()
+        call_command('reconcile_like_counts', chunk_size=1, stdout=output)
+        self.assertIn('Checked 2 posts, fixed 1 drifted', output.getvalue())
+        self.assertEqual(self.like_count(), 1)
+        self.assertEqual(Post.objects.get(pk=other.pk).like_count, 0)
+
+
+class HybridDeliveryTest(TestCase):
+    """
+    Authors switched between push and pull delivery by their follower count
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+        self.followers = [User.objects.create_user(f'follower{i}') for i in range(3)]
+        for follower in self.followers:
+            Follow.objects.create(sender=follower, receiver=self.author, status='Follow')
+        self.post = Post.objects.create(author=self.author, title='title', body='body')
+        fan_out_post(self.post)
+
+    def delivery(self):
+        return UserProfile.objects.values_list('feed_delivery', flat=True).get(user=self.author)
+
+    def timeline_ids(self, user):
+        return list(home_timeline(user, 10).order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_reclassify_both_ways(self):
+        self.assertEqual(TimelineEntry.objects.filter(post=self.post).count(), 3)
+
+        self.assertEqual(reclassify_authors(threshold=2), ({self.author.id}, set()))
+        self.assertEqual(self.delivery(), 'Pull')
+        self.assertFalse(TimelineEntry.objects.filter(post=self.post).exists())
+        # merged in at read time, not fanned out
+        newer = Post.objects.create(author=self.author, title='newer', body='body')
+        fan_out_post(newer)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.timeline_ids(self.followers[0]), [newer.id, self.post.id])
+
+        self.assertEqual(reclassify_authors(threshold=3), (set(), {self.author.id}))
+        self.assertEqual(self.delivery(), 'Push')
+        for follower in self.followers:
+            self.assertEqual(set(TimelineEntry.objects.filter(owner=follower).values_list('post_id', flat=True)),
+                             {self.post.id, newer.id})
+        self.assertEqual(reclassify_authors(threshold=3), (set(), set()))
+
+    def test_read_time_merge(self):
+        pushed = User.objects.create_user('pushed')
+        reader = self.followers[0]
+        Follow.objects.create(sender=reader, receiver=pushed, status='Follow')
+        reclassify_authors(threshold=2)
+        pushed_post = Post.objects.create(author=pushed, title='pushed', body='body')
+        fan_out_post(pushed_post)
+        pulled_post = Post.objects.create(author=self.author, title='pulled', body='body')
+
+        self.assertEqual(self.timeline_ids(reader), [pulled_post.id, pushed_post.id, self.post.id])
+        # a follower of the pulled author only
+        self.assertEqual(self.timeline_ids(self.followers[1]), [pulled_post.id, self.post.id])
+        with override_settings(FEED_DELIVERY_MODE='push'):
+            self.assertEqual(self.timeline_ids(reader), [pushed_post.id])
+        with override_settings(FEED_DELIVERY_MODE='pull'):
+            self.assertEqual(self.timeline_ids(reader), [pulled_post.id, pushed_post.id, self.post.id])
+
+
+class StreamingListTest(TestCase):
+    """
+    ?stream=true lists are one JSON array, whatever the number of chunks
+    """
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'user{i}') for i in range(5)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def stream(self, url):
+        response = self.client.get(url, {'stream': 'true'})
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_chunk_boundaries(self):
+        paginated = self.client.get('/api/users/', {'page_size': 100}).data['results']
+        # 5 users: two full chunks and a partial one, then exactly full chunks
+        for chunk_size in (2, 5, 1):
+            with override_settings(STREAMING_CHUNK_SIZE=chunk_size):
+                self.assertEqual(self.stream('/api/users/'), json.loads(json.dumps(paginated)))
+
+    def test_empty_list(self):
+        self.assertEqual(self.stream('/api/feed/'), [])
+
+
+class RunBenchmarksTest(TestCase):
+    """
+    Smoke test of the run_benchmarks command on a small database
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['graph'].clear()
+        self.user, other = User.objects.create_user('viewer'), User.objects.create_user('other')
+        Follow.objects.create(sender=other, receiver=self.user, status='Follow')
+        Friendship.objects.create(sender=self.user, receiver=other, status='Accept')
+        Post.objects.create(author=self.user, title='coffee', body='body')
+
+    def test_every_endpoint_is_timed_or_skipped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            call_command('run_benchmarks', iterations=1, output=path, stderr=io.StringIO())
+            with open(path) as file:
+                endpoints = json.load(file)['endpoints']
+        self.assertEqual(endpoints['api/metrics/']['skipped'], f'not allowed for user {self.user.pk}')
+        timed = {route: result for route, result in endpoints.items() if 'skipped' not in result}
+        self.assertIn('api/posts/search/', timed)
+        for route, result in timed.items():
+            self.assertEqual(result['status'], 200, route)
+            self.assertIn('p95_ms', result)
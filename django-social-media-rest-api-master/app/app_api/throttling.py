@@ -0,0 +1,102 @@
+"""
+Token-bucket rate limiting of the endpoints with a throttle_scope, per user and per IP.
+
+The buckets live in the RATE_LIMITING['CACHE'] cache, shared by the workers, as their
+theoretical arrival time (GCRA, equivalent to a token bucket): every admitted request
+moves it forward by 1 / rate seconds with an atomic incr, a request is admitted while
+it stays less than capacity / rate seconds ahead of now. A full bucket is a missing key,
+so the keys expire once their bucket is full again.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from app_api import metrics
+
+MICROSECONDS = 1000000
+
+
+def throttle_cache():
+    return caches[settings.RATE_LIMITING['CACHE']]
+
+
+def take_token(cache, key, capacity, rate):
+    """
+    Take a token from a bucket, return 0 when taken or else the seconds until one is available
+    """
+    interval = int(MICROSECONDS / rate)
+    burst = capacity * interval
+    now = int(time.time() * MICROSECONDS)
+
+    try:
+        arrival = cache.incr(key, interval)
+    except ValueError:
+        # full bucket
+        if cache.add(key, now + interval, interval // MICROSECONDS + 1):
+            return 0
+        arrival = cache.incr(key, interval)
+
+    if arrival - interval < now:
+        # refilled since the last request, the bucket starts from now
+        # (concurrent requests may both do it, letting a few more requests through)
+        arrival = now + interval
+        cache.set(key, arrival, interval // MICROSECONDS + 1)
+        return 0
+    if arrival - now > burst:
+        # the request is not admitted, give the token back
+        give_token(cache, key, rate)
+        return (arrival - now - burst) / MICROSECONDS
+    # expire with the bucket full again
+    cache.touch(key, (arrival - now) // MICROSECONDS + 1)
+    return 0
+
+
+def give_token(cache, key, rate):
+    """
+    Give back a token taken from a bucket
+    """
+    try:
+        cache.decr(key, int(MICROSECONDS / rate))
+    except ValueError:
+        # expired, the bucket is full anyway
+        pass
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Class to throttle a view by its throttle_scope with the budgets of RATE_LIMITING['BUDGETS']:
+    a bucket per user for the authenticated requests, and a bucket per IP for all of them
+    """
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        scope = getattr(view, 'throttle_scope', None)
+        budgets = settings.RATE_LIMITING['BUDGETS'].get(scope)
+        if budgets is None:
+            return True
+
+        buckets = [('ip', self.get_ident(request))]
+        if request.user and request.user.is_authenticated:
+            buckets.insert(0, ('user', request.user.pk))
+
+        cache = throttle_cache()
+        taken = []
+        for kind, ident in buckets:
+            capacity, rate = budgets[kind]
+            key = f'throttle:{scope}:{kind}:{ident}'
+            wait = take_token(cache, key, capacity, rate)
+            if wait:
+                # a request rejected by one bucket does not use up the others
+                for taken_key, taken_rate in taken:
+                    give_token(cache, taken_key, taken_rate)
+                self.wait_seconds = wait
+                metrics.incr(f'throttle.throttled.{scope}.{kind}')
+                return False
+            taken.append((key, rate))
+        metrics.incr(f'throttle.allowed.{scope}')
+        return True
+
+    def wait(self):
+        return self.wait_seconds
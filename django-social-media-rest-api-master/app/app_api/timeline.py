@@ -0,0 +1,167 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q, Count, OuterRef, Subquery
+
+from app_api.models import Post, Follow, TimelineEntry, UserProfile
+
+
+def is_pushed(author_id):
+    """
+    Check if the Posts of an author are fanned out on write (True) or pulled at read time (False)
+    """
+    if settings.FEED_DELIVERY_MODE == 'push':
+        return True
+    if settings.FEED_DELIVERY_MODE == 'pull':
+        return False
+    return not UserProfile.objects.filter(Q(user_id=author_id) & Q(feed_delivery='Pull')).exists()
+
+
+def pushed_authors(author_ids):
+    """
+    The authors among author_ids whose Posts are fanned out on write, with one query
+    """
+    if settings.FEED_DELIVERY_MODE == 'push':
+        return set(author_ids)
+    if settings.FEED_DELIVERY_MODE == 'pull':
+        return set()
+    pulled = (UserProfile.objects.filter(Q(user_id__in=author_ids) & Q(feed_delivery='Pull'))
+              .values_list('user_id', flat=True))
+    return set(author_ids) - set(pulled)
+
+
+def fan_out_post(post):
+    """
+    Push a new Post into the timeline of every follower of its author
+    """
+    if not is_pushed(post.author_id):
+        return
+    follower_ids = list(Follow.objects.filter(Q(receiver_id=post.author_id) & Q(status='Follow'))
+                        .values_list('sender_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=follower_id, post=post, created_at=post.created_at) for follower_id in follower_ids],
+        ignore_conflicts=True,
+    )
+    trim_timeline(*follower_ids)
+
+
+def backfill_timeline(owner_id, *author_ids):
+    """
+    Copy the most recent Posts of freshly followed authors into the follower's timeline
+    """
+    author_ids = pushed_authors(author_ids)
+    if not author_ids:
+        return
+    # the newest Posts of all the authors together, older ones would be trimmed anyway
+    posts = (Post.objects.filter(author_id__in=author_ids)
+             .order_by('-created_at', '-id')
+             .values_list('id', 'created_at')[:settings.TIMELINE_MAX_LENGTH])
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at) for post_id, created_at in posts],
+        ignore_conflicts=True,
+    )
+    trim_timeline(owner_id)
+
+
+def remove_from_timeline(owner_id, *author_ids):
+    """
+    Drop the Posts of unfollowed authors from the follower's timeline
+    """
+    TimelineEntry.objects.filter(Q(owner_id=owner_id) & Q(post__author_id__in=author_ids)).delete()
+
+
+def rebuild_timeline(owner_id):
+    """
+    Rebuild a timeline from scratch out of the Posts of the pushed authors the user follows
+    """
+    followees = Follow.objects.filter(Q(sender_id=owner_id) & Q(status='Follow'))
+    if settings.FEED_DELIVERY_MODE == 'pull':
+        followees = followees.none()
+    elif settings.FEED_DELIVERY_MODE == 'hybrid':
+        followees = followees.exclude(receiver__user_profile__feed_delivery='Pull')
+    posts = (Post.objects.filter(author__in=followees.values('receiver_id'))
+             .order_by('-created_at', '-id')
+             .values_list('id', 'created_at')[:settings.TIMELINE_MAX_LENGTH])
+    TimelineEntry.objects.filter(owner_id=owner_id).delete()
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at) for post_id, created_at in posts]
+    )
+
+
+def trim_timeline(*owner_ids):
+    """
+    Cap timelines at TIMELINE_MAX_LENGTH entries by deleting everything older than
+    the oldest entry that still fits, with one DELETE whatever the number of timelines
+    """
+    if not owner_ids:
+        return
+    cutoff = (TimelineEntry.objects.filter(owner_id=OuterRef('owner_id'))
+              .order_by('-created_at', '-post_id')
+              .values_list('created_at', flat=True)[settings.TIMELINE_MAX_LENGTH - 1:settings.TIMELINE_MAX_LENGTH])
+    TimelineEntry.objects.filter(Q(owner_id__in=owner_ids) & Q(created_at__lt=Subquery(cutoff))).delete()
+
+
+def reclassify_authors(threshold=None):
+    """
+    Move authors above the follower threshold to pull delivery and authors below it back to push.
+    Returns the ids of the authors switched to pull and to push.
+    """
+    if threshold is None:
+        threshold = settings.FEED_PUSH_MAX_FOLLOWERS
+    popular = set(Follow.objects.filter(status='Follow')
+                  .values('receiver_id')
+                  .annotate(followers=Count('id'))
+                  .filter(followers__gt=threshold)
+                  .values_list('receiver_id', flat=True))
+    pulled = set(UserProfile.objects.filter(feed_delivery='Pull').values_list('user_id', flat=True))
+
+    to_pull = popular - pulled
+    to_push = pulled - popular
+    UserProfile.objects.filter(user_id__in=to_pull).update(feed_delivery='Pull')
+    UserProfile.objects.filter(user_id__in=to_push).update(feed_delivery='Push')
+
+    # pulled authors are merged in at read time, their timeline copies are dead weight
+    TimelineEntry.objects.filter(post__author_id__in=to_pull).delete()
+    # pushed authors have to be present in the timelines of all their followers
+    for author_id in to_push:
+        follower_ids = (Follow.objects.filter(Q(receiver_id=author_id) & Q(status='Follow'))
+                        .values_list('sender_id', flat=True))
+        for follower_id in follower_ids:
+            backfill_timeline(follower_id, author_id)
+    return to_pull, to_push
+
+
+def newer_than(before, id_field):
+    """
+    Rows coming after the cursor `before` = (created_at, id) in newest first order
+    """
+    if before is None:
+        return Q()
+    created_at, row_id = before
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, **{f'{id_field}__lt': row_id})
+
+
+def home_timeline(user, limit, before=None):
+    """
+    Candidates of a page of the user's followees' Posts: the `limit` newest ones after the
+    cursor `before` (created_at, id) are among them, ordering and slicing is left to the caller.
+    Pushed authors are read from the materialized timeline, on its (owner, -created_at) index,
+    the newest Posts of the pulled authors are added to them with a UNION.
+    """
+    followees = Follow.objects.filter(Q(sender=user) & Q(status='Follow'))
+    if settings.FEED_DELIVERY_MODE == 'pull':
+        return Post.objects.filter(Q(author__in=followees.values('receiver_id')) & newer_than(before, 'id'))
+
+    timeline = (TimelineEntry.objects.filter(Q(owner=user) & newer_than(before, 'post_id'))
+                .order_by('-created_at', '-post_id')
+                .values('post_id')[:limit])
+    if settings.FEED_DELIVERY_MODE == 'push':
+        return Post.objects.filter(id__in=timeline)
+
+    pulled_followees = followees.filter(receiver__user_profile__feed_delivery='Pull').values('receiver_id')
+    pulled = (Post.objects.filter(Q(author__in=pulled_followees) & newer_than(before, 'id'))
+              .order_by('-created_at', '-id')
+              .values('id')[:limit])
+    if connections[timeline.db].features.supports_slicing_ordering_in_compound:
+        return Post.objects.filter(id__in=timeline.union(pulled, all=True))
+    # SQLite: no LIMIT in the members of a UNION
+    return Post.objects.filter(Q(id__in=timeline) | Q(id__in=pulled))
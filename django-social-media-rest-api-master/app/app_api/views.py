@@ -0,0 +1,53 @@
+import os
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from app_api import metrics, profiling
+
+
+class MetricsView(APIView):
+    """
+    Class to read the counters and gauges of the worker process serving the request
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+
+def profiles_view(request):
+    """
+    Admin page listing the stored request profiles, grouped by url name
+    """
+    url_name = request.GET.get('url_name') or None
+    groups = OrderedDict()
+    for profile in profiling.list_profiles(url_name):
+        groups.setdefault(profile['url_name'] or '(unresolved)', []).append(profile)
+    context = dict(
+        admin.site.each_context(request),
+        title='Request profiles',
+        groups=groups,
+        url_name=url_name,
+        max_profiles=settings.PROFILING['MAX_PROFILES'],
+    )
+    return TemplateResponse(request, 'admin/app_api/profiles.html', context)
+
+
+def profile_file_view(request, profile_id, extension):
+    """
+    Download the pstats (.prof) or collapsed stacks (.folded) file of a profile
+    """
+    try:
+        path = profiling.profile_path(profile_id, extension)
+    except ValueError:
+        raise Http404
+    if not os.path.exists(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
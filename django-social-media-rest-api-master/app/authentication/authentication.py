@@ -0,0 +1,89 @@
+"""
+JWT authentication resolving request.user, with its profile, from a short-TTL cache
+instead of a query per request. The token itself is validated statelessly, as before.
+
+Entries are keyed by user id and by a generation counter of the user: bumping the
+generation (signals on User and UserProfile saves and deletes) makes every cached
+copy unreachable at once. The cache must be shared by the workers (AUTH_USER_CACHE),
+a process-local cache only sees the invalidations of its own process.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import ugettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from app_api import metrics
+
+User = get_user_model()
+
+
+def user_cache():
+    return caches[settings.AUTH_USER_CACHE['CACHE']]
+
+
+def generation_key(user_id):
+    return f'auth:generation:{user_id}'
+
+
+def new_generation():
+    # never a value an evicted counter had before
+    return int(time.time() * 1000000)
+
+
+def get_generation(cache, user_id):
+    key = generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, new_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def invalidate_user(user_id):
+    """
+    Drop the cached copies of a user, called when the user or its profile changes
+    """
+    cache = user_cache()
+    try:
+        cache.incr(generation_key(user_id))
+    except ValueError:
+        # no generation yet, or evicted
+        cache.set(generation_key(user_id), new_generation(), None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication with the user and its profile (request.user.user_profile) read from the cache
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        cache = user_cache()
+        key = f'auth:user:{user_id}:{get_generation(cache, user_id)}'
+        user = cache.get(key)
+        if user is None:
+            metrics.incr('auth_cache.misses')
+            try:
+                # from the primary: a copy read from a lagging replica would be cached until the next change
+                user = User.objects.db_manager(DEFAULT_DB_ALIAS).select_related('user_profile').get(
+                    **{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            cache.set(key, user, settings.AUTH_USER_CACHE['TIMEOUT'])
+        else:
+            metrics.incr('auth_cache.hits')
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        return user
@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
-from django.core.mail import EmailMessage
 from rest_framework import serializers
 
+from app_api.outbox import enqueue_email
+
 User = get_user_model()
 
 
@@ -18,12 +19,12 @@ class PasswordResetSerializer(serializers.Serializer):
 
     @staticmethod
     def send_password_reset_email(email, code):
-        message = EmailMessage(
+        # sent by the send_queued_email worker
+        enqueue_email(
             subject='Social feed password reset',
             body=f'This is your password reset code ==>  {code}',
             to=[email],
         )
-        message.send()
 
 
 class PasswordResetValidationSerializer(PasswordResetSerializer):
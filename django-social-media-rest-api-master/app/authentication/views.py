@@ -1,6 +1,8 @@
+from django.db import transaction
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
 
+from app_api.helpers import code_generator
 from .serializers import (PasswordResetSerializer,
                           PasswordResetValidationSerializer)
 
@@ -13,8 +15,11 @@ class PasswordResetView(GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data.get('email')
-        user.user_profile.generate_new_code()
-        serializer.send_password_reset_email(user.email, user.user_profile.code)
+        # the new code and its queued email are committed together
+        with transaction.atomic():
+            user.user_profile.code = code_generator()
+            user.user_profile.save(update_fields=['code'])
+            serializer.send_password_reset_email(user.email, user.user_profile.code)
         return Response(f'Password reset sent to email {user.email}!')
 
 
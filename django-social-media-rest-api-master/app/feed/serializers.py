@@ -1,12 +1,12 @@
 from rest_framework import serializers
 from app_api.models import Post
+from posts.serializers import PostSerializer
 
 
-class FeedSerializer(serializers.ModelSerializer):
+class FeedSerializer(PostSerializer):
 
-    class Meta:
+    class Meta(PostSerializer.Meta):
         model = Post
-        fields = '__all__'
 
 
 class LikesSerializer(serializers.ModelSerializer):
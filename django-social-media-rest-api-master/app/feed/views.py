@@ -1,99 +1,107 @@
+from collections import OrderedDict
+
+from django.conf import settings
 from app_api.permissions import IsOwnerOrReadOnly
 from rest_framework.permissions import IsAuthenticated
 
 from rest_framework import generics
-from django.db.models import Q
-
-from app_api.models import Post, Friendship, Follow
+from rest_framework.response import Response
+
+from app_api.conditional import ConditionalListMixin
+from app_api.graph import SocialGraph
+from app_api.models import Post
+from app_api.pagination import PostKeysetPagination
+from app_api.ranking import rank_posts
+from app_api.streaming import StreamingListMixin
+from app_api.throttling import TokenBucketThrottle
+from app_api.timeline import home_timeline
 from .serializers import FeedSerializer
-from users.serializers import FriendshipSerializer, FollowSerializer
 from posts.serializers import PostSerializer
 
 
-class FeedView(generics.ListAPIView):
+class RankedFeedMixin:
+    """
+    With ?order=ranked, return the best scored page of the most recent Posts
+    instead of the chronological feed
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('order') != 'ranked':
+            return super().list(request, *args, **kwargs)
+        posts = rank_posts(self.filter_queryset(self.get_queryset()), request.user,
+                           self.paginator.get_page_size(request))
+        serializer = self.get_serializer(posts, many=True)
+        return Response(OrderedDict([('next', None), ('results', serializer.data)]))
+
+
+class FeedView(ConditionalListMixin, StreamingListMixin, RankedFeedMixin, generics.ListAPIView):
     """
     Class to get all the Posts of the Feed Application
     """
-    queryset = Post.objects.all()
     serializer_class = FeedSerializer
+    pagination_class = PostKeysetPagination
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'feed'
+
+    def get_queryset(self):
+        return Post.objects.for_viewer(self.request.user)
 
 
-class PostsView(generics.ListAPIView):
+class PostsView(ConditionalListMixin, generics.ListAPIView):
     """
     Class to get all Posts of a specific User using
     the ID of the User (author)
     """
     serializer_class = FeedSerializer
+    pagination_class = PostKeysetPagination
 
     def get_queryset(self, *args, **kwargs):
         kwargs = self.kwargs  # --> a dictionary with the url's parameter {'author_id': '2'}
         kw_id = kwargs.get('author_id')  # --> returns the value of key='author_id'
-        return Post.objects.filter(author_id=kw_id)
+        return Post.objects.for_viewer(self.request.user).filter(author_id=kw_id)
 
 
-class PostsFollowersView(generics.ListAPIView):
+class PostsFollowersView(ConditionalListMixin, generics.ListAPIView):
     """
     Class to get all the Posts of followers
     """
 
     serializer_class = PostSerializer
+    pagination_class = PostKeysetPagination
 
     def get_queryset(self):
-        # get the followers of the loged-in user --> request.user
-        followers = Follow.objects.filter(Q(receiver=self.request.user) & Q(status='Follow'))
-        # serialize the data
-        serializer = FollowSerializer(followers, many=True)
-        # create a list with their id's
-        sender_id = [friend['sender'] for friend in serializer.data]
-
-        # query --> SELECT * FROM post WHERE author IN sender_id
-        queryset = Post.objects.filter(Q(author__in=sender_id))
+        # query --> SELECT * FROM post WHERE author IN (SELECT sender FROM follow WHERE receiver = user)
+        authors = SocialGraph(self.request.user).followers()
+        return Post.objects.for_viewer(self.request.user).filter(author__in=authors)
 
-        return queryset
 
-
-class PostsFolloweesView(generics.ListAPIView):
+class PostsFolloweesView(ConditionalListMixin, RankedFeedMixin, generics.ListAPIView):
     """
     Class to get all the Posts of followees
     """
 
     serializer_class = PostSerializer
+    pagination_class = PostKeysetPagination
 
     def get_queryset(self):
-        # get the followers of the loged-in user --> request.user
-        followers = Follow.objects.filter(Q(sender=self.request.user) & Q(status='Follow'))
-        # serialize the data
-        serializer = FollowSerializer(followers, many=True)
-        # create a list with their id's
-        receiver_id = [friend['receiver'] for friend in serializer.data]
-
-        # query --> SELECT * FROM post WHERE author IN sender_id
-        queryset = Post.objects.filter(Q(author__in=receiver_id))
-
-        return queryset
+        # read the materialized timeline of the loged-in user --> request.user
+        user = self.request.user
+        if self.request.query_params.get('order') == 'ranked':
+            return home_timeline(user, settings.FEED_RANKING['CANDIDATES']).for_viewer(user)
+        before, page_size = self.paginator.page_bounds(self.request, Post)
+        # one more Post than the page, to know if there is a next one
+        return home_timeline(user, page_size + 1, before).for_viewer(user)
 
 
-class PostsFriendsView(generics.ListAPIView):
+class PostsFriendsView(ConditionalListMixin, RankedFeedMixin, generics.ListAPIView):
     """
     Class to get all the Posts of friends
     """
 
     serializer_class = PostSerializer
+    pagination_class = PostKeysetPagination
 
     def get_queryset(self):
-        # get the user_id of the current user
-        current_user_id = self.request.user.id
-        # get the friends of the loged-in user --> request.user
-        friends = Friendship.objects.filter((Q(receiver=self.request.user) & Q(status='Accept'))
-                                            | Q(sender=self.request.user) & Q(status='Accept'))
-
-        # serialize the data
-        serializer = FriendshipSerializer(friends, many=True)
-        # create a list with their id's
-        sender_id = [friend['sender'] for friend in serializer.data if friend['sender'] != current_user_id]
-        receiver_id = [friend['receiver'] for friend in serializer.data if friend['receiver'] != current_user_id]
-
-        # query --> SELECT * FROM post WHERE author IN (sender_id or receiver_id)
-        queryset = Post.objects.filter(Q(author__in=sender_id) | Q(author__in=receiver_id))
-
-        return queryset
+        # query --> SELECT * FROM post WHERE author IN (friends of user)
+        authors = SocialGraph(self.request.user).friends()
+        return Post.objects.for_viewer(self.request.user).filter(author__in=authors)
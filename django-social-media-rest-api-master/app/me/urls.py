@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import GetUpdateUserProfileView
+from .views import GetUpdateUserProfileView, UpdateAvatarView
 
 urlpatterns = [
     path(
         '', GetUpdateUserProfileView.as_view(), name='get_update_user_profile'
     ),
+    path('avatar/', UpdateAvatarView.as_view(), name='update_avatar'),
 ]
\ No newline at end of file
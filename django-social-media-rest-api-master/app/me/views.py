@@ -1,7 +1,11 @@
 from django.contrib.auth import get_user_model
 from rest_framework.generics import GenericAPIView
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 
+from app_api.images import process_image_later
+from app_api.models import UserProfile
+from users.serializers import UserProfileAvatarSerializer, UserProfileSerializer
 from .serializers import MeSerializer
 
 User = get_user_model()
@@ -14,8 +18,26 @@ class GetUpdateUserProfileView(GenericAPIView):
         return Response(self.get_serializer(request.user).data)
 
     def post(self, request):
-        serializer = self.get_serializer(request.user, data=request.data)
+        # request.user comes from the authentication cache, saving it whole would write back stale fields
+        user = User.objects.get(pk=request.user.pk)
+        serializer = self.get_serializer(user, data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
         return Response(self.get_serializer(user).data)
 
+
+class UpdateAvatarView(GenericAPIView):
+    """
+    Class to upload the avatar of the logged-in user, its renditions are rendered in the background
+    """
+    serializer_class = UserProfileAvatarSerializer
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        # not the cached request.user.user_profile, e.g. feed_delivery may have changed since
+        user_profile = UserProfile.objects.get(user_id=request.user.pk)
+        serializer = self.get_serializer(user_profile, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_profile = serializer.save()
+        process_image_later(user_profile, 'avatar')
+        return Response(UserProfileSerializer(user_profile, context=self.get_serializer_context()).data)
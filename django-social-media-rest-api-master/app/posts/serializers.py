@@ -1,11 +1,40 @@
+from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from app_api.images import rendition_urls
 from app_api.models import Post, Reaction
 
+User = get_user_model()
+
+
+class AuthorSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name']
+        read_only_fields = fields
+
 
 class PostSerializer(serializers.ModelSerializer):
+    """
+    Serialize Posts coming from Post.objects.for_viewer(user), which joins the
+    author and annotates viewer_has_liked (null for Posts loaded without it)
+    """
+
+    author_details = AuthorSerializer(source='author', read_only=True)
+    viewer_has_liked = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = Post
         fields = '__all__'
+        read_only_fields = ['like_count', 'image_status']
+
+    @staticmethod
+    def get_viewer_has_liked(post):
+        return getattr(post, 'viewer_has_liked', None)
+
+    def get_image_renditions(self, post):
+        return rendition_urls(post.image, post.image_status, self.context.get('request'))
 
 
 class ReactionSerializer(serializers.ModelSerializer):
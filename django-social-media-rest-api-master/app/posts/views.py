@@ -2,12 +2,21 @@ from app_api.permissions import IsOwnerOrReadOnly
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 
 from rest_framework.views import APIView
 from rest_framework.generics import get_object_or_404
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import F, Prefetch, Q
+from django.db.models.functions import Greatest
 
+from app_api.conditional import make_etag, not_modified, post_versions, set_validators
+from app_api.images import process_image_later
 from app_api.models import Post, Reaction
+from app_api.pagination import PostSearchKeysetPagination, ReactionKeysetPagination
+from app_api.search import search_posts
+from app_api.throttling import TokenBucketThrottle
+from app_api.timeline import fan_out_post
 from posts.serializers import PostSerializer, ReactionSerializer, ReactionLikeSerializer
 
 
@@ -17,14 +26,20 @@ class PostCreateAPIView(APIView):
     """
 
     def get(self, request):
-        post = Post.objects.first()
+        post = Post.objects.for_viewer(request.user).first()
         serializer = PostSerializer(post)
         return Response({"This is a typical Json post": {"required": "title, body, author"}, "data": serializer.data})
 
     def post(self, request):
         serializer = PostSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                post = serializer.save()
+                # push the new post into the followers' timelines once it is committed,
+                # a failed fan-out does not roll back the post (rebuild_timeline repairs the timelines)
+                transaction.on_commit(lambda: fan_out_post(post))
+                if post.image:
+                    process_image_later(post, 'image')
             return Response({"Status 201": "Post created succesfully"},status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -40,15 +55,23 @@ class PostRetrieveUpdateDestroyView(APIView):
         return post
 
     def get(self, request, pk):
-        post = self.get_object(pk)
+        post = get_object_or_404(Post.objects.for_viewer(request.user), pk=pk)
+        # likes and the viewer change the representation without touching updated_at,
+        # so there is no Last-Modified: If-Modified-Since alone would get stale 304s
+        etag = make_etag('post', request.user.pk, post_versions([post]))
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
         serializer = PostSerializer(post)
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag)
 
     def patch(self, request, pk):
         post = self.get_object(pk)
         serializer = PostSerializer(post, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            post = serializer.save()
+            if 'image' in request.data:
+                process_image_later(post, 'image')
             return Response({"Status 201": "Post Updated succesfully"}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -56,7 +79,9 @@ class PostRetrieveUpdateDestroyView(APIView):
         post = self.get_object(pk)
         serializer = PostSerializer(post, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            post = serializer.save()
+            if 'image' in request.data:
+                process_image_later(post, 'image')
             return Response({"Status 201": "Post updated succesfully"}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -71,25 +96,34 @@ class PostLikeAPIView(APIView):
     Class to like and unlike a Post using the post_id
     """
     serializer_class = ReactionLikeSerializer
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'like'
 
     def get_object(self, post_id):
         post = get_object_or_404(Post, pk=post_id)
         return post
 
     def get(self, request, post_id):
-        post = self.get_object(post_id)
+        post = get_object_or_404(Post.objects.for_viewer(request.user), pk=post_id)
         serializer = PostSerializer(post)
         return Response(serializer.data)
 
     def post(self, request, *args, **kwargs):
         post_id = self.kwargs.get('post_id')
         post = Post.objects.get(id=post_id)
-        Reaction.objects.get_or_create(user_reacted=self.request.user, posts=post, status=1)
+        with transaction.atomic():
+            reaction, created = Reaction.objects.get_or_create(user_reacted=self.request.user, posts=post, status=1)
+            # only count the like if this request actually added it
+            if created:
+                Post.objects.filter(pk=post.pk).update(like_count=F('like_count') + 1)
         return Response({"Status 201": "Post liked succesfully"}, status=status.HTTP_201_CREATED)
 
     def delete(self, request, post_id):
         post_id = self.kwargs.get('post_id')
-        Reaction.objects.filter(Q(user_reacted=self.request.user) & Q(posts=post_id)).delete()
+        with transaction.atomic():
+            deleted, _ = Reaction.objects.filter(Q(user_reacted=self.request.user) & Q(posts=post_id) & Q(status=1)).delete()
+            if deleted:
+                Post.objects.filter(pk=post_id).update(like_count=Greatest(F('like_count') - deleted, 0))
         return Response({"Status 204": "Post like deleted succesfully"}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -99,7 +133,26 @@ class PostsLikedAPIView(generics.ListAPIView):
     """
 
     serializer_class = ReactionSerializer
+    pagination_class = ReactionKeysetPagination
+
+    def get_queryset(self):
+        # the liked Posts are loaded with one extra query, with their author and viewer annotations
+        queryset = (Reaction.objects.filter(user_reacted=self.request.user)
+                    .prefetch_related(Prefetch('posts', queryset=Post.objects.for_viewer(self.request.user))))
+        return queryset
+
+
+class PostSearchAPIView(generics.ListAPIView):
+    """
+    Class to search the Posts by the words of their title and body (?q=), best matches first
+    """
+
+    serializer_class = PostSerializer
+    pagination_class = PostSearchKeysetPagination
 
     def get_queryset(self):
-        queryset = Reaction.objects.filter(user_reacted=self.request.user)
-        return queryset
\ No newline at end of file
+        query = self.request.query_params.get('q', '')
+        if not query.strip():
+            raise ValidationError({'q': 'This query parameter is required.'})
+        # query --> the full-text index of app_api.search, no scan of the Posts
+        return search_posts(Post.objects.for_viewer(self.request.user), query)
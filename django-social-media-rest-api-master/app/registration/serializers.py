@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
-from django.core.mail import EmailMessage
+from django.db import transaction
 from rest_framework import serializers
 
+from app_api.outbox import enqueue_email
+
 User = get_user_model()
 
 
@@ -19,24 +21,26 @@ class RegistrationSerializer(serializers.Serializer):
 
     @staticmethod
     def send_registration_email(email, code):
-        message = EmailMessage(
+        # sent by the send_queued_email worker
+        enqueue_email(
             subject='Social feed registration',
             body=f'This is your registration code ==>  {code}',
             to=[email],
         )
-        message.send()
 
     def save(self, validated_data):
         email = validated_data.get('email')
-        new_user = User.objects.create_user(
-            username=email,
-            email=email,
-            is_active=False,
-        )
-        self.send_registration_email(
-            email=email,
-            code=new_user.user_profile.code,
-        )
+        # the user and its queued email are committed together
+        with transaction.atomic():
+            new_user = User.objects.create_user(
+                username=email,
+                email=email,
+                is_active=False,
+            )
+            self.send_registration_email(
+                email=email,
+                code=new_user.user_profile.code,
+            )
         return new_user
 
 
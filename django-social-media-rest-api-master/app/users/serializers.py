@@ -1,5 +1,9 @@
+from collections import OrderedDict
+
+from django.conf import settings
 from rest_framework import serializers
-from app_api.models import UserProfile, Friendship, Follow
+from app_api.images import rendition_urls
+from app_api.models import UserProfile, Friendship, Follow, FriendSuggestion
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -15,17 +19,22 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
     user = serializers.StringRelatedField(read_only=True)
     avatar = serializers.ImageField(read_only=True)
+    avatar_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
         fields = "__all__"
+        read_only_fields = ['avatar_status']
+
+    def get_avatar_renditions(self, user_profile):
+        return rendition_urls(user_profile.avatar, user_profile.avatar_status, self.context.get('request'))
 
 
 class UserProfileAvatarSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = UserProfile
-        fields = "avatar"
+        fields = ['avatar']
 
 
 class FriendshipSerializer(serializers.ModelSerializer):
@@ -42,6 +51,16 @@ class FriendshipSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Invalid friendship")
 
 
+class FriendSuggestionSerializer(serializers.ModelSerializer):
+
+    profile = UserProfileSerializer(source='suggested.user_profile', read_only=True)
+
+    class Meta:
+        model = FriendSuggestion
+        fields = ['profile', 'mutual_connections']
+        read_only_fields = fields
+
+
 class FriendRequestSerializer(serializers.ModelSerializer):
 
     sender = UserSerializer(
@@ -69,3 +88,18 @@ class FollowLightSerializer(serializers.ModelSerializer):
     class Meta:
         model = Follow
         fields = ['status']
+
+
+class BulkUserIdsSerializer(serializers.Serializer):
+    """
+    List of target user ids of the bulk follow / unfollow / friend request endpoints
+    """
+    user_ids = serializers.ListField(child=serializers.IntegerField(min_value=1))
+
+    def validate_user_ids(self, user_ids):
+        if not user_ids:
+            raise serializers.ValidationError('At least one user id is required')
+        if len(user_ids) > settings.BULK_MAX_USER_IDS:
+            raise serializers.ValidationError(f'At most {settings.BULK_MAX_USER_IDS} user ids at once')
+        # duplicates are answered once, in the order of their first occurrence
+        return list(OrderedDict.fromkeys(user_ids))
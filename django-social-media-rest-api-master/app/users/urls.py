@@ -2,15 +2,21 @@ from django.urls import path
 from .views import (UserProfileView,
                     UserProfilesView,
                     UsersView,
+                    UserAutocompleteView,
                     UserFollowersView,
                     UserFolloweesView,
                     UserFollowView,
+                    UserBulkFollowView,
+                    UserBulkUnfollowView,
                     FriendRequestView,
+                    BulkFriendRequestView,
                     FriendRequestsView,
                     FriendRequestAcceptView,
                     FriendRequestRejectView,
                     FriendRequestsPendingView,
                     UserFriendsView,
+                    MutualFriendsView,
+                    FriendSuggestionsView,
                     UserUnfriendView
                     )
 
@@ -18,15 +24,21 @@ from .views import (UserProfileView,
 urlpatterns = [
     path('', UsersView.as_view(), name='user-view'),
     path('profiles/', UserProfilesView.as_view(), name='user-profiles-view'),
+    path('autocomplete/', UserAutocompleteView.as_view(), name='user-autocomplete'),
     path('<int:pk>/', UserProfileView.as_view(), name='user-profile-view'),
     path('follow/<int:user_id>/', UserFollowView.as_view(), name='follow-user'),
+    path('follow/bulk/', UserBulkFollowView.as_view(), name='follow-users'),
+    path('unfollow/bulk/', UserBulkUnfollowView.as_view(), name='unfollow-users'),
     path('followers/', UserFollowersView.as_view(), name='user-followers'),
     path('following/', UserFolloweesView.as_view(), name='user-followees'),
     path('friendrequest/<int:user_id>/', FriendRequestView.as_view(), name='friend-request-user'),
+    path('friendrequest/bulk/', BulkFriendRequestView.as_view(), name='friend-request-users'),
     path('friendrequests/', FriendRequestsView.as_view(), name='friend-requests'),
     path('friendrequest/accept/<int:user_id>/', FriendRequestAcceptView.as_view(), name='friend-request-accept'),
     path('friendrequest/reject/<int:user_id>/', FriendRequestRejectView.as_view(), name='friend-requests-reject'),
     path('friendrequests/pending/', FriendRequestsPendingView.as_view(), name='friend-requests-pending'),
     path('friends/', UserFriendsView.as_view(), name='user-friends'),
     path('friends/unfriend/<int:user_id>/', UserUnfriendView.as_view(), name='unfriend-user'),
+    path('friends/mutual/<int:user_id>/', MutualFriendsView.as_view(), name='mutual-friends'),
+    path('friends/suggestions/', FriendSuggestionsView.as_view(), name='friend-suggestions'),
 ]
\ No newline at end of file
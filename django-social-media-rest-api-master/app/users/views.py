@@ -1,28 +1,41 @@
+from collections import OrderedDict
+
 from app_api.permissions import IsOwnerOrReadOnly
 from rest_framework.permissions import IsAuthenticated
 
 from rest_framework.views import APIView
 from rest_framework import generics, status
 from rest_framework.response import Response
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
 
 
 from django.contrib.auth import get_user_model
+from django.conf import settings
 from rest_framework.generics import get_object_or_404
 
-from app_api.models import UserProfile, Follow, Friendship
+from app_api.autocomplete import autocomplete
+from app_api.conditional import make_etag, not_modified, set_validators
+from app_api.graph import SocialGraph
+from app_api.models import UserProfile, Follow, Friendship, FriendSuggestion
+from app_api.pagination import FriendSuggestionKeysetPagination
+from app_api.streaming import StreamingListMixin
+from app_api.throttling import TokenBucketThrottle
+from app_api.timeline import backfill_timeline, remove_from_timeline
 
 from users.serializers import (UserProfileSerializer,
                                UserSerializer,
-                               FollowSerializer,
                                FriendshipSerializer,
                                FollowLightSerializer,
-                               FriendRequestSerializer)
+                               FriendRequestSerializer,
+                               FriendSuggestionSerializer,
+                               BulkUserIdsSerializer)
 
 User = get_user_model()
 
 
-class UsersView(generics.ListAPIView):
+class UsersView(StreamingListMixin, generics.ListAPIView):
     """
     Class to List all Users
     """
@@ -31,15 +44,37 @@ class UsersView(generics.ListAPIView):
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
 
 
-class UserProfilesView(generics.ListAPIView):
+class UserProfilesView(StreamingListMixin, generics.ListAPIView):
     """
     Class to List all Users Profiles
     """
-    queryset = UserProfile.objects.all()
+    queryset = UserProfile.objects.select_related('user')
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
 
 
+class UserAutocompleteView(APIView):
+    """
+    Class to complete the names of Users (?q= prefixes of username, first and last name),
+    friends and followees first
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        limit = settings.AUTOCOMPLETE['MAX_RESULTS']
+        try:
+            limit = max(min(int(request.query_params.get('limit', limit)), limit), 1)
+        except ValueError:
+            pass
+        user_ids = autocomplete(request.user, request.query_params.get('q', ''), limit)
+        # query --> SELECT * FROM profile WHERE user IN (completed ids), put back in the order of the index
+        profiles = {profile.user_id: profile
+                    for profile in UserProfile.objects.filter(user_id__in=user_ids).select_related('user')}
+        serializer = UserProfileSerializer([profiles[user_id] for user_id in user_ids if user_id in profiles],
+                                           many=True, context={'request': request})
+        return Response({'results': serializer.data})
+
+
 class UserProfileView(APIView):
     """
     Class to Retrieve a User Profile using the user_id
@@ -49,9 +84,14 @@ class UserProfileView(APIView):
         return user_profile
 
     def get(self, request, pk):
+        updated_at = get_object_or_404(UserProfile.objects.values_list('updated_at', flat=True), pk=pk)
+        etag = make_etag('profile', pk, updated_at)
+        response = not_modified(request, etag, updated_at)
+        if response is not None:
+            return response
         user_profile = self.get_object(pk)
         serializer = UserProfileSerializer(user_profile)
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag, updated_at)
 
 
 class UserFollowView(APIView):
@@ -60,6 +100,8 @@ class UserFollowView(APIView):
     """
 
     serializer_class = FollowLightSerializer
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'follow'
 
     def get_user(self, user_id):
         user = get_object_or_404(User, pk=user_id)
@@ -68,7 +110,9 @@ class UserFollowView(APIView):
     def post(self, request, **kwargs):
         user_id = kwargs.get('user_id')
         if request.user != self.get_user(user_id):
-            Follow.objects.get_or_create(sender=request.user, receiver=self.get_user(user_id), status='Follow')
+            follow, created = Follow.objects.get_or_create(sender=request.user, receiver=self.get_user(user_id), status='Follow')
+            if created:
+                backfill_timeline(request.user.id, user_id)
             return Response({"Status 201": "Follow Successful"}, status=status.HTTP_201_CREATED)
         return Response({"Status 404": "Sender must be different than receiver"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -76,10 +120,94 @@ class UserFollowView(APIView):
         user_id = kwargs.get('user_id')
         if request.user != self.get_user(user_id):
             Follow.objects.filter(Q(sender=request.user) & Q(receiver=user_id)).delete()
+            remove_from_timeline(request.user.id, user_id)
             return Response({"Status 204": "Unfollow Successful"}, status=status.HTTP_204_NO_CONTENT)
         return Response({"Status 404": "Sender must be different than receiver"}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class BulkUsersMixin:
+    """
+    Validate the user_ids of a bulk request with one query and answer with a status per user id
+    """
+    serializer_class = BulkUserIdsSerializer
+
+    def get_user_ids(self, request):
+        """
+        Requested user ids and the subset of them that exists
+        """
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_ids = serializer.validated_data['user_ids']
+        return user_ids, set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+
+    def get_results(self, request, user_ids, existing, statuses):
+        """
+        Status of every user id: 'self', 'not_found', its entry in statuses or None (to be written)
+        """
+        results = OrderedDict()
+        for user_id in user_ids:
+            if user_id == request.user.id:
+                results[user_id] = 'self'
+            elif user_id not in existing:
+                results[user_id] = 'not_found'
+            else:
+                results[user_id] = statuses.get(user_id)
+        return results
+
+    @staticmethod
+    def results_response(results):
+        return Response({'results': [{'user_id': user_id, 'status': result} for user_id, result in results.items()]})
+
+
+class UserBulkFollowView(BulkUsersMixin, APIView):
+    """
+    Class to Follow a list of Users using their user_ids
+    """
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'follow'
+
+    def post(self, request):
+        user_ids, existing = self.get_user_ids(request)
+        following = (Follow.objects.filter(Q(sender=request.user) & Q(receiver_id__in=user_ids) & Q(status='Follow'))
+                     .values_list('receiver_id', flat=True))
+        results = self.get_results(request, user_ids, existing, dict.fromkeys(following, 'already_following'))
+        followed = [user_id for user_id, result in results.items() if result is None]
+
+        with transaction.atomic():
+            # ignore_conflicts covers follows created by a concurrent request
+            Follow.objects.bulk_create([Follow(sender=request.user, receiver_id=user_id) for user_id in followed],
+                                       ignore_conflicts=True)
+            backfill_timeline(request.user.id, *followed)
+            # bulk_create skips the signals invalidating the cached graph
+            transaction.on_commit(lambda: (SocialGraph.invalidate(request.user.id, 'followees'),
+                                           SocialGraph.invalidate_many('followers', followed)))
+        results.update(dict.fromkeys(followed, 'followed'))
+        return self.results_response(results)
+
+
+class UserBulkUnfollowView(BulkUsersMixin, APIView):
+    """
+    Class to Unfollow a list of Users using their user_ids
+    """
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'follow'
+
+    def post(self, request):
+        user_ids, existing = self.get_user_ids(request)
+        following = set(Follow.objects.filter(Q(sender=request.user) & Q(receiver_id__in=user_ids))
+                        .values_list('receiver_id', flat=True))
+        statuses = {user_id: None if user_id in following else 'not_following' for user_id in user_ids}
+        results = self.get_results(request, user_ids, existing, statuses)
+        unfollowed = [user_id for user_id, result in results.items() if result is None]
+
+        with transaction.atomic():
+            # the delete signals invalidate the cached graph
+            Follow.objects.filter(Q(sender=request.user) & Q(receiver_id__in=unfollowed)).delete()
+            remove_from_timeline(request.user.id, *unfollowed)
+        results.update(dict.fromkeys(unfollowed, 'unfollowed'))
+        return self.results_response(results)
+
+
 class UserFollowersView(generics.ListAPIView):
     """
     Class to List all User's Followers
@@ -88,17 +216,8 @@ class UserFollowersView(generics.ListAPIView):
     serializer_class = UserProfileSerializer
 
     def get_queryset(self):
-        # get the followers of the loged-in user --> request.user
-        followers = Follow.objects.filter(Q(receiver=self.request.user) & Q(status='Follow'))
-        # serialize the data
-        serializer = FollowSerializer(followers, many=True)
-        # create a list with their id's
-        sender_id = [follower['sender'] for follower in serializer.data]
-
-        # query --> SELECT * FROM post WHERE author IN sender_id
-        queryset = UserProfile.objects.filter(Q(id__in=sender_id))
-
-        return queryset
+        # query --> SELECT * FROM profile WHERE user IN (followers of user)
+        return UserProfile.objects.filter(user__in=SocialGraph(self.request.user).followers()).select_related('user')
 
 
 class UserFolloweesView(generics.ListAPIView):
@@ -109,17 +228,8 @@ class UserFolloweesView(generics.ListAPIView):
     serializer_class = UserProfileSerializer
 
     def get_queryset(self):
-        # get the followees of the loged-in user --> request.user
-        followees = Follow.objects.filter(Q(sender=self.request.user) & Q(status='Follow'))
-        # serialize the data
-        serializer = FollowSerializer(followees, many=True)
-        # create a list with their id's
-        receiver_id = [followee['receiver'] for followee in serializer.data]
-
-        # query --> SELECT * FROM post WHERE author IN receiver_id
-        queryset = UserProfile.objects.filter(Q(id__in=receiver_id))
-
-        return queryset
+        # query --> SELECT * FROM profile WHERE user IN (followees of user)
+        return UserProfile.objects.filter(user__in=SocialGraph(self.request.user).followees()).select_related('user')
 
 
 class FriendRequestView(APIView):
@@ -128,6 +238,8 @@ class FriendRequestView(APIView):
     """
 
     serializer_class = FriendRequestSerializer
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'friend_request'
 
     def get_user(self, user_id):
         user = get_object_or_404(User, pk=user_id)
@@ -135,10 +247,66 @@ class FriendRequestView(APIView):
 
     def post(self, request, **kwargs):
         user_id = kwargs.get('user_id')
-        if request.user != self.get_user(user_id):
-            Friendship.objects.get_or_create(sender=request.user, receiver=self.get_user(user_id), status='Pending')
-            return Response({"Status 201": "Friend Request Successful"}, status=status.HTTP_201_CREATED)
-        return Response({"Status 404": "Sender must be different than receiver"}, status=status.HTTP_400_BAD_REQUEST)
+        if request.user.id == user_id:
+            return Response({"Status 404": "Sender must be different than receiver"}, status=status.HTTP_400_BAD_REQUEST)
+        receiver = self.get_user(user_id)
+        user_low_id, user_high_id = Friendship.pair(request.user.id, receiver.id)
+        with transaction.atomic():
+            friendship, created = Friendship.objects.select_for_update().get_or_create(
+                user_low_id=user_low_id, user_high_id=user_high_id,
+                defaults={'sender': request.user, 'receiver': receiver, 'status': 'Pending'})
+            # a rejected request can be sent again, by either user
+            if not created and friendship.status == 'Reject':
+                friendship.sender, friendship.receiver, friendship.status = request.user, receiver, 'Pending'
+                friendship.from_date = timezone.now()
+                friendship.save(update_fields=['sender', 'receiver', 'status', 'from_date'])
+        return Response({"Status 201": "Friend Request Successful"}, status=status.HTTP_201_CREATED)
+
+
+class BulkFriendRequestView(BulkUsersMixin, APIView):
+    """
+    Class to send friend requests to a list of Users using their user_ids
+    """
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'friend_request'
+
+    def post(self, request):
+        user_ids, existing = self.get_user_ids(request)
+        user_id = request.user.id
+        # the Friendships of the pairs, whichever side sent the request
+        friendships = (Friendship.objects.filter((Q(user_low_id=user_id) & Q(user_high_id__in=user_ids))
+                                                 | (Q(user_high_id=user_id) & Q(user_low_id__in=user_ids)))
+                       .values_list('user_low_id', 'user_high_id', 'status'))
+        statuses = {}
+        rejected = set()
+        for user_low_id, user_high_id, friendship_status in friendships:
+            other_id = user_high_id if user_low_id == user_id else user_low_id
+            if friendship_status == 'Accept':
+                statuses[other_id] = 'already_friends'
+            elif friendship_status == 'Pending':
+                statuses[other_id] = 'pending'
+            else:
+                # a rejected request can be sent again
+                rejected.add(other_id)
+        results = self.get_results(request, user_ids, existing, statuses)
+        requested = [other_id for other_id, result in results.items() if result is None]
+        requested_again = [other_id for other_id in requested if other_id in rejected]
+
+        with transaction.atomic():
+            Friendship.objects.bulk_create(
+                [Friendship(sender_id=user_id, receiver_id=other_id, status='Pending',
+                            user_low_id=min(user_id, other_id), user_high_id=max(user_id, other_id))
+                 for other_id in requested if other_id not in rejected],
+                ignore_conflicts=True,
+            )
+            # the rejected rows turn back into requests from this user, in place
+            (Friendship.objects.filter(((Q(user_low_id=user_id) & Q(user_high_id__in=requested_again))
+                                        | (Q(user_high_id=user_id) & Q(user_low_id__in=requested_again)))
+                                       & Q(status='Reject'))
+             .update(sender_id=user_id, status='Pending', from_date=timezone.now(),
+                     receiver_id=Case(When(user_low_id=user_id, then=F('user_high_id')), default=F('user_low_id'))))
+        results.update(dict.fromkeys(requested, 'requested'))
+        return self.results_response(results)
 
 
 class FriendRequestsView(generics.ListAPIView):
@@ -148,20 +316,8 @@ class FriendRequestsView(generics.ListAPIView):
     serializer_class = UserProfileSerializer
 
     def get_queryset(self):
-        print(self)
-        # get the friend requests of the loged-in user --> request.user
-        friend_requests = Friendship.objects.filter(Q(receiver=self.request.user))
-
-        # if they are pending requests
-        if friend_requests.exists():
-            # serialize the data
-            serializer = FriendshipSerializer(friend_requests, many=True)
-            # create a list with their id's
-            sender_id = [friend_request['sender'] for friend_request in serializer.data]
-            # query --> SELECT * FROM post WHERE author IN sender_id
-            queryset = UserProfile.objects.filter(Q(id__in=sender_id))
-
-            return queryset
+        # query --> SELECT * FROM profile WHERE user IN (senders of requests to user)
+        return UserProfile.objects.filter(user__in=SocialGraph(self.request.user).requesters()).select_related('user')
 
 
 class FriendRequestsPendingView(generics.ListAPIView):
@@ -171,20 +327,8 @@ class FriendRequestsPendingView(generics.ListAPIView):
     serializer_class = UserProfileSerializer
 
     def get_queryset(self):
-        print(self)
-        # get the friend requests of the loged-in user --> request.user
-        friend_requests = Friendship.objects.filter(Q(receiver=self.request.user) & Q(status='Pending'))
-
-        # if they are pending requests
-        if friend_requests.exists():
-            # serialize the data
-            serializer = FriendshipSerializer(friend_requests, many=True)
-            # create a list with their id's
-            sender_id = [friend_request['sender'] for friend_request in serializer.data]
-            # query --> SELECT * FROM post WHERE author IN sender_id
-            queryset = UserProfile.objects.filter(Q(id__in=sender_id))
-
-            return queryset
+        # query --> SELECT * FROM profile WHERE user IN (senders of pending requests to user)
+        return UserProfile.objects.filter(user__in=SocialGraph(self.request.user).pending_requesters()).select_related('user')
 
 
 class FriendRequestAcceptView(APIView):
@@ -194,23 +338,19 @@ class FriendRequestAcceptView(APIView):
 
     serializer_class = FriendshipSerializer
 
-    def get_user(self, user_id):
-        user = get_object_or_404(User, pk=user_id)
-        return user
-
     def post(self, request, **kwargs):
         user_id = kwargs.get('user_id')
-        # Query to check if the user has a pending request
-        friend_request = Friendship.objects.filter(Q(receiver=self.request.user)
-                                                   & Q(sender=self.get_user(user_id))
-                                                   & Q(status='Pending'))
+        if request.user.id == user_id:
+            return Response({"Status 404": "Sender must be different than receiver"}, status=status.HTTP_400_BAD_REQUEST)
+        # the pending request of the pair, received by the current user
+        friend_request = (Friendship.objects.between(request.user.id, user_id)
+                          .filter(Q(receiver=request.user) & Q(status='Pending')).first())
 
         # If there is a pending request
-        if friend_request.exists():
-            if request.user != self.get_user(user_id):
-                Friendship.objects.get_or_create(receiver=request.user, sender=self.get_user(user_id), status='Accept')
-                return Response({"Status 201": "Friend Request Accepted"}, status=status.HTTP_201_CREATED)
-            return Response({"Status 404": "Sender must be different than receiver"}, status=status.HTTP_400_BAD_REQUEST)
+        if friend_request is not None:
+            friend_request.status = 'Accept'
+            friend_request.save(update_fields=['status'])
+            return Response({"Status 201": "Friend Request Accepted"}, status=status.HTTP_201_CREATED)
         return Response({"Status 404": "There is no pending friend request"}, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -221,24 +361,19 @@ class FriendRequestRejectView(APIView):
 
     serializer_class = FriendshipSerializer
 
-    def get_user(self, user_id):
-        user = get_object_or_404(User, pk=user_id)
-        return user
-
     def post(self, request, **kwargs):
         user_id = kwargs.get('user_id')
-        # Query to check if the user has a pending request
-        friend_request = Friendship.objects.filter(Q(receiver=self.request.user)
-                                                   & Q(sender=self.get_user(user_id))
-                                                   & Q(status='Pending')
-                                                   )
+        if request.user.id == user_id:
+            return Response({"Status 404": "Sender must be different than receiver"}, status=status.HTTP_400_BAD_REQUEST)
+        # the pending request of the pair, received by the current user
+        friend_request = (Friendship.objects.between(request.user.id, user_id)
+                          .filter(Q(receiver=request.user) & Q(status='Pending')).first())
 
         # If there is a pending request
-        if friend_request.exists():
-            if request.user != self.get_user(user_id):
-                Friendship.objects.get_or_create(receiver=request.user, sender=self.get_user(user_id), status='Reject')
-                return Response({"Status 201": "Friend Request Rejected"}, status=status.HTTP_201_CREATED)
-            return Response({"Status 404": "Sender must be different than receiver"}, status=status.HTTP_400_BAD_REQUEST)
+        if friend_request is not None:
+            friend_request.status = 'Reject'
+            friend_request.save(update_fields=['status'])
+            return Response({"Status 201": "Friend Request Rejected"}, status=status.HTTP_201_CREATED)
         return Response({"Status 404": "There is no pending friend request"}, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -250,21 +385,46 @@ class UserFriendsView(generics.ListAPIView):
     serializer_class = UserProfileSerializer
 
     def get_queryset(self):
-        # get the user_id of the current user
-        current_user_id = self.request.user.id
-        # get the followers of the loged-in user --> request.user
-        friends = Friendship.objects.filter((Q(receiver=self.request.user) & Q(status='Accept'))
-                                            | Q(sender=self.request.user) & Q(status='Accept'))
-        # serialize the data
-        serializer = FriendshipSerializer(friends, many=True)
-        # create a list with their id's
-        sender_id = [friend['sender'] for friend in serializer.data if friend['sender'] != current_user_id]
-        receiver_id = [friend['receiver'] for friend in serializer.data if friend['receiver'] != current_user_id]
+        # query --> SELECT * FROM profile WHERE user IN (friends of user)
+        return UserProfile.objects.filter(user__in=SocialGraph(self.request.user).friends()).select_related('user')
 
-        # query --> SELECT * FROM post WHERE author IN (sender_id or receiver_id)
-        queryset = UserProfile.objects.filter(Q(user__in=sender_id) | Q(user__in=receiver_id))
 
-        return queryset
+class MutualFriendsView(generics.ListAPIView):
+    """
+    Class to List the friends the current User has in common with another User using the user_id
+    """
+
+    serializer_class = UserProfileSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # intersection of the two cached friend id lists
+        mutual = (set(SocialGraph(self.request.user).friend_ids())
+                  & set(SocialGraph(self.kwargs['user_id']).friend_ids()))
+        self.mutual_friends = len(mutual)
+        return UserProfile.objects.filter(user_id__in=mutual).select_related('user')
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['count'] = self.mutual_friends
+        return response
+
+
+class FriendSuggestionsView(generics.ListAPIView):
+    """
+    Class to List the Users the current User may know, most mutual connections first
+    """
+
+    serializer_class = FriendSuggestionSerializer
+    pagination_class = FriendSuggestionKeysetPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        graph = SocialGraph(self.request.user)
+        # suggestions are computed in batch, leave out the users befriended or followed since
+        return (FriendSuggestion.objects.filter(user=self.request.user)
+                .exclude(Q(suggested_id__in=graph.friends()) | Q(suggested_id__in=graph.followees()))
+                .select_related('suggested__user_profile'))
 
 
 class UserUnfriendView(APIView):
@@ -273,34 +433,12 @@ class UserUnfriendView(APIView):
     """
     serializer_class = FriendshipSerializer
 
-    @staticmethod
-    def get_user(user_id):
-        user = get_object_or_404(User, pk=user_id)
-        return user
-
     def delete(self, request, **kwargs):
         user_id = kwargs.get('user_id')
 
-        # Query to check if the users are friends
-        is_friends1 = Friendship.objects.filter(Q(receiver=request.user) &
-                                      Q(sender=self.get_user(user_id)) &
-                                      Q(status='Accept'))
-        is_friends2 = Friendship.objects.filter(Q(sender=request.user) &
-                                      Q(receiver=self.get_user(user_id)) &
-                                      Q(status='Accept'))
-        # If they are friends
-        if is_friends1.exists() or is_friends2.exists():
-            # check who is the receiver
-            if request.user != self.get_user(user_id):
-                # If current user was the receiver of the friend request
-                Friendship.objects.filter(Q(receiver=request.user) &
-                                          Q(sender=self.get_user(user_id)) &
-                                          Q(status='Accept')).delete()
-
-                # If current user was the sender of the friend request
-                Friendship.objects.filter(Q(sender=request.user) &
-                                          Q(receiver=self.get_user(user_id)) &
-                                          Q(status='Accept')).delete()
-                # if they are friends --> unfriend
+        # If they are friends --> unfriend, the pair can send new requests afterwards
+        if request.user.id != user_id:
+            deleted, _ = Friendship.objects.between(request.user.id, user_id).filter(status='Accept').delete()
+            if deleted:
                 return Response({"Status 204": "Unfriend Successful"}, status=status.HTTP_204_NO_CONTENT)
         return Response({"Status 404": "You are not friends!"}, status=status.HTTP_400_BAD_REQUEST)